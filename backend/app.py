@@ -1,14 +1,14 @@
 import os
 import json
-import threading
 import uuid
-from flask import Flask, send_from_directory
-from flask_socketio import SocketIO, emit
+from flask import Flask
+from werkzeug.formparser import parse_form_data
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
 
 from flask import request as flask_request
-from config import get_settings, get_tool_settings, save_tool_settings, DATA_DIR, get_agent
-from models import init_db, get_chat, add_message, create_chat, update_chat_title
+from config import get_settings, get_tool_settings, save_tool_settings, DATA_DIR, get_agent, ASYNC_MODE, MESSAGE_QUEUE
+from models import init_db, get_chat, add_message, create_chat, update_chat_title, add_chat_listener
 from routes.chat import chat_bp
 from routes.settings import settings_bp
 from routes.agents import agents_bp
@@ -17,17 +17,27 @@ from routes.usage import usage_bp
 from routes.webhooks import webhooks_bp
 from routes.custom_tools import custom_tools_bp
 from routes.storage import storage_bp
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp
+from routes.traces import traces_bp
 from mcp.registry import registry, MCPTool
-from mcp.loader import load_builtin_tools, load_custom_tools, get_startup_errors
-from mcp.manager import load_external_tools
+from mcp.loader import load_builtin_tools, load_custom_tools, start_custom_tool_watcher, get_startup_errors
+from mcp.manager import load_external_tools, start_supervisor
 from services.agent import run_agent
-from services import file_store
+from services import file_store, tool_cache
 from services.telegram_gateway import TelegramGateway
 from services.autoprompt import AutopromptService
-
-app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
+from services.budget import RunBudget
+from services.summary import build_chat_context
+from services.attachments import attach_text
+from services import log_stream, jobs, cluster, sandbox, tracing
+from services.static_files import StaticIndex
+from services.jobs import job_manager
+
+# Static files are served by StaticIndex (indexed once, precompressed), not Flask's static route
+app = Flask(__name__, static_folder=None)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, message_queue=MESSAGE_QUEUE)
 telegram_gateway = TelegramGateway(socketio)
 
 app.register_blueprint(chat_bp)
@@ -38,17 +48,34 @@ app.register_blueprint(usage_bp)
 app.register_blueprint(webhooks_bp)
 app.register_blueprint(custom_tools_bp)
 app.register_blueprint(storage_bp)
-
-_cancel_flags = {}  # sid → threading.Event
+app.register_blueprint(jobs_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(traces_bp)
 
 # Initialize database
 os.makedirs(DATA_DIR, exist_ok=True)
 init_db()
 
+
+def _broadcast_chat_change(chat_id, row):
+    """Chat list deltas for all clients — the full row, so nobody refetches /api/chats."""
+    if row is None:
+        socketio.emit('chat_deleted', {'chat_id': chat_id})
+    else:
+        socketio.emit('chat_updated', {'chat_id': chat_id, 'title': row['title'], 'chat': row})
+
+
+add_chat_listener(_broadcast_chat_change)
+
 # Register built-in and custom MCP tools via auto-discovery
 load_builtin_tools()
 load_custom_tools()
+# Edited / added / deleted custom tools are picked up without a manual reload
+start_custom_tool_watcher(emit_log=log_stream.make_emit_log(socketio))
 load_external_tools()
+start_supervisor()
+# Warm workers for tools with "execution": "process" (create_chart, generate_presentation)
+sandbox.pool.start()
 
 # Seed default agents (only if not yet present)
 def _seed_default_agents():
@@ -95,40 +122,58 @@ _seed_default_agents()
 
 # ── Static file serving ──
 
+static_index = StaticIndex(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist')).build()
+
+
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_index.respond('index.html')
 
 
 @app.route('/<path:path>')
 def serve_static(path):
-    file_path = os.path.join(app.static_folder, path)
-    if os.path.exists(file_path):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_index.respond(path)
 
 
 # ── API: reload external MCP tools ──
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in flask_request.files:
-        return {'error': 'No file provided'}, 400
-    f = flask_request.files['file']
+    # Multipart parts are streamed straight into their final file in uploads/ —
+    # no in-memory buffer and no spooled temp copy, whatever the file size.
     uploads_dir = os.path.join(DATA_DIR, 'uploads')
     os.makedirs(uploads_dir, exist_ok=True)
-    safe_name = f"{uuid.uuid4().hex}_{f.filename}"
-    file_path = os.path.join(uploads_dir, safe_name)
-    f.save(file_path)
-    return {'path': file_path}
+    written = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        name = os.path.basename((filename or 'upload').replace('\\', '/')) or 'upload'
+        path = os.path.join(uploads_dir, f"{uuid.uuid4().hex}_{name}")
+        written.append(path)
+        return open(path, 'wb+')
+
+    _, _, files = parse_form_data(flask_request.environ, stream_factory=stream_factory)
+    f = files.get('file')
+    for storage in files.values():
+        storage.close()
+    if f is None:
+        for path in written:
+            os.remove(path)
+        return {'error': 'No file provided'}, 400
+    # Other file fields are not used by the client — drop them
+    for path in written:
+        if path != f.stream.name:
+            os.remove(path)
+    return {'path': f.stream.name}
 
 
 @app.route('/api/mcp/reload', methods=['POST'])
 def reload_mcp():
     logs = []
+    # Only the browser that triggered the reload (X-Socket-Id) and the firehose see the log
+    emit_to_client = log_stream.make_emit_log(socketio, sid=flask_request.headers.get('X-Socket-Id') or None)
     def _log(entry):
-        logs.append(entry if isinstance(entry, dict) else {"type": "text", "message": str(entry)})
-        socketio.emit('guenther_log', entry if isinstance(entry, dict) else {"type": "text", "message": str(entry)})
+        logs.append(log_stream.normalize(entry))
+        emit_to_client(entry)
     load_custom_tools(emit_log=_log)
     load_external_tools(emit_log=_log)
     return {"success": True, "logs": logs}
@@ -154,10 +199,22 @@ def list_mcp_tools():
             "current_model": ts.get("model", ""),
             "enabled": ts.get("enabled", True),
             "always_enabled": t.always_enabled,
+            "cache_ttl": t.cache_ttl,
         })
     return result
 
 
+@app.route('/api/mcp/cache', methods=['GET'])
+def get_tool_cache_stats():
+    return {"tools": tool_cache.get_stats()}
+
+
+@app.route('/api/mcp/cache', methods=['DELETE'])
+def clear_tool_cache_route():
+    tool_cache.clear()
+    return {"success": True}
+
+
 @app.route('/api/mcp/tools/<tool_name>/enabled', methods=['PUT'])
 def set_tool_enabled_route(tool_name):
     data = flask_request.get_json() or {}
@@ -210,6 +267,11 @@ def handle_connect():
         emit('guenther_log', {'type': 'text', 'message': err})
 
 
+@socketio.on('disconnect')
+def handle_disconnect(*_):
+    log_stream.forget_client(flask_request.sid)
+
+
 @socketio.on('send_message')
 def handle_message(data):
     chat_id = data.get('chat_id')
@@ -218,36 +280,26 @@ def handle_message(data):
     file_name = data.get('file_name', '')
     file_content = data.get('file_content', '')
     temperature_override = data.get('temperature')
+    # Large text files are uploaded via /api/upload first and referenced by path
+    if file_name and data.get('file_path'):
+        file_content = _read_uploaded_text(data['file_path'])
     if not content and not file_content:
         return
 
-    # Prepend file content to message so the LLM can work with it
-    # Binary files are uploaded via /api/upload first; their path is already in content.
-    # Only text files still send file_content inline here.
-    if file_name and file_content:
-        content = f"[Datei: {file_name}]\n```\n{file_content}\n```\n\n{content}" if content else f"[Datei: {file_name}]\n```\n{file_content}\n```"
+    title_source = content or f"[Datei: {file_name}]"
 
     # Create new chat if needed
     if not chat_id:
-        title = content[:50] + ('...' if len(content) > 50 else '')
+        title = title_source[:50] + ('...' if len(title_source) > 50 else '')
         chat_id = create_chat(title, agent_id=agent_id)
         emit('chat_created', {'chat_id': chat_id, 'title': title, 'agent_id': agent_id})
     else:
         agent_id = None  # will be loaded from existing chat below
 
-    # Save user message
-    add_message(chat_id, 'user', content)
+    # The sender always receives the terminal log of its chat
+    join_room(log_stream.chat_room(chat_id))
 
-    # Get chat history for context
     chat = get_chat(chat_id)
-    messages = []
-    for msg in chat.get('messages', []):
-        if msg['role'] in ('user', 'assistant'):
-            messages.append({
-                'role': msg['role'],
-                'content': msg['content']
-            })
-
 
     # For existing chats, read agent_id from DB
     if agent_id is None:
@@ -256,17 +308,24 @@ def handle_message(data):
     # Update title on first real user message.
     # For agent chats the first message is the auto-greeting "Hallo", so we
     # also update the title on the second user message (= first real input).
-    user_messages = [m for m in messages if m['role'] == 'user']
+    # (The message itself is saved by the job, so it isn't counted yet.)
+    user_count = sum(1 for m in chat.get('messages', []) if m['role'] == 'user') + 1
     is_first_real_message = (
-        len(user_messages) == 1 or
-        (len(user_messages) == 2 and bool(chat.get('agent_id')))
+        user_count == 1 or
+        (user_count == 2 and bool(chat.get('agent_id')))
     )
     if is_first_real_message:
-        title = content[:50] + ('...' if len(content) > 50 else '')
+        title = title_source[:50] + ('...' if len(title_source) > 50 else '')
         update_chat_title(chat_id, title)
-        emit('chat_updated', {'chat_id': chat_id, 'title': title})
 
     settings = get_settings()
+
+    # Text files: small ones are prepended inline, large ones are stored as a chat
+    # artifact and only the chunks relevant to each question reach the LLM.
+    # Binary files are uploaded via /api/upload first; their path is already in content.
+    if file_name and file_content:
+        block = attach_text(chat_id, file_name, file_content, settings)
+        content = f"{block}\n\n{content}" if content else block
     # Per-Nachricht Temperatur-Override (vom Kreativitäts-Schieber im Frontend)
     if temperature_override is not None:
         try:
@@ -275,85 +334,150 @@ def handle_message(data):
         except (ValueError, TypeError):
             pass
 
-    def emit_log(entry):
-        """Accepts structured log entries (dict) or plain strings."""
-        if isinstance(entry, dict):
-            socketio.emit('guenther_log', entry)
-        else:
-            socketio.emit('guenther_log', {'type': 'text', 'message': str(entry)})
-
-    emit('agent_start', {'chat_id': chat_id})
-
     sid = flask_request.sid
-    stop_event = threading.Event()
-    _cancel_flags[sid] = stop_event
+    # Sent before submit: a fast job could otherwise deliver agent_response / agent_end first.
+    # The job announces itself with 'agent_running' once a worker picks it up.
+    emit('agent_start', {'chat_id': chat_id, 'status': jobs.STATUS_QUEUED})
+    try:
+        job_manager.submit(
+            lambda job: _run_chat_turn(job, sid, chat_id, content, agent_id, settings),
+            source=jobs.SOURCE_WEB, chat_id=chat_id, label=content[:50], owner=sid,
+        )
+    except jobs.JobQueueFull as e:
+        emit('agent_response', {'chat_id': chat_id, 'content': f"Fehler: Server ausgelastet — {e}. Bitte in etwa {e.retry_after} Sekunden erneut versuchen."})
+        emit('agent_end', {'chat_id': chat_id, 'stop_reason': 'rejected'})
+
+
+def _read_uploaded_text(path):
+    """Read (and remove) a text file previously sent to /api/upload."""
+    uploads_dir = os.path.realpath(os.path.join(DATA_DIR, 'uploads'))
+    full = os.path.realpath(path)
+    if not full.startswith(uploads_dir + os.sep) or not os.path.isfile(full):
+        return ''
+    with open(full, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    os.remove(full)
+    return text
+
+
+def _run_chat_turn(job, sid, chat_id, content, agent_id, settings):
+    """Job body for a web chat message — runs on a job worker, replies to the sender's sid."""
+    socketio.emit('agent_running', {'chat_id': chat_id, 'job_id': job.id}, to=sid)
+    # Saved here (not in the handler) so messages of one chat stay in order
+    add_message(chat_id, 'user', content)
+    chat = get_chat(chat_id)
+
+    emit_log = job.track(log_stream.make_emit_log(socketio, chat_id=chat_id))
 
     # Resolve optional agent system_prompt + provider/model overrides
     agent_system_prompt = None
     agent_provider_id = None
     agent_model = None
+    agent_budget = None
     if agent_id:
         agent_cfg = get_agent(agent_id)
         if agent_cfg:
             agent_system_prompt = agent_cfg.get('system_prompt') or None
             agent_provider_id = agent_cfg.get('provider_id') or None
             agent_model = agent_cfg.get('model') or None
+            agent_budget = agent_cfg.get('budget')
 
     # Beim initialen Agent-Greeting (neuer Chat mit agent_id) keine Tools nötig
-    is_agent_start = bool(agent_id and len(messages) == 1)
+    history_len = sum(1 for m in chat.get('messages', []) if m['role'] in ('user', 'assistant'))
+    is_agent_start = bool(agent_id and history_len == 1)
+    budget = RunBudget.from_settings(settings, agent_budget)
 
     try:
+        # Long chats: older messages are replaced by a rolling summary
+        messages = build_chat_context(chat, settings, emit_log, budget=budget)
         response = run_agent(messages, settings, emit_log, system_prompt=agent_system_prompt,
                              agent_provider_id=agent_provider_id, agent_model=agent_model, chat_id=chat_id,
-                             stop_event=stop_event, no_tools=is_agent_start)
-        if stop_event.is_set():
+                             stop_event=job.stop_event, no_tools=is_agent_start, budget=budget)
+        tracing.annotate(stop_reason=budget.stop_reason, iterations=budget.iterations)
+        # Deliver the buffered terminal log before agent_response / agent_end
+        log_stream.flush(socketio)
+        if job.stop_event.is_set():
             emit_log({"type": "text", "message": "⏹ Generierung abgebrochen."})
-            emit('agent_end', {'chat_id': chat_id, 'cancelled': True})
+            log_stream.flush(socketio)
+            socketio.emit('agent_end', {'chat_id': chat_id, 'job_id': job.id, 'cancelled': True, 'stop_reason': 'cancelled'}, to=sid)
             return
         response = file_store.extract_and_store(response, chat_id)
         add_message(chat_id, 'assistant', response)
-        emit('agent_response', {
+        socketio.emit('agent_response', {
             'chat_id': chat_id,
             'content': response
-        })
+        }, to=sid)
     except Exception as e:
         error_msg = f"Fehler: {str(e)}"
+        budget.stop_reason = budget.stop_reason or 'error'
         emit_log(f"KRITISCHER FEHLER: {error_msg}")
+        log_stream.flush(socketio)
         add_message(chat_id, 'assistant', error_msg)
-        emit('agent_response', {
+        socketio.emit('agent_response', {
             'chat_id': chat_id,
             'content': error_msg
-        })
-    finally:
-        _cancel_flags.pop(sid, None)
-
-    emit('agent_end', {'chat_id': chat_id})
+        }, to=sid)
 
+    socketio.emit('agent_end', {'chat_id': chat_id, 'job_id': job.id, 'stop_reason': budget.stop_reason, 'budget': budget.summary()}, to=sid)
 
 
 @socketio.on('cancel_generation')
-def handle_cancel():
-    flag = _cancel_flags.get(flask_request.sid)
-    if flag:
-        flag.set()
-        socketio.emit('guenther_log', {"type": "text", "message": "⏹ Abbruch angefordert..."})
+def handle_cancel(data=None):
+    """Cancel one job ({job_id}) or all running/queued jobs of this client."""
+    job_id = (data or {}).get('job_id')
+    if job_id:
+        job = job_manager.get(job_id)
+        cancelled = [job_manager.cancel(job_id)] if job and job.owner == flask_request.sid else []
+    else:
+        cancelled = job_manager.cancel_owner(flask_request.sid)
+    for job in cancelled:
+        emit('guenther_log', {"type": "text", "message": "⏹ Abbruch angefordert..."})
+        if job.status == jobs.STATUS_CANCELLED:
+            # Was still queued — no worker will report back
+            emit('agent_end', {'chat_id': job.chat_id, 'job_id': job.id, 'cancelled': True, 'stop_reason': 'cancelled'})
 
 
-@socketio.on('disconnect')
-def handle_disconnect():
-    _cancel_flags.pop(flask_request.sid, None)
+@socketio.on('subscribe_logs')
+def handle_subscribe_logs(data):
+    """Join the log room of a chat ({chat_id}) and/or the opt-in firehose ({firehose: true})."""
+    data = data or {}
+    if data.get('chat_id'):
+        join_room(log_stream.chat_room(data['chat_id']))
+    if data.get('firehose'):
+        join_room(log_stream.FIREHOSE_ROOM)
+
 
+@socketio.on('unsubscribe_logs')
+def handle_unsubscribe_logs(data):
+    data = data or {}
+    if data.get('chat_id'):
+        leave_room(log_stream.chat_room(data['chat_id']))
+    if data.get('firehose'):
+        leave_room(log_stream.FIREHOSE_ROOM)
 
-# Auto-start Telegram gateway if token is configured
-_tg_token = get_settings().get('telegram', {}).get('bot_token', '')
-if _tg_token:
-    telegram_gateway.start(_tg_token)
 
-# Start Autoprompt scheduler
 _autoprompt_service = AutopromptService(socketio)
 set_autoprompt_service(_autoprompt_service)
 
 
+def _on_elected():
+    """Process-wide singletons run only on the cluster leader (always this process without a cluster)."""
+    # Auto-start Telegram gateway if token is configured
+    tg_token = get_settings().get('telegram', {}).get('bot_token', '')
+    if tg_token:
+        telegram_gateway.start(tg_token)
+    # Start Autoprompt scheduler
+    _autoprompt_service.start()
+
+
+def _on_demoted():
+    telegram_gateway.stop()
+    _autoprompt_service.stop()
+
+
+cluster.start(_on_elected, _on_demoted, on_cancel=job_manager.cancel)
+
+
 if __name__ == '__main__':
     socketio.run(
         app,
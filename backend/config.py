@@ -11,6 +11,26 @@ AUTOPROMPTS_FILE = os.path.join(DATA_DIR, 'autoprompts.json')
 TELEGRAM_USERS_FILE = os.path.join(DATA_DIR, 'telegram_users.json')
 FILES_DIR = os.path.join(DATA_DIR, 'files')
 
+# Server mode: 'threading' (default) or 'gevent' (opt-in via python server.py, see its docstring).
+# Must be known before any import → environment variable.
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading').strip().lower() or 'threading'
+
+# Scale-out (services/cluster.py): '' = single process, 'file' = processes on one host
+# sharing DATA_DIR, 'redis' = multiple hosts. MESSAGE_QUEUE (e.g. redis://redis:6379/0)
+# relays Socket.IO emits between processes.
+CLUSTER_BACKEND = os.environ.get('CLUSTER_BACKEND', '').strip().lower()
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+MESSAGE_QUEUE = os.environ.get('MESSAGE_QUEUE', '').strip() or None
+
+# Built-in tools are imported on first call ('1', default) or all at startup ('0' —
+# surfaces import errors immediately, used as baseline by scripts/bench_startup.py)
+LAZY_TOOLS = os.environ.get('LAZY_TOOLS', '1').strip() != '0'
+
+# Downloads from DATA_DIR: if set (e.g. '/_data/'), responses carry only an
+# X-Accel-Redirect header and nginx serves the file from an internal location that
+# maps this prefix to DATA_DIR. Empty = stream from Python (with Range support).
+X_ACCEL_REDIRECT = os.environ.get('X_ACCEL_REDIRECT', '').strip()
+
 DEFAULT_SETTINGS = {
     'openrouter_api_key': '',
     'model': 'openai/gpt-4o-mini',
@@ -21,12 +41,96 @@ DEFAULT_SETTINGS = {
     'openai_api_key': '',   # OpenAI API Key (für Whisper STT)
     'use_openai_whisper': False,  # Whisper statt OpenRouter für STT verwenden
     'mcp_servers': [],
+    # Externe MCP-Server: Verbindungsaufbau parallel, abgestürzte Server werden neu gestartet
+    'mcp_external': {
+        'connect_timeout': 30,            # Sekunden pro Server (überschreibbar per server['connect_timeout'])
+        'restart_backoff_initial': 2,     # Wartezeit vor dem 2. Neustartversuch, verdoppelt sich
+        'restart_backoff_max': 300,
+        # Prozess-Pool pro stdio-Server (pro Server überschreibbar per server['pool'])
+        'pool': {
+            'min': 1,              # ständig laufende Prozesse
+            'max': 1,              # bei Last zusätzlich gestartete Prozesse bis zu dieser Zahl
+            'idle_timeout': 300,   # Sekunden ohne Aufruf, danach werden Prozesse über 'min' beendet
+            'max_calls': 0,        # Prozess nach so vielen Aufrufen ersetzen (0 = nie)
+            'ping_interval': 30,   # Health-Check ruhender Prozesse
+        },
+    },
     'tool_settings': {},
     'telegram': {
         'bot_token': '',
         'allowed_users': [],
     },
     'llm_timeout': 120,
+    'budget': {
+        'max_iterations': 10,
+        # Optional: max_wall_seconds, max_prompt_tokens, max_completion_tokens, max_cost (USD), max_tool_calls
+    },
+    # USD pro 1 Mio. Tokens: {provider_id: {model | '*': {'prompt': 0.15, 'completion': 0.6}}}
+    'price_table': {},
+    'tool_cache': {
+        'enabled': True,
+        'max_entries': 512,   # LRU-Größe im Speicher
+        'persist': False,     # zusätzlich in SQLite ablegen (überlebt Neustarts)
+    },
+    # Haupt-Completion parallel zum Tool-Router mit geratener Tool-Auswahl starten
+    # (spart eine LLM-Runde, kostet bei Fehlschätzung zusätzliche Tokens)
+    'speculative_routing': {
+        'enabled': False,
+        'max_tools': 6,   # max. per Stichwort-Heuristik geratene Tools
+    },
+    # Terminal-Log: Einträge werden gesammelt und als guenther_log_batch gesendet
+    'log_stream': {
+        'batch_interval_ms': 50,
+        'batch_size': 50,         # früher senden, sobald so viele Einträge anstehen
+        'max_pending': 1000,      # max. wartende Einträge pro Raum zwischen zwei Sendungen (serverseitig, nicht pro Client);
+                                  # darüber werden Einträge verworfen, ab der Hälfte große JSON-Blöcke gekürzt
+        'max_json_bytes': 20000,
+        'max_unacked': 20,        # unbestätigte Batches pro Client, darüber gilt er als zu langsam (Batches werden übersprungen)
+        'ack_timeout': 30,        # Sekunden, nach denen ein fehlendes Ack nicht mehr zählt
+    },
+    # Zentraler Job-Manager für Agent-Läufe (Web, Telegram, Webhooks, Autoprompts)
+    'jobs': {
+        'max_workers': 4,   # gleichzeitig laufende Agent-Läufe
+        'max_queue': 50,    # wartende Aufträge, darüber wird abgelehnt
+        # Admission Control pro Quelle (web, telegram, webhook, autoprompt); fehlend = globales Limit
+        'max_running': {'webhook': 2, 'autoprompt': 2},  # gleichzeitige Läufe
+        'max_queued': {'webhook': 10, 'autoprompt': 10, 'telegram': 20},  # wartende Aufträge → sonst 429 / "ausgelastet"
+        # Optional: 'priorities': {'web': 0, 'telegram': 1, 'webhook': 2, 'autoprompt': 3}
+    },
+    # Tools mit "execution": "process" laufen in einem Pool separater Worker-Prozesse
+    'sandbox': {
+        'enabled': True,
+        'workers': 2,          # vorgestartete Worker (= gleichzeitige Sandbox-Aufrufe)
+        'timeout': 120,        # Sekunden Laufzeit pro Aufruf, danach wird der Worker beendet
+        'cpu_seconds': 120,    # CPU-Zeit pro Aufruf (RLIMIT_CPU)
+        'memory_mb': 2048,     # Adressraum des Workers während eines Aufrufs (RLIMIT_AS)
+        # pro Tool überschreibbar per TOOL_DEFINITION['limits']
+    },
+    # Tracing pro Chat-Turn (Router, LLM-Aufrufe, Tools, Speichern) — Wasserfall unter /api/traces/<trace_id>
+    'tracing': {
+        'enabled': True,
+        'exporters': ['db'],   # 'db' (Wasserfall-API), 'file' (JSON Lines im OTLP-Format), 'console' (Log)
+        'file': '',            # leer = DATA_DIR/traces.jsonl
+        'sample_rate': 1.0,    # Anteil der aufgezeichneten Turns (0.0–1.0)
+    },
+    # Custom Tools (DATA_DIR/custom_tools): geänderte Tools werden automatisch neu geladen
+    'custom_tools': {
+        'watch': True,
+        'watch_interval': 2,   # Sekunden zwischen zwei Prüfungen des Verzeichnisses
+    },
+    'chat_summary': {
+        'enabled': True,
+        'threshold_tokens': 12000,  # ab dieser geschätzten Kontextlänge (Zusammenfassung + neuere Nachrichten) wird zusammengefasst
+        'keep_recent': 10,          # so viele letzte Nachrichten bleiben wörtlich erhalten
+        'min_batch': 6,             # erst ab so vielen noch nicht zusammengefassten älteren Nachrichten
+        'model': '',                # leer = Hauptmodell
+    },
+    # Text-Anhänge: große Dateien werden einmal gespeichert, pro Frage gehen nur passende Abschnitte ans LLM
+    'attachments': {
+        'inline_max_chars': 20000,   # bis zu dieser Größe wie bisher komplett in die Nachricht
+        'chunk_chars': 1500,         # Abschnittsgröße (zeilenweise)
+        'max_context_chars': 12000,  # max. Auszug pro Anfrage (verteilt auf alle Anhänge)
+    },
     'providers': {
         'openrouter': {'name': 'OpenRouter', 'base_url': 'https://openrouter.ai/api/v1',  'api_key': '', 'enabled': True},
         'mistral':    {'name': 'Mistral',    'base_url': 'https://api.mistral.ai/v1',     'api_key': '', 'enabled': False},
@@ -1,34 +1,74 @@
 import os
 import subprocess
 import json
+import logging
+import threading
+import itertools
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 120      # seconds per request (tools/call can be slow)
+CONNECT_TIMEOUT = 30       # seconds for initialize
+_STDERR_TAIL_LINES = 50
 
 
 class MCPStdioClient:
-    """Client for MCP servers communicating over stdio (JSON-RPC 2.0)."""
+    """
+    Client for MCP servers communicating over stdio (JSON-RPC 2.0).
 
-    def __init__(self, command, args=None, env=None):
+    Thread-safe and multiplexed: any number of threads may call call_tool()
+    concurrently. Requests are written under a lock; a reader thread routes each
+    response to the Future of its request id, so many requests can be in flight
+    on one server process. Progress notifications are passed to the per-request
+    on_progress callback, requests from the server (ping) are answered, and
+    stderr is drained continuously (a full stderr pipe would block the child).
+    """
+
+    def __init__(self, command, args=None, env=None, timeout=DEFAULT_TIMEOUT):
         self.command = command
         self.args = args or []
         self.env = env
+        self.timeout = timeout
         self.process = None
-        self._id = 0
+        self._ids = itertools.count(1)
+        self._write_lock = threading.Lock()
+        self._pending = {}         # request id -> Future
+        self._progress = {}        # progress token -> callback
+        self._pending_lock = threading.Lock()
+        self._closed = threading.Event()
+        self.stderr_tail = deque(maxlen=_STDERR_TAIL_LINES)
 
     def _next_id(self):
-        self._id += 1
-        return self._id
+        return next(self._ids)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and not self._closed.is_set()
 
-    def connect(self):
+    def connect(self, timeout=CONNECT_TIMEOUT):
         env = os.environ.copy()
         if self.env:
             env.update(self.env)
+        self._closed.clear()
         self.process = subprocess.Popen(
             [self.command] + self.args,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
+            bufsize=1,
             env=env
         )
+        threading.Thread(target=self._read_stdout, args=(self.process,), daemon=True,
+                         name=f"mcp-stdout-{self.command}").start()
+        threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True,
+                         name=f"mcp-stderr-{self.command}").start()
         response = self._send_request("initialize", {
             "protocolVersion": "2024-11-05",
             "capabilities": {},
@@ -36,19 +76,136 @@ class MCPStdioClient:
                 "name": "guenther",
                 "version": "1.0.0"
             }
-        })
+        }, timeout=timeout)
+        if response is None or 'error' in response:
+            detail = (response or {}).get('error') or self._stderr_hint() or 'keine Antwort'
+            self.disconnect()
+            raise RuntimeError(f"MCP initialize fehlgeschlagen: {detail}")
         self._send_notification("notifications/initialized")
         return response
 
-    def _send_request(self, method, params=None):
+    # ── Transport ──────────────────────────────────────────────────────────────
+
+    def _write(self, msg):
+        if not self.alive or not self.process.stdin:
+            raise RuntimeError("Not connected to MCP server")
+        line = json.dumps(msg) + '\n'
+        with self._write_lock:
+            self.process.stdin.write(line)
+            self.process.stdin.flush()
+
+    def _read_stdout(self, process):
+        """Reader thread: route responses to their Future, handle notifications."""
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.debug(f"[mcp] {self.command}: non-JSON output: {line[:200]}")
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                if 'method' in data:
+                    self._handle_server_message(data)
+                elif 'id' in data:
+                    with self._pending_lock:
+                        future = self._pending.pop(data['id'], None)
+                    if future is not None and not future.done():
+                        future.set_result(data)
+        except (OSError, ValueError):
+            pass  # pipe closed during disconnect
+        finally:
+            self._closed.set()
+            self._fail_pending(ConnectionError(
+                f"MCP server '{self.command}' beendet" + (f": {self._stderr_hint()}" if self.stderr_tail else '')
+            ))
+
+    def _drain_stderr(self, process):
+        try:
+            for line in process.stderr:
+                line = line.rstrip()
+                if line:
+                    self.stderr_tail.append(line)
+                    logger.debug(f"[mcp] {self.command} stderr: {line}")
+        except (OSError, ValueError):
+            pass
+
+    def _stderr_hint(self):
+        return ' | '.join(list(self.stderr_tail)[-3:])
+
+    def _handle_server_message(self, data):
+        method = data.get('method')
+        if method == 'notifications/progress':
+            params = data.get('params') or {}
+            callback = self._progress.get(params.get('progressToken'))
+            if callback:
+                try:
+                    callback(params)
+                except Exception as e:
+                    logger.warning(f"[mcp] progress callback failed: {e}")
+        elif 'id' in data:
+            # Request from the server: answer ping, reject everything else
+            if method == 'ping':
+                reply = {"jsonrpc": "2.0", "id": data['id'], "result": {}}
+            else:
+                reply = {"jsonrpc": "2.0", "id": data['id'],
+                         "error": {"code": -32601, "message": f"Method not supported: {method}"}}
+            try:
+                self._write(reply)
+            except Exception:
+                pass
+
+    def _fail_pending(self, exc):
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._progress.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(exc)
+
+    # ── JSON-RPC ───────────────────────────────────────────────────────────────
+
+    def _send_request(self, method, params=None, timeout=None, on_progress=None):
+        """
+        Send a request and wait for its response (dict) — None if the server
+        went away. On timeout the server is sent notifications/cancelled and a
+        JSON-RPC style error response is returned.
+        """
+        request_id = self._next_id()
         msg = {
             "jsonrpc": "2.0",
-            "id": self._next_id(),
+            "id": request_id,
             "method": method,
         }
         if params is not None:
             msg["params"] = params
-        return self._send(msg)
+        future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+            if on_progress:
+                self._progress[request_id] = on_progress
+                msg["params"] = {**(params or {}), "_meta": {"progressToken": request_id}}
+        try:
+            self._write(msg)
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            try:
+                self._send_notification("notifications/cancelled", {
+                    "requestId": request_id, "reason": "timeout",
+                })
+            except Exception:
+                pass
+            return {"error": {"code": -32001, "message": f"Timeout nach {timeout or self.timeout}s ({method})"}}
+        except ConnectionError:
+            return None
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+                self._progress.pop(request_id, None)
 
     def _send_notification(self, method, params=None):
         msg = {
@@ -57,32 +214,11 @@ class MCPStdioClient:
         }
         if params is not None:
             msg["params"] = params
-        if self.process and self.process.stdin:
-            self.process.stdin.write(json.dumps(msg) + '\n')
-            self.process.stdin.flush()
+        self._write(msg)
 
-    def _send(self, message):
-        if not self.process or not self.process.stdin or not self.process.stdout:
-            raise RuntimeError("Not connected to MCP server")
-        request_id = message.get('id')
-        self.process.stdin.write(json.dumps(message) + '\n')
-        self.process.stdin.flush()
-        # Keep reading until we get the response matching our request id.
-        # MCP servers may send progress notifications before the actual result.
-        while True:
-            line = self.process.stdout.readline()
-            if not line:
-                return None
-            try:
-                data = json.loads(line.strip())
-            except json.JSONDecodeError:
-                continue
-            # Notification (no id) — skip
-            if 'id' not in data:
-                continue
-            # Response to our request
-            if request_id is None or data.get('id') == request_id:
-                return data
+    def ping(self, timeout=5):
+        response = self._send_request("ping", {}, timeout=timeout)
+        return bool(response) and 'result' in response
 
     def list_tools(self):
         response = self._send_request("tools/list", {})
@@ -90,11 +226,11 @@ class MCPStdioClient:
             return response['result'].get('tools', [])
         return []
 
-    def call_tool(self, name, arguments=None):
+    def call_tool(self, name, arguments=None, timeout=None, on_progress=None):
         response = self._send_request("tools/call", {
             "name": name,
             "arguments": arguments or {}
-        })
+        }, timeout=timeout, on_progress=on_progress)
         if response and 'result' in response:
             return response['result']
         if response and 'error' in response:
@@ -103,9 +239,294 @@ class MCPStdioClient:
 
     def disconnect(self):
         if self.process:
+            process, self.process = self.process, None
             try:
-                self.process.terminate()
-                self.process.wait(timeout=5)
+                process.terminate()
+                process.wait(timeout=5)
             except Exception:
-                self.process.kill()
-            self.process = None
+                process.kill()
+            self._closed.set()
+            self._fail_pending(ConnectionError("MCP client disconnected"))
+
+
+# ── Streamable HTTP transport ─────────────────────────────────────────────────
+
+HTTP_PROTOCOL_VERSION = "2025-03-26"
+_HTTP_POOL_SIZE = 16        # keep-alive connections per server (= parallel requests without waiting)
+_RESUME_ATTEMPTS = 3
+
+
+def _iter_sse(response):
+    """Parse a text/event-stream response into (event_id, event, data) tuples."""
+    event_id, event, data = None, 'message', []
+    for raw in response.iter_lines(chunk_size=1024):
+        line = raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else raw
+        if not line:
+            if data:
+                yield event_id, event, '\n'.join(data)
+            event, data = 'message', []
+            continue
+        if line.startswith(':'):
+            continue  # comment / keep-alive
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'data':
+            data.append(value)
+        elif field == 'event':
+            event = value
+        elif field == 'id':
+            event_id = value
+    if data:
+        yield event_id, event, '\n'.join(data)
+
+
+class MCPHttpClient:
+    """
+    Client for MCP servers reachable over HTTP ("streamable HTTP" transport).
+
+    Same interface as MCPStdioClient. Every JSON-RPC request is its own POST on a
+    pooled keep-alive session, so concurrent call_tool() calls simply run in
+    parallel on separate connections. The server answers with plain JSON or with
+    an SSE stream carrying progress notifications before the response; a stream
+    that breaks off is resumed with GET + Last-Event-ID. The Mcp-Session-Id
+    handed out by initialize is sent with every request; when the server has
+    dropped the session (404) the client initializes again and retries once.
+    """
+
+    def __init__(self, url, headers=None, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.session_id = None
+        self.protocol_version = HTTP_PROTOCOL_VERSION
+        self._ids = itertools.count(1)
+        self._session_lock = threading.Lock()
+        self._connected = False
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_HTTP_POOL_SIZE)
+        self._http.mount('http://', adapter)
+        self._http.mount('https://', adapter)
+
+    def _next_id(self):
+        return next(self._ids)
+
+    @property
+    def alive(self):
+        return self._connected
+
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        with self._session_lock:
+            self._initialize(timeout)
+        return True
+
+    def _initialize(self, timeout=CONNECT_TIMEOUT):
+        """Open a new MCP session (caller holds _session_lock)."""
+        self.session_id = None
+        response, _ = self._post({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": "initialize",
+            "params": {
+                "protocolVersion": HTTP_PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "guenther", "version": "1.0.0"},
+            },
+        }, timeout=timeout)
+        if response is None or 'error' in response:
+            self._connected = False
+            detail = (response or {}).get('error') or 'keine Antwort'
+            raise RuntimeError(f"MCP initialize fehlgeschlagen: {detail}")
+        self.protocol_version = response.get('result', {}).get('protocolVersion', HTTP_PROTOCOL_VERSION)
+        self._connected = True
+        self._send_notification("notifications/initialized")
+        return response
+
+    # ── Transport ──────────────────────────────────────────────────────────────
+
+    def _request_headers(self, accept):
+        headers = {**self.headers, 'Accept': accept}
+        if self.session_id:
+            headers['Mcp-Session-Id'] = self.session_id
+            headers['MCP-Protocol-Version'] = self.protocol_version
+        return headers
+
+    def _post(self, msg, timeout=None, on_progress=None):
+        """
+        POST one JSON-RPC message. Returns (response dict or None, http status).
+        For requests the response is read from a JSON body or from the SSE stream.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        try:
+            resp = self._http.post(
+                self.url, json=msg, stream=True,
+                headers=self._request_headers('application/json, text/event-stream'),
+                timeout=(CONNECT_TIMEOUT, timeout),
+            )
+        except requests.Timeout:
+            return _timeout_error(msg.get('method'), timeout), None
+        except requests.RequestException as e:
+            # Server unreachable: report as not alive so the supervisor reconnects
+            logger.warning(f"[mcp] {self.url}: {e}")
+            self._connected = False
+            return None, None
+
+        with resp:
+            if msg.get('method') == 'initialize' and resp.headers.get('Mcp-Session-Id'):
+                self.session_id = resp.headers['Mcp-Session-Id']
+            if 'id' not in msg or resp.status_code == 202:
+                return None, resp.status_code
+            if resp.status_code >= 400:
+                return {"error": {"code": -32000, "message": f"HTTP {resp.status_code}: {resp.text[:200]}"}}, resp.status_code
+            content_type = resp.headers.get('Content-Type', '')
+            if content_type.startswith('text/event-stream'):
+                return self._read_stream(resp, msg, deadline, timeout, on_progress), resp.status_code
+            try:
+                return resp.json(), resp.status_code
+            except ValueError:
+                return {"error": {"code": -32700, "message": "Ungültige JSON-Antwort"}}, resp.status_code
+
+    def _read_stream(self, resp, msg, deadline, timeout, on_progress):
+        """Read SSE events until the response to msg arrives; resume broken streams."""
+        last_event_id = None
+        for attempt in range(_RESUME_ATTEMPTS + 1):
+            try:
+                for event_id, event, data in _iter_sse(resp):
+                    if event_id:
+                        last_event_id = event_id
+                    if event != 'message':
+                        continue
+                    try:
+                        payload = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    for item in payload if isinstance(payload, list) else [payload]:
+                        if not isinstance(item, dict):
+                            continue
+                        if 'method' in item:
+                            self._handle_server_message(item, on_progress)
+                        elif item.get('id') == msg['id']:
+                            return item
+                    if time.monotonic() > deadline:
+                        raise requests.Timeout()
+                # Stream closed without our response
+            except requests.Timeout:
+                self._cancel(msg)
+                return _timeout_error(msg.get('method'), timeout)
+            except (requests.RequestException, OSError) as e:
+                # A read timeout inside the stream surfaces as ConnectionError
+                if time.monotonic() < deadline:
+                    logger.info(f"[mcp] {self.url}: stream interrupted ({e})")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._cancel(msg)
+                return _timeout_error(msg.get('method'), timeout)
+            if not last_event_id or attempt == _RESUME_ATTEMPTS:
+                return None
+            # Resume the stream where it broke off
+            logger.info(f"[mcp] {self.url}: resuming stream after event {last_event_id}")
+            try:
+                headers = self._request_headers('text/event-stream')
+                headers['Last-Event-ID'] = last_event_id
+                resp.close()
+                resp = self._http.get(self.url, headers=headers, stream=True,
+                                      timeout=(CONNECT_TIMEOUT, remaining))
+                if resp.status_code != 200:
+                    logger.warning(f"[mcp] {self.url}: resume failed with HTTP {resp.status_code}")
+                    return None
+            except requests.RequestException as e:
+                logger.warning(f"[mcp] {self.url}: resume failed: {e}")
+                return None
+        return None
+
+    def _handle_server_message(self, data, on_progress):
+        method = data.get('method')
+        if method == 'notifications/progress':
+            if on_progress:
+                try:
+                    on_progress(data.get('params') or {})
+                except Exception as e:
+                    logger.warning(f"[mcp] progress callback failed: {e}")
+        elif 'id' in data:
+            if method == 'ping':
+                reply = {"jsonrpc": "2.0", "id": data['id'], "result": {}}
+            else:
+                reply = {"jsonrpc": "2.0", "id": data['id'],
+                         "error": {"code": -32601, "message": f"Method not supported: {method}"}}
+            self._post(reply, timeout=CONNECT_TIMEOUT)
+
+    def _cancel(self, msg):
+        try:
+            self._send_notification("notifications/cancelled", {"requestId": msg['id'], "reason": "timeout"})
+        except Exception:
+            pass
+
+    # ── JSON-RPC ───────────────────────────────────────────────────────────────
+
+    def _send_request(self, method, params=None, timeout=None, on_progress=None):
+        """Same contract as MCPStdioClient._send_request."""
+        if not self._connected:
+            raise RuntimeError("Not connected to MCP server")
+        for retry in (False, True):
+            msg = {"jsonrpc": "2.0", "id": self._next_id(), "method": method}
+            if params is not None:
+                msg["params"] = params
+            if on_progress:
+                msg["params"] = {**(params or {}), "_meta": {"progressToken": msg['id']}}
+            session = self.session_id
+            response, status = self._post(msg, timeout=timeout, on_progress=on_progress)
+            if status != 404 or not session or retry:
+                return response
+            # Session expired on the server — start a new one (once per caller)
+            with self._session_lock:
+                if self.session_id == session:
+                    logger.info(f"[mcp] {self.url}: session expired, re-initializing")
+                    try:
+                        self._initialize()
+                    except RuntimeError as e:
+                        logger.warning(f"[mcp] {self.url}: {e}")
+                        return None
+        return None
+
+    def _send_notification(self, method, params=None):
+        msg = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            msg["params"] = params
+        self._post(msg, timeout=CONNECT_TIMEOUT)
+
+    def ping(self, timeout=5):
+        response = self._send_request("ping", {}, timeout=timeout)
+        return bool(response) and 'result' in response
+
+    def list_tools(self):
+        response = self._send_request("tools/list", {})
+        if response and 'result' in response:
+            return response['result'].get('tools', [])
+        return []
+
+    def call_tool(self, name, arguments=None, timeout=None, on_progress=None):
+        response = self._send_request("tools/call", {
+            "name": name,
+            "arguments": arguments or {}
+        }, timeout=timeout, on_progress=on_progress)
+        if response and 'result' in response:
+            return response['result']
+        if response and 'error' in response:
+            return {"error": response['error']}
+        return {"error": "No response from MCP server"}
+
+    def disconnect(self):
+        """Terminate the session on the server (DELETE) and close pooled connections."""
+        self._connected = False
+        if self.session_id:
+            try:
+                self._http.delete(self.url, headers=self._request_headers('application/json'),
+                                  timeout=CONNECT_TIMEOUT)
+            except requests.RequestException:
+                pass
+            self.session_id = None
+        self._http.close()
+
+
+def _timeout_error(method, timeout):
+    return {"error": {"code": -32001, "message": f"Timeout nach {timeout}s ({method})"}}
@@ -12,15 +12,46 @@ Optionally:
   SETTINGS_SCHEMA  — list of setting definitions
   TOOL_DEFINITIONS — list of dicts (for tool.py files that register multiple tools)
   HANDLERS         — dict {tool_name: callable} (paired with TOOL_DEFINITIONS)
+
+TOOL_DEFINITION may carry 'cache_ttl' (seconds) to memoize results for
+identical arguments — see services/tool_cache.py — and "execution": "process"
+(optionally with 'limits') to run the handler in the sandbox worker pool instead
+of the web process — see services/sandbox.py.
+
+Built-in tools are registered lazily: TOOL_DEFINITION, SETTINGS_SCHEMA,
+SETTINGS_INFO and USAGE are read from the source with ast.literal_eval (no
+import, so no yfinance / matplotlib / python-pptx / weasyprint at startup) and
+cached in DATA_DIR/cache/tool_manifest.json, keyed by file mtime and size. The
+tool's module is imported on its first call. Tools whose metadata isn't a plain
+literal (e.g. TOOL_DEFINITIONS built in code) are imported eagerly as before.
+
+Custom tools are reloaded incrementally: load_custom_tools() keeps a source hash
+per tool directory and only re-imports tools whose .py files changed; tools whose
+directory is gone are unregistered. Helper modules next to a tool.py are evicted
+from sys.modules on reload. Tool directories are not put on sys.path; a meta path
+finder resolves a tool's sibling modules by name — while tool.py executes and
+when a handler imports one later (slidegen: 'import slidegen' at call time). If
+two tools ship a helper of the same name, the most recently loaded tool's wins.
+start_custom_tool_watcher() polls the directory in the
+background (settings['custom_tools']), so edits take effect without
+/api/mcp/reload.
 """
 
+import ast
+import hashlib
+import json
 import os
 import sys
+import threading
+import time
+import importlib.abc
+import importlib.machinery
 import importlib.util
 import logging
 
 from mcp.registry import registry, MCPTool
-from config import DATA_DIR
+from config import DATA_DIR, LAZY_TOOLS, get_settings
+from services.sandbox import SandboxHandler
 
 logger = logging.getLogger(__name__)
 
@@ -32,25 +63,252 @@ def get_startup_errors():
     return list(_startup_errors)
 
 
+# sys.modules is process-wide: one tool import at a time
+_import_lock = threading.RLock()
+# Helper module name -> tool directory it was imported from
+_helper_owner = {}
+# Top-level helper name -> tool directory that provides it (see _ToolHelperFinder)
+_helper_dirs = {}
+
+
+def _in_dir(mod, directory):
+    path = getattr(mod, '__file__', None)
+    return bool(path) and os.path.abspath(path).startswith(directory + os.sep)
+
+
+def _sibling_modules(tool_dir):
+    """Importable names next to tool.py: helper .py files and packages."""
+    names = set()
+    for entry in os.listdir(tool_dir):
+        base, ext = os.path.splitext(entry)
+        if ext == '.py' and base not in ('tool', '__init__'):
+            names.add(base)
+        elif os.path.isfile(os.path.join(tool_dir, entry, '__init__.py')):
+            names.add(entry)
+    return names
+
+
+class _ToolHelperFinder(importlib.abc.MetaPathFinder):
+    """Finds a tool's helper modules in its directory without touching sys.path."""
+
+    def find_spec(self, fullname, path, target=None):
+        if path is not None:
+            return None  # submodules of helper packages are found via the package's __path__
+        tool_dir = _helper_dirs.get(fullname)
+        if tool_dir is None:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, [tool_dir])
+        if spec is not None:
+            _helper_owner[fullname] = tool_dir
+        return spec
+
+
+def _install_finder():
+    if not any(isinstance(f, _ToolHelperFinder) for f in sys.meta_path):
+        # First, like the tool directory at sys.path[0] used to be
+        sys.meta_path.insert(0, _ToolHelperFinder())
+
+
+def _forget_tool_dir(tool_dir):
+    """Drop a (deleted) tool directory's helpers from the finder and sys.modules."""
+    with _import_lock:
+        for name in [n for n, d in _helper_dirs.items() if d == tool_dir]:
+            del _helper_dirs[name]
+        for name in [n for n, d in _helper_owner.items() if d == tool_dir]:
+            sys.modules.pop(name, None)
+            del _helper_owner[name]
+
+
 def _load_module(tool_py_path, module_name):
-    """Import a tool.py file by path and return the module."""
-    tool_dir = os.path.dirname(tool_py_path)
-    # Add tool directory to sys.path so helper modules in the same dir are importable
-    if tool_dir not in sys.path:
-        sys.path.insert(0, tool_dir)
-    spec = importlib.util.spec_from_file_location(module_name, tool_py_path)
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
+    """
+    Import a tool.py file by path and return the module. Helper modules in the same
+    directory stay importable by name (also from handlers at call time); the ones
+    imported while tool.py executed are listed in mod.__tool_helpers__.
+    """
+    tool_dir = os.path.dirname(os.path.abspath(tool_py_path))
+    with _import_lock:
+        _install_finder()
+        # A helper of the same name from another tool (or an older version of this
+        # one) must not be picked up from sys.modules
+        siblings = _sibling_modules(tool_dir)
+        for name in [n for n in _helper_owner if n.split('.')[0] in siblings]:
+            sys.modules.pop(name, None)
+            _helper_owner.pop(name, None)
+        for name in siblings:
+            _helper_dirs[name] = tool_dir
+        before = set(sys.modules)
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, tool_py_path)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+        finally:
+            helpers = [n for n in set(sys.modules) - before if _in_dir(sys.modules[n], tool_dir)]
+            for name in helpers:
+                _helper_owner[name] = tool_dir
+    mod.__tool_helpers__ = helpers
     return mod
 
 
+_MANIFEST_FILE = os.path.join(DATA_DIR, 'cache', 'tool_manifest.json')
+_MANIFEST_VERSION = 1
+_LITERAL_NAMES = ('TOOL_DEFINITION', 'SETTINGS_SCHEMA', 'SETTINGS_INFO', 'USAGE', 'IS_CUSTOM')
+
+
+def _scan_tool_source(tool_py_path):
+    """
+    Read a tool.py's metadata without executing it. Returns the manifest entry
+    {'definition', 'settings_schema', 'settings_info', 'usage', 'is_custom',
+    'handler'} or None if the tool can't be described statically.
+    """
+    with open(tool_py_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=tool_py_path)
+
+    values, functions, assigned, imports = {}, set(), set(), set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            imports.add(node.module.split('.')[0])
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if not isinstance(target, ast.Name):
+                    continue
+                assigned.add(target.id)
+                if target.id == 'TOOL_DEFINITIONS':
+                    return None  # multi-tool modules: handler mapping needs the module
+                if target.id in _LITERAL_NAMES and node.value is not None:
+                    try:
+                        values[target.id] = ast.literal_eval(node.value)
+                    except ValueError:
+                        return None
+
+    td = values.get('TOOL_DEFINITION')
+    if not isinstance(td, dict) or not {'name', 'description', 'input_schema'} <= td.keys():
+        return None
+    # Same resolution order as _register_module: 'handler', then the function named after the tool
+    handler = next((n for n in ('handler', td['name']) if n in functions or n in assigned), None)
+    if handler is None:
+        return None
+    return {
+        'definition': td,
+        'settings_schema': values.get('SETTINGS_SCHEMA'),
+        'settings_info': values.get('SETTINGS_INFO'),
+        'usage': values.get('USAGE'),
+        'is_custom': bool(values.get('IS_CUSTOM', False)),
+        'handler': handler,
+        'imports': sorted(imports),
+    }
+
+
+def _missing_import(meta, tool_dir):
+    """First top-level import of the tool that isn't installed (checked without importing it)."""
+    for name in meta.get('imports', []):
+        if name in sys.builtin_module_names or os.path.exists(os.path.join(tool_dir, name + '.py')):
+            continue
+        try:
+            if importlib.util.find_spec(name) is None:
+                return name
+        except (ImportError, ValueError):
+            return name
+    return None
+
+
+def _load_manifest():
+    try:
+        with open(_MANIFEST_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == _MANIFEST_VERSION:
+            return data.get('tools', {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _save_manifest(tools):
+    try:
+        os.makedirs(os.path.dirname(_MANIFEST_FILE), exist_ok=True)
+        tmp = f"{_MANIFEST_FILE}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': _MANIFEST_VERSION, 'tools': tools}, f, ensure_ascii=False)
+        os.replace(tmp, _MANIFEST_FILE)
+    except OSError as e:
+        logger.warning(f"[loader] Could not write tool manifest: {e}")
+
+
+class _LazyHandler:
+    """Stands in for a built-in tool's handler until its first call, then imports the module."""
+
+    def __init__(self, tool_py_path, module_name, handler_name, tool_name):
+        self.tool_py_path = tool_py_path
+        self.module_name = module_name
+        self.handler_name = handler_name
+        self.tool_name = tool_name
+        self._lock = threading.Lock()
+        self._resolved = None
+
+    def resolve(self):
+        if self._resolved is None:
+            with self._lock:
+                if self._resolved is None:
+                    mod = sys.modules.get(self.module_name) or _load_module(self.tool_py_path, self.module_name)
+                    fn = getattr(mod, self.handler_name, None)
+                    if fn is None:
+                        raise RuntimeError(f"Tool '{self.tool_name}': Handler '{self.handler_name}' nicht gefunden")
+                    logger.info(f"[loader] Imported '{self.module_name}' on first call of '{self.tool_name}'")
+                    # Cached here only: registered MCPTool objects are shared by snapshots
+                    self._resolved = fn
+        return self._resolved
+
+    def __call__(self, **kwargs):
+        return self.resolve()(**kwargs)
+
+
+def _sandboxed(td, tool_py_path, module_name, handler_name):
+    """SandboxHandler for tools declaring "execution": "process", else None."""
+    if td.get('execution') != 'process':
+        return None
+    return SandboxHandler(tool_py_path, module_name, handler_name, td['name'], td.get('limits'))
+
+
+def _register_lazy(entry, tool_py_path, module_name, source_label):
+    td = entry['definition']
+    handler = (_sandboxed(td, tool_py_path, module_name, entry['handler'])
+               or _LazyHandler(tool_py_path, module_name, entry['handler'], td['name']))
+    registry.register(MCPTool(
+        name=td['name'],
+        description=td['description'],
+        input_schema=td['input_schema'],
+        handler=handler,
+        settings_schema=entry['settings_schema'],
+        settings_info=entry['settings_info'],
+        custom=entry['is_custom'],
+        usage=entry['usage'],
+        always_enabled=bool(td.get('always_enabled', False)),
+        cache_ttl=td.get('cache_ttl'),
+    ))
+    logger.info(f"[loader] Registered '{td['name']}' from {source_label} (lazy)")
+
+
 def _register_module(mod, source_label='', custom=False):
     """
     Extract tool definitions and handlers from a module and register them.
     Supports single (TOOL_DEFINITION) and multi-tool (TOOL_DEFINITIONS) conventions.
     Returns number of registered tools.
     """
-    count = 0
+    tools = _module_tools(mod, source_label, custom)
+    with registry.batch():
+        for tool in tools:
+            registry.register(tool)
+            logger.info(f"[loader] Registered '{tool.name}' from {source_label}")
+    return len(tools)
+
+
+def _module_tools(mod, source_label='', custom=False):
+    """MCPTool objects defined by a module (without registering them)."""
+    tools = []
 
     # ── Multi-tool convention ──────────────────────────────────────────────────
     defs = getattr(mod, 'TOOL_DEFINITIONS', None)
@@ -66,7 +324,7 @@ def _register_module(mod, source_label='', custom=False):
             schema = getattr(mod, 'SETTINGS_SCHEMA', None)
             info = getattr(mod, 'SETTINGS_INFO', None)
             is_custom = custom or bool(getattr(mod, 'IS_CUSTOM', False))
-            registry.register(MCPTool(
+            tools.append(MCPTool(
                 name=name,
                 description=td['description'],
                 input_schema=td['input_schema'],
@@ -76,84 +334,237 @@ def _register_module(mod, source_label='', custom=False):
                 custom=is_custom,
                 usage=usage,
                 always_enabled=bool(td.get('always_enabled', False)),
+                cache_ttl=td.get('cache_ttl'),
             ))
-            logger.info(f"[loader] Registered '{name}' from {source_label}")
-            count += 1
-        return count
+        return tools
 
     # ── Single-tool convention ─────────────────────────────────────────────────
     td = getattr(mod, 'TOOL_DEFINITION', None)
     if td is None:
         logger.warning(f"[loader] {source_label}: no TOOL_DEFINITION found, skipping")
-        return 0
+        return tools
 
     name = td['name']
     # Accept 'handler' or the function named after the tool
     h = getattr(mod, 'handler', None) or getattr(mod, name, None)
     if h is None:
         logger.warning(f"[loader] {source_label}: no handler for '{name}', skipping")
-        return 0
+        return tools
 
     schema = getattr(mod, 'SETTINGS_SCHEMA', None)
     info = getattr(mod, 'SETTINGS_INFO', None)
     usage = getattr(mod, 'USAGE', None)
     is_custom = custom or bool(getattr(mod, 'IS_CUSTOM', False))
-    registry.register(MCPTool(
+    handler_name = 'handler' if getattr(mod, 'handler', None) else name
+    tools.append(MCPTool(
         name=name,
         description=td['description'],
         input_schema=td['input_schema'],
-        handler=h,
+        handler=_sandboxed(td, mod.__file__, mod.__name__, handler_name) or h,
         settings_schema=schema,
         settings_info=info,
         custom=is_custom,
         usage=usage,
         always_enabled=bool(td.get('always_enabled', False)),
+        cache_ttl=td.get('cache_ttl'),
     ))
-    logger.info(f"[loader] Registered '{name}' from {source_label}")
-    return 1
+    return tools
 
 
 def load_builtin_tools(emit_log=None):
-    """Scan backend/mcp/tools/<name>/tool.py and register all built-in tools."""
+    """
+    Scan backend/mcp/tools/<name>/tool.py and register all built-in tools —
+    from the manifest (lazy import) where possible, otherwise by importing the module.
+    """
     tools_dir = os.path.join(os.path.dirname(__file__), 'tools')
+    manifest = _load_manifest()
+    updated = {}
     total = 0
-    for entry in sorted(os.listdir(tools_dir)):
-        tool_py = os.path.join(tools_dir, entry, 'tool.py')
-        if not os.path.isfile(tool_py):
-            continue
-        try:
-            mod = _load_module(tool_py, f'mcp.tools.{entry}')
-            total += _register_module(mod, f'builtin/{entry}')
-        except Exception as e:
-            msg = f"⚠ Tool-Ladefehler (builtin/{entry}): {e}"
-            logger.error(f"[loader] Failed to load builtin tool '{entry}': {e}", exc_info=True)
-            _startup_errors.append(msg)
-            if emit_log:
-                emit_log({"type": "text", "message": msg})
+    # One registry version for the whole scan
+    with registry.batch():
+        for entry in sorted(os.listdir(tools_dir)):
+            tool_py = os.path.join(tools_dir, entry, 'tool.py')
+            if not os.path.isfile(tool_py):
+                continue
+            module_name = f'mcp.tools.{entry}'
+            try:
+                st = os.stat(tool_py)
+                cached = manifest.get(entry)
+                if cached and cached.get('mtime') == st.st_mtime and cached.get('size') == st.st_size:
+                    meta = cached.get('meta')
+                else:
+                    meta = _scan_tool_source(tool_py)
+                updated[entry] = {'mtime': st.st_mtime, 'size': st.st_size, 'meta': meta}
+
+                if meta is not None and LAZY_TOOLS:
+                    missing = _missing_import(meta, os.path.dirname(tool_py))
+                    if missing:
+                        raise ImportError(f"No module named '{missing}'")
+                    _register_lazy(meta, tool_py, module_name, f'builtin/{entry}')
+                    total += 1
+                    continue
+                mod = _load_module(tool_py, module_name)
+                total += _register_module(mod, f'builtin/{entry}')
+            except Exception as e:
+                msg = f"⚠ Tool-Ladefehler (builtin/{entry}): {e}"
+                logger.error(f"[loader] Failed to load builtin tool '{entry}': {e}", exc_info=True)
+                _startup_errors.append(msg)
+                if emit_log:
+                    emit_log({"type": "text", "message": msg})
+    if updated != manifest:
+        _save_manifest(updated)
     logger.info(f"[loader] {total} built-in tool(s) registered")
     return total
 
 
+_CUSTOM_DIR = os.path.join(DATA_DIR, 'custom_tools')
+# Tool directory name -> {'stamp', 'hash', 'tools': [names], 'helpers': [module names]}
+_custom_state = {}
+_custom_lock = threading.Lock()
+_watcher = None
+
+
+def _source_files(tool_dir):
+    """The tool's Python sources (tool.py and helpers, including sub-packages)."""
+    files = []
+    for root, dirs, names in os.walk(tool_dir):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__' and not d.startswith('.'))
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.py'))
+    return files
+
+
+def _stamp(files):
+    """Cheap change check (mtime/size) — the source is only hashed when this changes."""
+    result = []
+    for path in files:
+        st = os.stat(path)
+        result.append((path, st.st_mtime_ns, st.st_size))
+    return result
+
+
+def _source_hash(tool_dir, files):
+    h = hashlib.sha1()
+    for path in files:
+        h.update(os.path.relpath(path, tool_dir).encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _evict_helpers(names):
+    with _import_lock:
+        for name in names:
+            sys.modules.pop(name, None)
+            _helper_owner.pop(name, None)
+
+
+def _clear_custom_error(entry):
+    prefix = f"⚠ Tool-Ladefehler (custom/{entry}):"
+    _startup_errors[:] = [e for e in _startup_errors if not e.startswith(prefix)]
+
+
+def _unregister_custom(names):
+    for name in names:
+        tool = registry.get_tool(name)
+        if tool is not None and tool.custom:
+            registry.unregister(name)
+
+
 def load_custom_tools(emit_log=None):
-    """Scan /app/data/custom_tools/<name>/tool.py and register custom tools."""
-    custom_dir = os.path.join(DATA_DIR, 'custom_tools')
-    os.makedirs(custom_dir, exist_ok=True)
-    # Clear stale custom-tool errors so fixed tools don't keep showing old messages
-    _startup_errors[:] = [e for e in _startup_errors if not e.startswith("⚠ Tool-Ladefehler (custom/")]
+    """
+    Bring the custom tools in line with /app/data/custom_tools/<name>/tool.py:
+    new and changed tools are (re-)imported, tools whose directory is gone are
+    unregistered, unchanged tools are left alone. Returns the number of tools
+    (re-)registered.
+    """
+    os.makedirs(_CUSTOM_DIR, exist_ok=True)
+
+    def log(message):
+        if emit_log:
+            emit_log({"type": "text", "message": message})
+
     total = 0
-    for entry in sorted(os.listdir(custom_dir)):
-        tool_py = os.path.join(custom_dir, entry, 'tool.py')
-        if not os.path.isfile(tool_py):
-            continue
-        try:
-            mod = _load_module(tool_py, f'custom_tools.{entry}')
-            total += _register_module(mod, f'custom/{entry}', custom=True)
-        except Exception as e:
-            msg = f"⚠ Tool-Ladefehler (custom/{entry}): {e}"
-            logger.error(f"[loader] Failed to load custom tool '{entry}': {e}", exc_info=True)
-            _startup_errors.append(msg)
-            if emit_log:
-                emit_log({"type": "text", "message": msg})
+    with _custom_lock, registry.batch():
+        present = {
+            entry for entry in os.listdir(_CUSTOM_DIR)
+            if os.path.isfile(os.path.join(_CUSTOM_DIR, entry, 'tool.py'))
+        }
+        for entry in sorted(set(_custom_state) - present):
+            state = _custom_state.pop(entry)
+            _unregister_custom(state['tools'])
+            _evict_helpers(state['helpers'])
+            _forget_tool_dir(os.path.join(_CUSTOM_DIR, entry))
+            _clear_custom_error(entry)
+            logger.info(f"[loader] Removed custom tool(s) {state['tools']} (custom/{entry} deleted)")
+            log(f"Custom Tool entfernt: {entry}")
+
+        for entry in sorted(present):
+            tool_dir = os.path.join(_CUSTOM_DIR, entry)
+            state = _custom_state.get(entry)
+            try:
+                files = _source_files(tool_dir)
+                stamp = _stamp(files)
+                if state and state['stamp'] == stamp:
+                    continue
+                source_hash = _source_hash(tool_dir, files)
+            except OSError as e:
+                logger.warning(f"[loader] custom/{entry}: {e}")  # being written / deleted right now
+                continue
+            if state and state['hash'] == source_hash:
+                state['stamp'] = stamp  # touched, not changed
+                continue
+
+            _clear_custom_error(entry)
+            old_tools = state['tools'] if state else []
+            try:
+                mod = _load_module(os.path.join(tool_dir, 'tool.py'), f'custom_tools.{entry}')
+                tools = _module_tools(mod, f'custom/{entry}', custom=True)
+            except Exception as e:
+                # Keep the previous version registered; retried when the source changes again
+                msg = f"⚠ Tool-Ladefehler (custom/{entry}): {e}"
+                logger.error(f"[loader] Failed to load custom tool '{entry}': {e}", exc_info=True)
+                _startup_errors.append(msg)
+                if emit_log:
+                    emit_log({"type": "text", "message": msg})
+                _custom_state[entry] = {'stamp': stamp, 'hash': source_hash, 'tools': old_tools,
+                                        'helpers': state['helpers'] if state else []}
+                continue
+
+            names = [t.name for t in tools]
+            _unregister_custom([n for n in old_tools if n not in names])
+            if state:
+                _evict_helpers([n for n in state['helpers'] if n not in mod.__tool_helpers__])
+            for tool in tools:
+                registry.register(tool)
+                logger.info(f"[loader] Registered '{tool.name}' from custom/{entry}")
+            _custom_state[entry] = {'stamp': stamp, 'hash': source_hash, 'tools': names,
+                                    'helpers': mod.__tool_helpers__}
+            total += len(tools)
+            log(f"Custom Tool {'neu geladen' if state else 'geladen'}: {entry} ({', '.join(names) or 'keine Tools'})")
     if total:
         logger.info(f"[loader] {total} custom tool(s) registered")
     return total
+
+
+def start_custom_tool_watcher(emit_log=None):
+    """
+    Background thread polling the custom tools directory and reloading what changed
+    (settings['custom_tools']['watch'] / 'watch_interval'; idempotent).
+    """
+    global _watcher
+    if _watcher is not None:
+        return
+
+    def loop():
+        while True:
+            cfg = get_settings().get('custom_tools') or {}
+            time.sleep(max(0.5, float(cfg.get('watch_interval', 2))))
+            if not cfg.get('watch', True):
+                continue
+            try:
+                load_custom_tools(emit_log=emit_log)
+            except Exception as e:
+                logger.warning(f"[loader] custom tool watcher: {e}")
+
+    _watcher = threading.Thread(target=loop, daemon=True, name='custom-tool-watcher')
+    _watcher.start()
@@ -1,91 +1,347 @@
-from mcp.client import MCPStdioClient
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from mcp.client import MCPStdioClient, MCPHttpClient
+from mcp.pool import MCPClientPool
 from mcp.registry import registry, MCPTool
 from config import get_settings
+from services.tool_context import get_emit_log
 
-active_clients = {}
+logger = logging.getLogger(__name__)
 
+active_clients = {}   # server id -> {'client', 'hash', 'name', 'server'}
+_failed = {}          # server id -> {'server', 'hash', 'name', 'attempts', 'retry_at', 'error'}
+
+# Serializes reloads and supervisor passes; held while pinging / connecting
+_reload_lock = threading.Lock()
+# Guards active_clients / _failed; held only briefly, so server_status() never waits on a connect
+_lock = threading.Lock()
+_supervisor = None
+_SUPERVISOR_TICK = 1.0
+
+# Fields that require a restart when changed (name / enabled are handled separately)
+_CONFIG_KEYS = ('transport', 'command', 'args', 'env', 'url', 'headers', 'pool')
+
+# 'streamable-http' is the name used by the MCP spec / other clients' configs
+HTTP_TRANSPORTS = ('http', 'streamable-http')
+
+
+def _progress_logger(tool_name):
+    """Forward MCP progress notifications of a tool call to the caller's terminal log."""
+    emit_log = get_emit_log()
+    if not emit_log:
+        return None
+
+    def on_progress(params):
+        progress, total = params.get('progress'), params.get('total')
+        status = f"{progress}/{total}" if total else f"{progress}"
+        message = params.get('message') or ''
+        emit_log({"type": "text", "message": f"[{tool_name}] Fortschritt {status} {message}".rstrip()})
+    return on_progress
+
+
+def _pool_options(server):
+    defaults = (get_settings().get('mcp_external') or {}).get('pool') or {}
+    cfg = {**defaults, **(server.get('pool') or {})}
+    return {
+        'min_size': cfg.get('min', 1),
+        'max_size': cfg.get('max', 1),
+        'idle_timeout': cfg.get('idle_timeout', 300),
+        'max_calls': cfg.get('max_calls', 0),
+        'ping_interval': cfg.get('ping_interval', 30),
+    }
+
+
+def _create_client(server):
+    """
+    Client for a configured server: 'stdio' spawns a pool of child processes
+    (one by default), 'http' talks to a URL.
+    """
+    transport = server.get('transport', 'stdio')
+    if transport == 'stdio':
+        def factory():
+            return MCPStdioClient(
+                server['command'],
+                server.get('args', []),
+                env=server.get('env') or None
+            )
+        return MCPClientPool(factory, label=server.get('name', server['id']), **_pool_options(server))
+    if transport in HTTP_TRANSPORTS:
+        if not server.get('url'):
+            raise ValueError("Keine URL konfiguriert")
+        return MCPHttpClient(server['url'], headers=server.get('headers') or None)
+    raise ValueError(f"Transport '{transport}' wird nicht unterstuetzt")
+
+
+def _make_handler(client, tool_name):
+    def handler(**kwargs):
+        result = client.call_tool(tool_name, kwargs, on_progress=_progress_logger(tool_name))
+        # MCP returns content array, extract text
+        if isinstance(result, dict) and 'content' in result:
+            contents = result['content']
+            if isinstance(contents, list) and len(contents) > 0:
+                first = contents[0]
+                if first.get('type') == 'text':
+                    return {"result": first['text']}
+                elif first.get('type') == 'image':
+                    return {
+                        "image_base64": first.get('data', ''),
+                        "mime_type": first.get('mimeType', 'image/png')
+                    }
+        return result
+    return handler
+
+
+def _options(settings):
+    cfg = settings.get('mcp_external') or {}
+    return {
+        'connect_timeout': float(cfg.get('connect_timeout', 30)),
+        'backoff_initial': float(cfg.get('restart_backoff_initial', 2)),
+        'backoff_max': float(cfg.get('restart_backoff_max', 300)),
+    }
+
+
+def _config_hash(server):
+    relevant = {k: server.get(k) for k in _CONFIG_KEYS}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+
+
+def _connect(server, timeout):
+    client = _create_client(server)
+    try:
+        client.connect(timeout=timeout)
+        tools = client.list_tools()
+    except Exception:
+        client.disconnect()
+        raise
+    return client, tools
+
+
+def _connect_all(servers, opts):
+    """
+    Connect to servers in parallel, each bounded by its own timeout
+    (server['connect_timeout'] or the global one). Returns {server id: (client, tools)
+    or Exception}. A connect that finishes after its timeout is disconnected again.
+    """
+    results = {}
+    if not servers:
+        return results
+    pool = ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix='mcp-connect')
+    started = time.monotonic()
+    futures = []
+    for server in servers:
+        timeout = float(server.get('connect_timeout') or opts['connect_timeout'])
+        futures.append((server, timeout, pool.submit(_connect, server, timeout)))
+    pool.shutdown(wait=False)
+
+    for server, timeout, future in futures:
+        try:
+            results[server['id']] = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+        except FutureTimeout:
+            results[server['id']] = TimeoutError(f"keine Verbindung nach {timeout:.0f}s")
+
+            def discard(f):
+                if not f.exception():
+                    f.result()[0].disconnect()
+            future.add_done_callback(discard)
+        except Exception as e:
+            results[server['id']] = e
+    return results
 
-def load_external_tools(emit_log=None):
-    """Connect to configured external MCP servers and register their tools."""
-    settings = get_settings()
-    servers = settings.get('mcp_servers', [])
 
-    # Disconnect existing external clients
-    for sid, entry in list(active_clients.items()):
+def _install(server, config_hash, client, tools):
+    """
+    Swap the server's tools to the new client (caller holds _lock). Returns the
+    previous client, which the caller disconnects after releasing the lock.
+    """
+    sid = server['id']
+    old = active_clients.get(sid)
+    registry.replace_server(sid, [
+        MCPTool(
+            name=tool_def['name'],
+            description=tool_def.get('description', ''),
+            input_schema=tool_def.get('inputSchema', {"type": "object", "properties": {}}),
+            handler=_make_handler(client, tool_def['name']),
+            server_id=sid
+        )
+        for tool_def in tools
+    ])
+    active_clients[sid] = {'client': client, 'hash': config_hash,
+                           'name': server.get('name', sid), 'server': server}
+    _failed.pop(sid, None)
+    if old and old['client'] is not client:
+        return old['client']
+    return None
+
+
+def _stop(sid):
+    """Unregister a server's tools (caller holds _lock). Returns its client for _disconnect."""
+    registry.unregister_by_server(sid)
+    entry = active_clients.pop(sid, None)
+    return entry['client'] if entry else None
+
+
+def _disconnect(*clients):
+    for client in clients:
+        if client is None:
+            continue
         try:
-            registry.unregister_by_server(sid)
-            entry['client'].disconnect()
+            client.disconnect()
         except Exception:
             pass
-    active_clients.clear()
 
-    for server in servers:
-        if not server.get('enabled', True):
-            continue
 
-        sid = server['id']
-        name = server.get('name', sid)
+def _mark_failed(server, config_hash, error, opts):
+    """Schedule a reconnect with exponential backoff (caller holds _lock)."""
+    sid = server['id']
+    attempts = _failed.get(sid, {}).get('attempts', 0) + 1
+    delay = min(opts['backoff_max'], opts['backoff_initial'] * 2 ** (attempts - 1))
+    _failed[sid] = {'server': server, 'hash': config_hash, 'name': server.get('name', sid),
+                    'attempts': attempts, 'retry_at': time.monotonic() + delay, 'error': str(error)}
+    return delay
 
-        if emit_log:
-            emit_log(f"Verbinde mit MCP Server: {name}...")
 
-        try:
-            if server.get('transport', 'stdio') == 'stdio':
-                client = MCPStdioClient(
-                    server['command'],
-                    server.get('args', []),
-                    env=server.get('env') or None
-                )
-                client.connect()
-                tools = client.list_tools()
-
-                for tool_def in tools:
-                    tool_name = tool_def['name']
-
-                    def make_handler(c, n):
-                        def handler(**kwargs):
-                            result = c.call_tool(n, kwargs)
-                            # MCP returns content array, extract text
-                            if isinstance(result, dict) and 'content' in result:
-                                contents = result['content']
-                                if isinstance(contents, list) and len(contents) > 0:
-                                    first = contents[0]
-                                    if first.get('type') == 'text':
-                                        return {"result": first['text']}
-                                    elif first.get('type') == 'image':
-                                        return {
-                                            "image_base64": first.get('data', ''),
-                                            "mime_type": first.get('mimeType', 'image/png')
-                                        }
-                            return result
-                        return handler
-
-                    mcp_tool = MCPTool(
-                        name=tool_name,
-                        description=tool_def.get('description', ''),
-                        input_schema=tool_def.get('inputSchema', {"type": "object", "properties": {}}),
-                        handler=make_handler(client, tool_name),
-                        server_id=sid
-                    )
-                    registry.register(mcp_tool)
-
-                active_clients[sid] = {'client': client}
+def load_external_tools(emit_log=None):
+    """
+    Bring external MCP servers in line with the settings: servers whose config is
+    unchanged (and still running) are kept, removed/disabled ones are stopped, new
+    and changed ones are connected in parallel. A changed server keeps serving with
+    its old process until the new one is ready.
+    """
+    settings = get_settings()
+    opts = _options(settings)
+    desired = {s['id']: s for s in settings.get('mcp_servers', []) if s.get('enabled', True)}
 
+    with _reload_lock:
+        stale = []
+        with _lock:
+            for sid in list(active_clients):
+                if sid not in desired:
+                    if emit_log:
+                        emit_log(f"MCP Server getrennt: {active_clients[sid]['name']}")
+                    stale.append(_stop(sid))
+            # A manual reload retries failed servers right away, with a fresh backoff
+            _failed.clear()
+            running = {sid: (e['hash'], e['client']) for sid, e in active_clients.items()}
+        _disconnect(*stale)
+
+        to_connect = []
+        for sid, server in desired.items():
+            name = server.get('name', sid)
+            config_hash, client = running.get(sid, (None, None))
+            if client is not None and config_hash == _config_hash(server) and client.alive:
+                with _lock:
+                    entry = active_clients.get(sid)
+                    if entry:
+                        entry['name'], entry['server'] = name, server
                 if emit_log:
-                    emit_log(f"  OK {len(tools)} Tools geladen von {name}")
-            else:
-                if emit_log:
-                    emit_log(f"  Transport '{server.get('transport')}' noch nicht unterstuetzt")
+                    emit_log(f"MCP Server unveraendert: {name}")
+                continue
+            if emit_log:
+                emit_log(f"Verbinde mit MCP Server: {name}...")
+            to_connect.append(server)
 
-        except Exception as e:
+        results = _connect_all(to_connect, opts)
+        for server in to_connect:
+            sid, name = server['id'], server.get('name', server['id'])
+            outcome = results[sid]
+            if isinstance(outcome, Exception):
+                # The configured command/URL failed — don't keep a process for an outdated config
+                with _lock:
+                    old = _stop(sid)
+                    delay = _mark_failed(server, _config_hash(server), outcome, opts)
+                _disconnect(old)
+                if emit_log:
+                    emit_log(f"  FEHLER bei {name}: {str(outcome)} (neuer Versuch in {delay:.0f}s)")
+                continue
+            client, tools = outcome
+            with _lock:
+                old = _install(server, _config_hash(server), client, tools)
+            _disconnect(old)
             if emit_log:
-                emit_log(f"  FEHLER bei {name}: {str(e)}")
+                emit_log(f"  OK {len(tools)} Tools geladen von {name}")
+
+
+def _supervise():
+    """One supervisor pass: detect crashed servers, reconnect those whose backoff has expired."""
+    opts = _options(get_settings())
+    with _reload_lock:
+        with _lock:
+            entries = list(active_clients.items())
+        # Pings and pool respawns run without _lock
+        for sid, entry in entries:
+            if hasattr(entry['client'], 'maintain'):
+                entry['client'].maintain()
+
+        now = time.monotonic()
+        dead = []
+        with _lock:
+            for sid, entry in entries:
+                if not entry['client'].alive and active_clients.get(sid) is entry:
+                    logger.warning(f"[mcp] Server {entry['name']} nicht mehr erreichbar — Neustart")
+                    dead.append(_stop(sid))
+                    _failed[sid] = {'server': entry['server'], 'hash': entry['hash'], 'name': entry['name'],
+                                    'attempts': 0, 'retry_at': now, 'error': 'beendet'}
+            due = [f['server'] for f in _failed.values() if f['retry_at'] <= now]
+        _disconnect(*dead)
+        if not due:
+            return
+
+        results = _connect_all(due, opts)
+        for server in due:
+            sid, name = server['id'], server.get('name', server['id'])
+            outcome = results[sid]
+            if isinstance(outcome, Exception):
+                with _lock:
+                    delay = _mark_failed(server, _config_hash(server), outcome, opts)
+                logger.warning(f"[mcp] Neustart von {name} fehlgeschlagen: {outcome} — nächster Versuch in {delay:.0f}s")
+                continue
+            client, tools = outcome
+            with _lock:
+                old = _install(server, _config_hash(server), client, tools)
+            _disconnect(old)
+            logger.info(f"[mcp] Server {name} neu gestartet ({len(tools)} Tools)")
+
+
+def start_supervisor():
+    """Background thread restarting crashed or unreachable external servers (idempotent)."""
+    global _supervisor
+    if _supervisor is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(_SUPERVISOR_TICK)
+            try:
+                _supervise()
+            except Exception as e:
+                logger.warning(f"[mcp] supervisor: {e}")
+
+    _supervisor = threading.Thread(target=loop, daemon=True, name='mcp-supervisor')
+    _supervisor.start()
+
+
+def server_status():
+    """Connection state per configured server id (for the settings UI / API)."""
+    with _lock:
+        status = {sid: {'state': 'connected', 'name': e['name']} for sid, e in active_clients.items()}
+        for sid, e in active_clients.items():
+            if hasattr(e['client'], 'stats'):
+                status[sid]['pool'] = e['client'].stats()
+        now = time.monotonic()
+        for sid, f in _failed.items():
+            status[sid] = {'state': 'failed', 'name': f['name'], 'error': f['error'],
+                           'attempts': f['attempts'], 'retry_in': max(0, round(f['retry_at'] - now))}
+    return status
 
 
 def disconnect_all():
-    for sid, entry in active_clients.items():
-        try:
-            entry['client'].disconnect()
-        except Exception:
-            pass
-    active_clients.clear()
+    with _reload_lock:
+        with _lock:
+            _failed.clear()
+            clients = [_stop(sid) for sid in list(active_clients)]
+        _disconnect(*clients)
@@ -0,0 +1,231 @@
+"""
+Process pool for stdio MCP servers.
+
+A stdio server used to be a single child process shared by every chat; a heavy
+tool (browser automation, large conversions) made everyone else wait behind it.
+MCPClientPool keeps between 'min' and 'max' processes of the same server and has
+the interface of a single client, so mcp/manager wires it in transparently:
+
+  - call_tool() goes to the least-loaded process; if all are busy and the pool is
+    below 'max', a new process is started for the call
+  - processes idle for longer than 'idle_timeout' are stopped (down to 'min')
+  - idle processes are pinged every 'ping_interval' seconds; a process that does
+    not answer or has exited is replaced
+  - after 'max_calls' calls (0 = never) a process is retired: it finishes its
+    running calls and is then stopped — limits leaks in long-running servers
+
+maintain() does the housekeeping; it is called by the manager's supervisor.
+Per server: settings['mcp_servers'][i]['pool'], defaults in settings['mcp_external']['pool'].
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcp.client import CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_PING_TIMEOUT = 5
+
+
+class _Member:
+    __slots__ = ('client', 'inflight', 'calls', 'last_used', 'last_ping', 'retiring')
+
+    def __init__(self, client):
+        self.client = client
+        self.inflight = 0
+        self.calls = 0
+        self.last_used = self.last_ping = time.monotonic()
+        self.retiring = False
+
+
+class MCPClientPool:
+    def __init__(self, factory, min_size=1, max_size=1, idle_timeout=300, max_calls=0,
+                 ping_interval=30, label=''):
+        self.factory = factory            # () -> unconnected client
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.idle_timeout = float(idle_timeout)
+        self.max_calls = int(max_calls or 0)
+        self.ping_interval = float(ping_interval)
+        self.label = label
+        self._members = []
+        self._spawning = 0
+        self._lock = threading.Lock()
+        self._connect_timeout = CONNECT_TIMEOUT
+        self._closed = False
+
+    @property
+    def alive(self):
+        with self._lock:
+            return not self._closed and any(m.client.alive for m in self._members)
+
+    def _spawn(self):
+        client = self.factory()
+        client.connect(timeout=self._connect_timeout)
+        return _Member(client)
+
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        """Start 'min' processes in parallel; fails only if none of them comes up."""
+        self._connect_timeout = timeout
+        self._closed = False
+        with ThreadPoolExecutor(max_workers=self.min_size, thread_name_prefix='mcp-pool') as ex:
+            futures = [ex.submit(self._spawn) for _ in range(self.min_size)]
+        members, errors = [], []
+        for f in futures:
+            try:
+                members.append(f.result())
+            except Exception as e:
+                errors.append(e)
+        if not members:
+            raise errors[0]
+        if errors:
+            logger.warning(f"[mcp] {self.label}: {len(errors)} von {self.min_size} Prozessen nicht gestartet: {errors[0]}")
+        with self._lock:
+            self._members.extend(members)
+        return True
+
+    # ── Dispatch ───────────────────────────────────────────────────────────────
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Not connected to MCP server")
+            candidates = [m for m in self._members if m.client.alive and not m.retiring]
+            best = min(candidates, key=lambda m: m.inflight) if candidates else None
+            full = len(self._members) + self._spawning >= self.max_size
+            if best is None and full:
+                # Only retiring processes left and no room: let one of them take the call
+                best = min((m for m in self._members if m.client.alive), key=lambda m: m.inflight, default=None)
+            if best is not None and (best.inflight == 0 or full):
+                best.inflight += 1
+                return best
+            self._spawning += 1
+
+        # Everyone is busy (or gone) and there is room: start another process for this call
+        try:
+            member = self._spawn()
+        except Exception as e:
+            with self._lock:
+                self._spawning -= 1
+                if best is None or not best.client.alive:
+                    raise
+                best.inflight += 1
+            logger.warning(f"[mcp] {self.label}: zusätzlicher Prozess nicht gestartet ({e})")
+            return best
+        with self._lock:
+            self._spawning -= 1
+            member.inflight = 1
+            self._members.append(member)
+            size = len(self._members)
+        logger.info(f"[mcp] {self.label}: Pool auf {size} Prozesse vergrößert")
+        return member
+
+    def _release(self, member):
+        with self._lock:
+            member.inflight -= 1
+            member.last_used = time.monotonic()
+            retire = member.retiring and member.inflight == 0 and member in self._members
+            if retire:
+                self._members.remove(member)
+        if retire:
+            logger.info(f"[mcp] {self.label}: Prozess nach {member.calls} Aufrufen ersetzt")
+            member.client.disconnect()
+
+    def call_tool(self, name, arguments=None, timeout=None, on_progress=None):
+        member = self._acquire()
+        with self._lock:
+            member.calls += 1
+            if self.max_calls and member.calls >= self.max_calls:
+                member.retiring = True  # no new calls; stopped once its running calls are done
+        try:
+            return member.client.call_tool(name, arguments, timeout=timeout, on_progress=on_progress)
+        finally:
+            self._release(member)
+
+    def list_tools(self):
+        member = self._acquire()
+        try:
+            return member.client.list_tools()
+        finally:
+            with self._lock:
+                member.inflight -= 1
+
+    def ping(self, timeout=_PING_TIMEOUT):
+        member = self._acquire()
+        try:
+            return member.client.ping(timeout=timeout)
+        finally:
+            with self._lock:
+                member.inflight -= 1
+
+    # ── Housekeeping ───────────────────────────────────────────────────────────
+
+    def maintain(self):
+        """Drop dead, idle and unresponsive processes, then top up to 'min'."""
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return
+            dead = [m for m in self._members if not m.client.alive]
+            live = [m for m in self._members if m.client.alive]
+            idle = sorted((m for m in live if m.inflight == 0 and not m.retiring), key=lambda m: m.last_used)
+            surplus = max(0, len(live) - self.min_size)
+            evict = [m for m in idle[:surplus] if now - m.last_used > self.idle_timeout]
+            retired = [m for m in live if m.retiring and m.inflight == 0]
+            to_ping = [m for m in idle if m not in evict and now - max(m.last_ping, m.last_used) >= self.ping_interval]
+            for m in dead + evict + retired:
+                self._members.remove(m)
+        for m in dead:
+            logger.warning(f"[mcp] {self.label}: Prozess beendet, wird ersetzt")
+        for m in dead + evict + retired:
+            m.client.disconnect()
+
+        for m in to_ping:
+            m.last_ping = time.monotonic()
+            if m.client.ping(timeout=_PING_TIMEOUT):
+                continue
+            with self._lock:
+                drop = m in self._members and m.inflight == 0
+                if drop:
+                    self._members.remove(m)
+            if drop:
+                logger.warning(f"[mcp] {self.label}: keine Antwort auf ping, Prozess wird ersetzt")
+                m.client.disconnect()
+
+        while True:
+            with self._lock:
+                if self._closed or len(self._members) + self._spawning >= self.min_size:
+                    return
+                self._spawning += 1
+            try:
+                member = self._spawn()
+            except Exception as e:
+                logger.warning(f"[mcp] {self.label}: Ersatzprozess nicht gestartet: {e}")
+                return
+            finally:
+                with self._lock:
+                    self._spawning -= 1
+            with self._lock:
+                self._members.append(member)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'processes': len(self._members),
+                'busy': sum(1 for m in self._members if m.inflight),
+                'inflight': sum(m.inflight for m in self._members),
+                'min': self.min_size,
+                'max': self.max_size,
+            }
+
+    def disconnect(self):
+        with self._lock:
+            self._closed = True
+            members, self._members = self._members, []
+        for m in members:
+            try:
+                m.client.disconnect()
+            except Exception:
+                pass
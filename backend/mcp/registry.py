@@ -1,5 +1,10 @@
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+
+
 class MCPTool:
-    def __init__(self, name, description, input_schema, handler=None, server_id=None, settings_schema=None, agent_overridable=True, settings_info=None, custom=False, usage=None, always_enabled=False):
+    def __init__(self, name, description, input_schema, handler=None, server_id=None, settings_schema=None, agent_overridable=True, settings_info=None, custom=False, usage=None, always_enabled=False, cache_ttl=None):
         self.name = name
         self.description = description
         self.input_schema = input_schema
@@ -11,6 +16,7 @@ class MCPTool:
         self.custom = custom  # True for tools loaded from /app/data/custom_tools/
         self.usage = usage  # Optional usage hints appended to description for the model
         self.always_enabled = always_enabled  # True = cannot be disabled by user
+        self.cache_ttl = cache_ttl  # Seconds to memoize results for identical args (None = no caching)
 
     def to_openai_format(self):
         desc = self.description
@@ -26,16 +32,22 @@ class MCPTool:
         }
 
 
-class MCPRegistry:
-    def __init__(self):
-        self.tools = {}
+class RegistrySnapshot:
+    """
+    Immutable view of the registered tools at one registry version.
 
-    def register(self, tool):
-        self.tools[tool.name] = tool
+    Readers take one snapshot and use it for everything they derive (tool list,
+    schemas, lookups by name) — consistent even while a reload publishes new
+    versions. derived() memoizes data computed from a snapshot, so it is built
+    once per version instead of once per request.
+    """
+    __slots__ = ('version', 'tools', '_derived', '_lock')
 
-    def unregister(self, name):
-        if name in self.tools:
-            del self.tools[name]
+    def __init__(self, version, tools):
+        self.version = version
+        self.tools = MappingProxyType(tools)
+        self._derived = {}
+        self._lock = threading.Lock()
 
     def get_tool(self, name):
         return self.tools.get(name)
@@ -46,10 +58,96 @@ class MCPRegistry:
     def get_openai_tools(self):
         return [tool.to_openai_format() for tool in self.tools.values()]
 
+    def derived(self, key, build):
+        """build(snapshot) once per snapshot; the result is shared — treat it as read-only."""
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+
+class MCPRegistry:
+    """
+    Copy-on-write tool registry. Writers copy the current tool dict, change the
+    copy and publish it as a new snapshot with version + 1; readers only load the
+    current snapshot reference and never lock. batch() groups several changes
+    into one published version (no half-reloaded tool set is ever visible).
+    """
+
+    def __init__(self):
+        self._write_lock = threading.RLock()
+        self._pending = None   # working copy while a batch() is open
+        self._snapshot = RegistrySnapshot(0, {})
+
+    @property
+    def tools(self):
+        """Read-only mapping name -> MCPTool of the current version."""
+        return self._snapshot.tools
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def snapshot(self):
+        return self._snapshot
+
+    @contextmanager
+    def batch(self):
+        with self._write_lock:
+            outer = self._pending is None
+            if outer:
+                self._pending = dict(self._snapshot.tools)
+            try:
+                yield self
+            finally:
+                if outer:
+                    tools, self._pending = self._pending, None
+                    self._publish(tools)
+
+    def _publish(self, tools):
+        if tools != dict(self._snapshot.tools):
+            self._snapshot = RegistrySnapshot(self._snapshot.version + 1, tools)
+
+    def _update(self, change):
+        with self._write_lock:
+            if self._pending is not None:
+                change(self._pending)
+                return
+            tools = dict(self._snapshot.tools)
+            change(tools)
+            self._publish(tools)
+
+    def register(self, tool):
+        self._update(lambda tools: tools.__setitem__(tool.name, tool))
+
+    def unregister(self, name):
+        self._update(lambda tools: tools.pop(name, None))
+
     def unregister_by_server(self, server_id):
-        to_remove = [n for n, t in self.tools.items() if t.server_id == server_id]
-        for name in to_remove:
-            del self.tools[name]
+        def change(tools):
+            for name in [n for n, t in tools.items() if t.server_id == server_id]:
+                del tools[name]
+        self._update(change)
+
+    def replace_server(self, server_id, new_tools):
+        """Swap all tools of an external server in one version."""
+        with self.batch():
+            self.unregister_by_server(server_id)
+            for tool in new_tools:
+                self.register(tool)
+
+    def get_tool(self, name):
+        return self._snapshot.get_tool(name)
+
+    def list_tools(self):
+        return self._snapshot.list_tools()
+
+    def get_openai_tools(self):
+        return self._snapshot.get_openai_tools()
 
 
 registry = MCPRegistry()
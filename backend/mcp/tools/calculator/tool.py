@@ -85,5 +85,6 @@ TOOL_DEFINITION = {
             }
         },
         "required": ["expression"]
-    }
+    },
+    "cache_ttl": 86400,
 }
@@ -30,7 +30,8 @@ TOOL_DEFINITION = {
             }
         },
         "required": ["callsign"]
-    }
+    },
+    "cache_ttl": 60,
 }
 
 
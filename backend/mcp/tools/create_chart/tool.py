@@ -21,6 +21,9 @@ from services.tool_context import get_emit_log
 
 TOOL_DEFINITION = {
     "name": "create_chart",
+    # matplotlib rendering is CPU-bound: run in the sandbox worker pool
+    "execution": "process",
+    "limits": {"timeout": 60, "cpu_seconds": 60, "memory_mb": 1536},
     "description": (
         "Erstellt einen Chart (Diagramm) aus Daten und speichert ihn als PNG. "
         "Unterstuetzte Typen: line (Linie), bar (Balken), barh (horizontale Balken), "
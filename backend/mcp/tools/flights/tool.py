@@ -1,6 +1,5 @@
 import io
 import math
-import base64
 import requests
 from services.tool_context import get_emit_log
 
@@ -61,8 +60,8 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def _render_map(center_lat: float, center_lon: float, radius_km: float, flights: list, log) -> str:
-    """Rendert eine OSM-Karte mit Flugzeug-Markierungen. Gibt base64-PNG zurück."""
+def _render_map(center_lat: float, center_lon: float, radius_km: float, flights: list, log) -> bytes:
+    """Rendert eine OSM-Karte mit Flugzeug-Markierungen. Gibt die PNG-Bytes zurück."""
 
     # Pillow 10+ hat Image.ANTIALIAS entfernt — staticmap 0.5.5 braucht es noch
     import PIL.Image
@@ -147,7 +146,7 @@ def _render_map(center_lat: float, center_lon: float, radius_km: float, flights:
     image.save(buf, format="PNG")
     size_kb = len(buf.getvalue()) // 1024
     log(f"PNG kodiert: {size_kb} KB")
-    return base64.b64encode(buf.getvalue()).decode()
+    return buf.getvalue()
 
 
 def get_flights_nearby(latitude: float, longitude: float,
@@ -267,7 +266,7 @@ def get_flights_nearby(latitude: float, longitude: float,
         else:
             log("[Karte] Rendering startet...")
             try:
-                result["image_base64"] = _render_map(latitude, longitude, radius_km, flights, log)
+                result["image_bytes"] = _render_map(latitude, longitude, radius_km, flights, log)
                 result["mime_type"] = "image/png"
                 log("[Karte] Fertig — wird im Chat angezeigt")
             except Exception as e:
@@ -29,7 +29,8 @@ TOOL_DEFINITION = {
             }
         },
         "required": ["query"]
-    }
+    },
+    "cache_ttl": 86400,
 }
 
 
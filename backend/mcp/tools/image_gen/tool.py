@@ -1,5 +1,3 @@
-import base64
-
 from config import get_settings, get_tool_settings
 from services.openrouter import generate_image as _generate_image
 from services.tool_context import get_emit_log
@@ -75,7 +73,7 @@ def generate_image(prompt, aspect_ratio="1:1"):
         return {"error": str(e), "model_used": model, "hint": "Bildgenerierungs-Modell in MCP Tools > generate_image > Timeout/Modell einstellen."}
 
     return {
-        "image_base64": base64.b64encode(img_bytes).decode(),
+        "image_bytes": img_bytes,
         "mime_type": mime,
         "prompt": prompt,
         "model": model,
@@ -3,6 +3,7 @@ import base64
 import subprocess
 
 from services.image_store import get as get_stored_image
+from services.sandbox import limited_command
 
 TOOL_DEFINITION = {
     "name": "process_image",
@@ -74,6 +75,8 @@ TOOL_DEFINITION = {
 def _imagemagick(input_bytes, *args):
     """Run ImageMagick convert: stdin → args → stdout (PNG). Raises on error."""
     cmd = ["convert", "-"] + list(args) + ["png:-"]
+    # The work happens in the convert child (no GIL held here); cap its CPU and memory
+    cmd = limited_command(cmd, cpu_seconds=30, memory_mb=1024)
     result = subprocess.run(cmd, input=input_bytes, capture_output=True, timeout=30)
     if result.returncode != 0:
         raise RuntimeError(result.stderr.decode(errors="replace").strip())
@@ -153,9 +156,8 @@ def process_image(operation, session_key=None, image_b64=None,
     except Exception as e:
         return {"error": f"Bildverarbeitung fehlgeschlagen: {e}"}
 
-    result_b64 = base64.b64encode(out).decode()
     return {
-        "image_base64": result_b64,
+        "image_bytes": out,
         "mime_type": "image/png",
         "operation": operation
     }
@@ -1,6 +1,5 @@
 import qrcode
 import io
-import base64
 
 
 def generate_qr_code(text, size=10):
@@ -13,11 +12,9 @@ def generate_qr_code(text, size=10):
 
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
 
     return {
-        "image_base64": img_base64,
+        "image_bytes": buffer.getvalue(),
         "mime_type": "image/png",
         "text_encoded": text
     }
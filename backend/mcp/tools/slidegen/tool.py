@@ -1,7 +1,6 @@
 import io
 import re
 import json
-import base64
 
 from config import get_settings, get_tool_settings
 from services.tool_context import get_emit_log
@@ -33,6 +32,9 @@ SETTINGS_SCHEMA = [
 
 TOOL_DEFINITION = {
     "name": "generate_presentation",
+    # LLM call + python-pptx rendering; the .pptx bytes come back via temp file
+    "execution": "process",
+    "limits": {"timeout": 300, "cpu_seconds": 120, "memory_mb": 2048},
     "description": (
         "Erstellt eine professionelle PowerPoint-Präsentation (.pptx) auf Basis eines Themas oder Textes. "
         "Generiert automatisch Folien mit verschiedenen Layouts (Titel, Karten, Spalten, Schritte, etc.). "
@@ -147,7 +149,6 @@ def handler(topic: str, source_text: str = "", theme: str = "") -> dict:
     buf = io.BytesIO()
     prs.save(buf)
     pptx_bytes = buf.getvalue()
-    pptx_b64 = base64.b64encode(pptx_bytes).decode()
 
     # Build filename
     safe = re.sub(r'[^\w\s-]', '', topic).strip()
@@ -162,5 +163,5 @@ def handler(topic: str, source_text: str = "", theme: str = "") -> dict:
         "title": pres_title,
         "slides": len(slides),
         "filename": filename,
-        "pptx_base64": pptx_b64,
+        "pptx_bytes": pptx_bytes,
     }
@@ -1,10 +1,9 @@
 from PIL import Image, ImageDraw, ImageFont
 import io
-import base64
 
 
 def text_to_image(text, font_size=32, bg_color='white', text_color='black', width=800):
-    """Renders text as a PNG image and returns it as base64."""
+    """Renders text as a PNG image and returns the raw PNG bytes."""
     img = Image.new('RGB', (width, 100), color=bg_color)
     draw = ImageDraw.Draw(img)
 
@@ -48,11 +47,9 @@ def text_to_image(text, font_size=32, bg_color='white', text_color='black', widt
 
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
 
     return {
-        "image_base64": img_base64,
+        "image_bytes": buffer.getvalue(),
         "mime_type": "image/png",
         "width": width,
         "height": height
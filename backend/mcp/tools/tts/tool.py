@@ -1,4 +1,3 @@
-import base64
 import urllib.request
 import json
 
@@ -88,6 +87,6 @@ def text_to_speech(text):
         emit_log({"type": "text", "message": f"[TTS] Audio empfangen: {kb:.1f} KB — fertig!"})
 
     return {
-        "audio_base64": base64.b64encode(audio_bytes).decode(),
+        "audio_bytes": audio_bytes,
         "mime_type": "audio/mpeg",
     }
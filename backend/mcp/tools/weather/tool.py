@@ -24,7 +24,8 @@ TOOL_DEFINITION = {
             }
         },
         "required": ["location"]
-    }
+    },
+    "cache_ttl": 600,
 }
 
 WMO_CODES = {
@@ -34,7 +34,8 @@ TOOL_DEFINITION = {
             }
         },
         "required": ["query"]
-    }
+    },
+    "cache_ttl": 3600,
 }
 
 
@@ -1,7 +1,20 @@
+import json
 import sqlite3
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from config import DB_FILE, DATA_DIR
+from services import tracing
+
+# Deleted chats are remembered this long for delta sync (GET /api/chats?updated_since=);
+# clients with an older cursor get a full list instead
+TOMBSTONE_RETENTION_DAYS = 30
+# Trace spans (services/tracing.py) older than this are dropped at startup
+TRACE_RETENTION_DAYS = 14
+
+_CHAT_LIST_COLUMNS = 'id, title, created_at, updated_at, agent_id'
+
+_chat_listeners = []
 
 
 def get_db():
@@ -28,6 +41,26 @@ def init_db():
         conn.commit()
     except Exception:
         pass  # column already exists
+    # Migration: rolling conversation summary (services/summary.py)
+    for col in ("summary TEXT", "summary_upto INTEGER"):
+        try:
+            conn.execute(f"ALTER TABLE chats ADD COLUMN {col}")
+            conn.commit()
+        except Exception:
+            pass  # column already exists
+    # Chat list ordering and delta sync (updated_since) scan by updated_at
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_chats_updated_at ON chats(updated_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_tombstones (
+            chat_id INTEGER PRIMARY KEY,
+            deleted_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_tombstones_deleted_at ON chat_tombstones(deleted_at)')
+    conn.execute(
+        'DELETE FROM chat_tombstones WHERE deleted_at < ?',
+        ((datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat(),)
+    )
 
     conn.execute('''
         CREATE TABLE IF NOT EXISTS messages (
@@ -40,6 +73,34 @@ def init_db():
             FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE
         )
     ''')
+    # Migration: trace of the turn that wrote the message (services/tracing.py)
+    try:
+        conn.execute("ALTER TABLE messages ADD COLUMN trace_id TEXT")
+        conn.commit()
+    except Exception:
+        pass  # column already exists
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trace_spans (
+            span_id TEXT PRIMARY KEY,
+            trace_id TEXT NOT NULL,
+            parent_id TEXT,
+            name TEXT NOT NULL,
+            start_ts REAL NOT NULL,
+            end_ts REAL NOT NULL,
+            duration_ms REAL NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            chat_id INTEGER,
+            attributes TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trace_spans_trace_id ON trace_spans(trace_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trace_spans_chat_id ON trace_spans(chat_id)')
+    conn.execute(
+        'DELETE FROM trace_spans WHERE start_ts < ?',
+        (time.time() - TRACE_RETENTION_DAYS * 86400,)
+    )
 
     conn.execute('''
         CREATE TABLE IF NOT EXISTS usage_log (
@@ -60,10 +121,38 @@ def init_db():
         conn.commit()
     except Exception:
         pass  # column already exists
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tool_cache (
+            cache_key TEXT PRIMARY KEY,
+            tool_name TEXT NOT NULL,
+            result TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tool_cache_expires ON tool_cache(expires_at)')
+    # Drop persisted tool results that expired while the server was down
+    conn.execute('DELETE FROM tool_cache WHERE expires_at < ?', (time.time(),))
     conn.commit()
     conn.close()
 
 
+def add_chat_listener(fn):
+    """fn(chat_id, row) after a chat was created or changed; row is None if it was deleted."""
+    _chat_listeners.append(fn)
+
+
+def _notify_chat(chat_id, deleted=False):
+    if not _chat_listeners:
+        return
+    row = None if deleted else get_chat_row(chat_id)
+    for fn in _chat_listeners:
+        try:
+            fn(chat_id, row)
+        except Exception:
+            pass  # a failing listener (e.g. socket emit) must not break the DB write
+
+
 def create_chat(title="Neuer Chat", agent_id=None):
     conn = get_db()
     now = datetime.utcnow().isoformat()
@@ -74,16 +163,41 @@ def create_chat(title="Neuer Chat", agent_id=None):
     chat_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    _notify_chat(chat_id)
     return chat_id
 
 
 def get_chats():
     conn = get_db()
-    chats = conn.execute('SELECT * FROM chats ORDER BY updated_at DESC').fetchall()
+    chats = conn.execute(
+        f'SELECT {_CHAT_LIST_COLUMNS} FROM chats ORDER BY updated_at DESC'
+    ).fetchall()
     conn.close()
     return [dict(c) for c in chats]
 
 
+def get_chat_row(chat_id):
+    """One chat as it appears in the chat list (no messages)."""
+    conn = get_db()
+    row = conn.execute(f'SELECT {_CHAT_LIST_COLUMNS} FROM chats WHERE id = ?', (chat_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def get_chat_changes(since):
+    """Chats changed and chat ids deleted after the ISO timestamp 'since'."""
+    conn = get_db()
+    changed = conn.execute(
+        f'SELECT {_CHAT_LIST_COLUMNS} FROM chats WHERE updated_at > ? ORDER BY updated_at DESC',
+        (since,)
+    ).fetchall()
+    deleted = conn.execute(
+        'SELECT chat_id FROM chat_tombstones WHERE deleted_at > ?', (since,)
+    ).fetchall()
+    conn.close()
+    return [dict(c) for c in changed], [d['chat_id'] for d in deleted]
+
+
 def get_chat(chat_id):
     conn = get_db()
     chat = conn.execute('SELECT * FROM chats WHERE id = ?', (chat_id,)).fetchone()
@@ -103,26 +217,51 @@ def get_chat(chat_id):
 def delete_chat(chat_id):
     conn = get_db()
     conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+    conn.execute('DELETE FROM trace_spans WHERE chat_id = ?', (chat_id,))
     conn.execute('DELETE FROM chats WHERE id = ?', (chat_id,))
+    conn.execute(
+        'INSERT OR REPLACE INTO chat_tombstones (chat_id, deleted_at) VALUES (?, ?)',
+        (chat_id, datetime.utcnow().isoformat())
+    )
     conn.commit()
     conn.close()
+    _notify_chat(chat_id, deleted=True)
 
 
-def add_message(chat_id, role, content, message_type='text'):
+@tracing.traced('db.add_message')
+def add_message(chat_id, role, content, message_type='text', trace_id=None):
+    """trace_id defaults to the trace of the running turn (None outside a trace)."""
+    tracing.annotate(role=role, chars=len(content or ''))
     conn = get_db()
     now = datetime.utcnow().isoformat()
     conn.execute(
-        'INSERT INTO messages (chat_id, role, content, message_type, created_at) VALUES (?, ?, ?, ?, ?)',
-        (chat_id, role, content, message_type, now)
+        'INSERT INTO messages (chat_id, role, content, message_type, created_at, trace_id) VALUES (?, ?, ?, ?, ?, ?)',
+        (chat_id, role, content, message_type, now, trace_id or tracing.current_trace_id())
     )
     conn.execute('UPDATE chats SET updated_at = ? WHERE id = ?', (now, chat_id))
     conn.commit()
     conn.close()
+    _notify_chat(chat_id)
 
 
 def update_chat_title(chat_id, title):
     conn = get_db()
-    conn.execute('UPDATE chats SET title = ? WHERE id = ?', (title, chat_id))
+    # updated_at is bumped so the rename reaches other clients via delta sync
+    conn.execute(
+        'UPDATE chats SET title = ?, updated_at = ? WHERE id = ?',
+        (title, datetime.utcnow().isoformat(), chat_id)
+    )
+    conn.commit()
+    conn.close()
+    _notify_chat(chat_id)
+
+
+def update_chat_summary(chat_id, summary, summary_upto):
+    conn = get_db()
+    conn.execute(
+        'UPDATE chats SET summary = ?, summary_upto = ? WHERE id = ?',
+        (summary, summary_upto, chat_id)
+    )
     conn.commit()
     conn.close()
 
@@ -213,3 +352,84 @@ def reset_usage_stats():
     conn.execute('DELETE FROM usage_log')
     conn.commit()
     conn.close()
+
+
+def get_tool_cache_entry(cache_key):
+    conn = get_db()
+    row = conn.execute(
+        'SELECT result, expires_at FROM tool_cache WHERE cache_key = ?', (cache_key,)
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def set_tool_cache_entry(cache_key, tool_name, result, expires_at):
+    conn = get_db()
+    conn.execute(
+        'INSERT OR REPLACE INTO tool_cache (cache_key, tool_name, result, expires_at) VALUES (?, ?, ?, ?)',
+        (cache_key, tool_name, result, expires_at)
+    )
+    conn.commit()
+    conn.close()
+
+
+def prune_tool_cache():
+    """Delete expired tool results, returns the number of removed rows."""
+    conn = get_db()
+    removed = conn.execute('DELETE FROM tool_cache WHERE expires_at < ?', (time.time(),)).rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
+
+def clear_tool_cache():
+    conn = get_db()
+    conn.execute('DELETE FROM tool_cache')
+    conn.commit()
+    conn.close()
+
+
+def save_trace_spans(spans):
+    conn = get_db()
+    conn.executemany(
+        'INSERT OR REPLACE INTO trace_spans (span_id, trace_id, parent_id, name, start_ts, end_ts, duration_ms, status, error, chat_id, attributes) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(s['span_id'], s['trace_id'], s['parent_id'], s['name'], s['start'], s['end'], s['duration_ms'],
+          s['status'], s['error'], s['chat_id'], json.dumps(s['attributes'], ensure_ascii=False, default=str))
+         for s in spans]
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_trace_spans(trace_id):
+    conn = get_db()
+    rows = conn.execute('SELECT * FROM trace_spans WHERE trace_id = ?', (trace_id,)).fetchall()
+    conn.close()
+    spans = []
+    for r in rows:
+        span = dict(r)
+        span['start'], span['end'] = span.pop('start_ts'), span.pop('end_ts')
+        span['attributes'] = json.loads(span['attributes'] or '{}')
+        spans.append(span)
+    return spans
+
+
+def get_chat_traces(chat_id, limit=50):
+    """Turns of a chat (root spans, newest first) with the ids of the messages each one wrote."""
+    conn = get_db()
+    message_rows = conn.execute(
+        'SELECT id, role, trace_id FROM messages WHERE chat_id = ? AND trace_id IS NOT NULL', (chat_id,)
+    ).fetchall()
+    roots = conn.execute(
+        'SELECT trace_id, name, start_ts, duration_ms, status, error FROM trace_spans '
+        'WHERE parent_id IS NULL AND (chat_id = ? OR trace_id IN '
+        '(SELECT trace_id FROM messages WHERE chat_id = ? AND trace_id IS NOT NULL)) '
+        'ORDER BY start_ts DESC LIMIT ?',
+        (chat_id, chat_id, limit)
+    ).fetchall()
+    conn.close()
+    messages = {}
+    for m in message_rows:
+        messages.setdefault(m['trace_id'], []).append({'id': m['id'], 'role': m['role']})
+    return [{**dict(r), 'messages': messages.get(r['trace_id'], [])} for r in roots]
@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify, Response
 import json
 from config import get_agents, save_agents
+from services.budget import clean_budget
 
 agents_bp = Blueprint('agents', __name__)
 
@@ -23,6 +24,7 @@ def create_agent():
         'system_prompt': data.get('system_prompt', '').strip(),
         'provider_id': data.get('provider_id', '').strip(),
         'model': data.get('model', '').strip(),
+        'budget': clean_budget(data.get('budget')),
     }
     agents.append(agent)
     save_agents(agents)
@@ -40,6 +42,8 @@ def update_agent(agent_id):
             a['system_prompt'] = data.get('system_prompt', a['system_prompt']).strip()
             a['provider_id'] = data.get('provider_id', a.get('provider_id', '')).strip()
             a['model'] = data.get('model', a.get('model', '')).strip()
+            if 'budget' in data:
+                a['budget'] = clean_budget(data.get('budget'))
             save_agents(agents)
             return jsonify(a)
     return jsonify({'error': 'Agent nicht gefunden'}), 404
@@ -91,6 +95,7 @@ def import_agents():
             'system_prompt': a.get('system_prompt', '').strip(),
             'provider_id': a.get('provider_id', '').strip(),
             'model': a.get('model', '').strip(),
+            'budget': clean_budget(a.get('budget')),
         }
         if not new['name'] or not new['system_prompt']:
             continue
@@ -5,6 +5,7 @@ from flask import Blueprint, request, jsonify, Response
 from services.autoprompt import (
     get_autoprompts, get_autoprompt, save_autoprompt, delete_autoprompt
 )
+from services.budget import clean_budget
 
 autoprompts_bp = Blueprint('autoprompts', __name__)
 
@@ -42,6 +43,7 @@ def create_autoprompt():
         'weekly_day': data.get('weekly_day', 0),
         'agent_id': data.get('agent_id') or None,
         'save_to_chat': data.get('save_to_chat', False),
+        'budget': clean_budget(data.get('budget')),
         'chat_id': None,
         'last_run': None,
         'last_error': None,
@@ -68,6 +70,7 @@ def update_autoprompt(ap_id):
         'weekly_day': data.get('weekly_day', existing['weekly_day']),
         'agent_id': data.get('agent_id') or None,
         'save_to_chat': data.get('save_to_chat', existing.get('save_to_chat', False)),
+        'budget': clean_budget(data['budget']) if 'budget' in data else existing.get('budget', {}),
     })
     save_autoprompt(existing)
     if _service:
@@ -130,8 +133,10 @@ def run_autoprompt_now(ap_id):
     if not ap:
         return jsonify({'error': 'Nicht gefunden'}), 404
     if _service:
-        import threading
-        t = threading.Thread(target=_service._run, args=[ap_id], daemon=True)
-        t.start()
-        return jsonify({'success': True, 'message': 'Autoprompt wird ausgeführt...'})
+        from services.jobs import JobQueueFull
+        try:
+            job = _service.submit(ap_id)
+        except JobQueueFull as e:
+            return jsonify({'error': str(e), 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
+        return jsonify({'success': True, 'message': 'Autoprompt wird ausgeführt...', 'job_id': job.id})
     return jsonify({'error': 'Service nicht verfügbar'}), 500
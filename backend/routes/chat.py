@@ -1,13 +1,39 @@
-from flask import Blueprint, request, jsonify, Response
-from models import create_chat, get_chats, get_chat, delete_chat, add_message, update_chat_title, get_chat_usage_stats
+import mimetypes
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from models import (
+    create_chat, get_chats, get_chat, delete_chat, add_message, update_chat_title, get_chat_usage_stats,
+    get_chat_changes, TOMBSTONE_RETENTION_DAYS,
+)
 from services import file_store
 
 chat_bp = Blueprint('chat', __name__)
 
 
+# The next cursor lags "now" a little: a write that took its timestamp before this
+# query but committed after it is still returned next time (merging is idempotent)
+_CURSOR_OVERLAP = timedelta(seconds=5)
+
+
 @chat_bp.route('/api/chats', methods=['GET'])
 def list_chats():
-    return jsonify(get_chats())
+    """
+    Without parameters: all chats (array, newest first).
+    With ?updated_since=<cursor>: delta {chats, deleted, cursor, full} — only chats
+    changed after the cursor plus ids of deleted chats. An empty or expired cursor
+    returns the full list with full=true.
+    """
+    if 'updated_since' not in request.args:
+        return jsonify(get_chats())
+
+    now = datetime.utcnow()
+    cursor = (now - _CURSOR_OVERLAP).isoformat()
+    since = request.args.get('updated_since', '').strip()
+    horizon = (now - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat()
+    if not since or since < horizon:
+        return jsonify({'chats': get_chats(), 'deleted': [], 'cursor': cursor, 'full': True})
+    changed, deleted = get_chat_changes(since)
+    return jsonify({'chats': changed, 'deleted': deleted, 'cursor': cursor, 'full': False})
 
 
 @chat_bp.route('/api/chats', methods=['POST'])
@@ -35,15 +61,13 @@ def remove_chat(chat_id):
 
 @chat_bp.route('/api/chats/<int:chat_id>/files/<path:filename>', methods=['GET'])
 def get_chat_file(chat_id, filename):
-    data = file_store.get_file(chat_id, filename)
-    if data is None:
+    path = file_store.get_file_path(chat_id, filename)
+    if path is None:
         return jsonify({'error': 'Datei nicht gefunden'}), 404
-    mime = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
-    return Response(
-        data,
-        mimetype=mime,
-        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-    )
+    mime = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # Images/audio are embedded directly in the chat (<img>/<audio>), everything else is a download
+    inline = mime.startswith(('image/', 'audio/'))
+    return file_store.send_stored(path, filename, as_attachment=not inline, mimetype=mime)
 
 
 @chat_bp.route('/api/chats/<int:chat_id>/info', methods=['GET'])
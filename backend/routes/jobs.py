@@ -0,0 +1,45 @@
+from flask import Blueprint, request, jsonify
+from services.jobs import job_manager
+from services import cluster
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    chat_id = request.args.get('chat_id', type=int)
+    source = request.args.get('source') or None
+    status = request.args.get('status') or None
+    return jsonify({
+        'stats': job_manager.stats(),
+        'cluster': cluster.status(),
+        'jobs': [j.to_dict() for j in job_manager.list_jobs(chat_id, source, status)],
+    })
+
+
+@jobs_bp.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Current utilization (overall and per source) — cheap enough for frequent polling."""
+    return jsonify(job_manager.stats())
+
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job nicht gefunden'}), 404
+    result = job.to_dict()
+    result['queue_position'] = job_manager.queue_position(job)
+    # Webhook jobs return their JSON response as result (async mode)
+    result['result'] = job.result if isinstance(job.result, dict) else None
+    return jsonify(result)
+
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if not job:
+        # Possibly running on another node — that node cancels it
+        cluster.backend.publish_cancel(job_id)
+        return jsonify({'success': True, 'status': 'forwarded', 'node_id': cluster.NODE_ID}), 202
+    return jsonify({'success': True, 'status': job.status})
@@ -3,6 +3,7 @@ import uuid
 from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify, Response
 from config import get_settings, save_settings
+from mcp.manager import server_status
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -183,7 +184,12 @@ def update_provider(provider_id):
 @settings_bp.route('/api/mcp-servers', methods=['GET'])
 def list_mcp_servers():
     settings = get_settings()
-    return jsonify(settings.get('mcp_servers', []))
+    status = server_status()
+    disabled = {'state': 'disabled'}
+    return jsonify([
+        {**s, 'status': status.get(s['id']) or (disabled if not s.get('enabled', True) else {'state': 'pending'})}
+        for s in settings.get('mcp_servers', [])
+    ])
 
 
 @settings_bp.route('/api/mcp-servers', methods=['POST'])
@@ -199,6 +205,7 @@ def add_mcp_server():
         'args': data.get('args', []),
         'env': data.get('env', {}),
         'url': data.get('url', ''),
+        'headers': data.get('headers', {}),
         'enabled': True
     }
 
@@ -220,6 +227,9 @@ def update_mcp_server(server_id):
             s['command'] = data.get('command', s['command'])
             s['args'] = data.get('args', s['args'])
             s['env'] = data.get('env', s.get('env', {}))
+            s['transport'] = data.get('transport', s.get('transport', 'stdio'))
+            s['url'] = data.get('url', s.get('url', ''))
+            s['headers'] = data.get('headers', s.get('headers', {}))
             break
     save_settings(settings)
     return jsonify({'success': True})
@@ -242,12 +252,14 @@ def export_mcp_servers():
     import copy
     settings = get_settings()
     servers = settings.get('mcp_servers', [])
-    # Strip env values (may contain API keys) — keep keys as documentation
+    # Strip env / header values (may contain API keys) — keep keys as documentation
     clean = []
     for s in servers:
         s2 = copy.deepcopy(s)
         if s2.get('env'):
             s2['env'] = {k: '' for k in s2['env']}
+        if s2.get('headers'):
+            s2['headers'] = {k: '' for k in s2['headers']}
         clean.append(s2)
     payload = {
         'type': 'openguenther_mcp_servers',
@@ -288,6 +300,7 @@ def import_mcp_servers():
             'args': s.get('args', []),
             'env': s.get('env', {}),
             'url': s.get('url', ''),
+            'headers': s.get('headers', {}),
             'enabled': True,
         })
         existing_names.add(name)
@@ -342,7 +355,8 @@ def update_telegram_settings():
 @settings_bp.route('/api/telegram/status', methods=['GET'])
 def get_telegram_status():
     from app import telegram_gateway
-    return jsonify({'running': telegram_gateway.is_running()})
+    from services import cluster
+    return jsonify({'running': telegram_gateway.is_running(), 'cluster': cluster.status()})
 
 
 @settings_bp.route('/api/telegram/restart', methods=['POST'])
@@ -352,6 +366,11 @@ def restart_telegram():
     token = settings.get('telegram', {}).get('bot_token', '')
     if not token:
         return jsonify({'success': False, 'error': 'Kein Bot-Token konfiguriert'}), 400
+    from services import cluster
+    if not cluster.is_leader():
+        # Only one node may poll Telegram (otherwise getUpdates conflicts)
+        return jsonify({'success': False, 'error': 'Telegram läuft auf dem Leader-Knoten',
+                        'leader': cluster.backend.current_leader()}), 409
     telegram_gateway.stop()
     telegram_gateway.start(token)
     return jsonify({'success': True})
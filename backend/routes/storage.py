@@ -1,8 +1,8 @@
 import os
-import mimetypes
-from flask import Blueprint, jsonify, request, Response
+from flask import Blueprint, jsonify, request
 from models import get_chats
 from config import DATA_DIR, FILES_DIR
+from services.file_store import send_stored
 
 storage_bp = Blueprint('storage', __name__)
 
@@ -144,14 +144,4 @@ def download_storage_file():
     if not os.path.isfile(full_path):
         return jsonify({'error': 'Datei nicht gefunden'}), 404
 
-    filename = os.path.basename(full_path)
-    mime = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-
-    with open(full_path, 'rb') as f:
-        data = f.read()
-
-    return Response(
-        data,
-        mimetype=mime,
-        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
-    )
+    return send_stored(full_path, os.path.basename(full_path))
@@ -0,0 +1,24 @@
+from flask import Blueprint, Response, jsonify, request
+from models import get_chat_traces, get_trace_spans
+from services import tracing
+
+traces_bp = Blueprint('traces', __name__)
+
+
+@traces_bp.route('/api/chats/<int:chat_id>/traces', methods=['GET'])
+def chat_traces(chat_id):
+    """Turns of a chat (newest first) with duration, status and the messages they wrote."""
+    tracing.flush()
+    return jsonify(get_chat_traces(chat_id, limit=request.args.get('limit', 50, type=int)))
+
+
+@traces_bp.route('/api/traces/<trace_id>', methods=['GET'])
+def trace_waterfall(trace_id):
+    """Waterfall of one turn; ?format=text renders it as plain-text bars."""
+    tracing.flush()
+    trace = tracing.waterfall(get_trace_spans(trace_id))
+    if trace is None:
+        return jsonify({'error': 'Trace nicht gefunden'}), 404
+    if request.args.get('format') == 'text':
+        return Response(tracing.render_waterfall(trace), mimetype='text/plain')
+    return jsonify(trace)
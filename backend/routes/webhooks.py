@@ -5,7 +5,11 @@ from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
 
 from config import get_webhooks, save_webhooks, get_webhook, get_agent
-from models import get_chat, create_chat, add_message
+from models import get_chat, create_chat, delete_chat, add_message
+from services.budget import RunBudget, clean_budget
+from services.summary import build_chat_context
+from services import jobs, tracing
+from services.jobs import job_manager
 
 webhooks_bp = Blueprint('webhooks', __name__)
 
@@ -38,6 +42,7 @@ def create_webhook():
         'token': 'wh_' + secrets.token_hex(16),
         'chat_id': data.get('chat_id') or None,
         'agent_id': data.get('agent_id') or '',
+        'budget': clean_budget(data.get('budget')),
         'created_at': datetime.now(timezone.utc).isoformat(),
     }
     whs = get_webhooks()
@@ -55,6 +60,8 @@ def update_webhook(wh_id):
             w['name'] = data.get('name', w['name'])
             w['chat_id'] = data.get('chat_id') or None
             w['agent_id'] = data.get('agent_id') or ''
+            if 'budget' in data:
+                w['budget'] = clean_budget(data.get('budget'))
             whs[i] = w
             save_webhooks(whs)
             return jsonify({**w, 'token': _mask_token(w['token'])})
@@ -72,10 +79,6 @@ def delete_webhook(wh_id):
 
 @webhooks_bp.route('/webhook/<wh_id>', methods=['POST'])
 def trigger_webhook(wh_id):
-    from config import get_settings
-    from services.agent import run_agent
-    from services import file_store
-
     wh = get_webhook(wh_id)
     if not wh:
         return jsonify({'error': 'Webhook nicht gefunden'}), 404
@@ -89,29 +92,59 @@ def trigger_webhook(wh_id):
     if not message:
         return jsonify({'error': 'message ist erforderlich'}), 400
 
+    # Load shedding: reject before any work (chat creation, DB writes) is done
+    try:
+        job_manager.admit(jobs.SOURCE_WEBHOOK)
+    except jobs.JobQueueFull as e:
+        return _too_busy(e)
+
     # Determine chat
     chat_id = wh.get('chat_id')
     if chat_id and not get_chat(chat_id):
         chat_id = None
-
-    if chat_id:
-        chat = get_chat(chat_id)
-        messages = [
-            {'role': m['role'], 'content': m['content']}
-            for m in chat.get('messages', [])
-            if m['role'] in ('user', 'assistant')
-        ]
-    else:
+    new_chat = not chat_id
+    if new_chat:
         chat_id = create_chat(message[:50] + ('...' if len(message) > 50 else ''))
-        messages = []
 
-    messages.append({'role': 'user', 'content': message})
-    add_message(chat_id, 'user', message)
+    try:
+        job = job_manager.submit(
+            lambda job: _run_webhook_job(job, wh, chat_id, message),
+            source=jobs.SOURCE_WEBHOOK, chat_id=chat_id, label=f"Webhook: {wh.get('name', wh_id)}",
+        )
+    except jobs.JobQueueFull as e:
+        # The queue filled up between admit() and submit(): don't leave an empty chat behind
+        if new_chat:
+            delete_chat(chat_id)
+        return _too_busy(e)
+
+    # Async mode: answer immediately, result via GET /api/jobs/<job_id>
+    if body.get('async'):
+        return jsonify({'chat_id': chat_id, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}'}), 202
+
+    job.wait()
+    if job.status == jobs.STATUS_FAILED:
+        return jsonify({'error': job.error}), 500
+    if job.status == jobs.STATUS_CANCELLED:
+        return jsonify({'error': 'Job abgebrochen', 'chat_id': chat_id, 'job_id': job.id}), 409
+    return jsonify(job.result)
+
+
+def _too_busy(e):
+    return jsonify({'error': str(e), 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
+
+
+def _run_webhook_job(job, wh, chat_id, message):
+    from config import get_settings
+    from services.agent import run_agent
+    from services import file_store
+
+    settings = get_settings()
 
     # Resolve agent
     agent_system_prompt = None
     agent_provider_id = None
     agent_model = None
+    agent_budget = None
     agent_id = wh.get('agent_id') or ''
     if agent_id:
         agent_cfg = get_agent(agent_id)
@@ -119,20 +152,35 @@ def trigger_webhook(wh_id):
             agent_system_prompt = agent_cfg.get('system_prompt') or None
             agent_provider_id = agent_cfg.get('provider_id') or None
             agent_model = agent_cfg.get('model') or None
+            agent_budget = agent_cfg.get('budget')
 
-    settings = get_settings()
+    # Webhook budget wins over the agent budget, both over the global defaults
+    budget = RunBudget.from_settings(settings, agent_budget, wh.get('budget'))
 
-    try:
-        response = run_agent(
-            messages, settings,
-            emit_log=lambda _: None,
-            system_prompt=agent_system_prompt,
-            agent_provider_id=agent_provider_id,
-            agent_model=agent_model,
-            chat_id=chat_id,
-        )
-        response = file_store.extract_and_store(response, chat_id)
+    messages = build_chat_context(get_chat(chat_id), settings, budget=budget)
+    messages.append({'role': 'user', 'content': message})
+    add_message(chat_id, 'user', message)
+
+    response = run_agent(
+        messages, settings,
+        emit_log=job.track(lambda _: None),
+        system_prompt=agent_system_prompt,
+        agent_provider_id=agent_provider_id,
+        agent_model=agent_model,
+        chat_id=chat_id,
+        stop_event=job.stop_event,
+        budget=budget,
+    )
+    tracing.annotate(stop_reason=budget.stop_reason, iterations=budget.iterations)
+    response = file_store.extract_and_store(response, chat_id)
+    if response:  # empty when cancelled mid-run
         add_message(chat_id, 'assistant', response)
-        return jsonify({'chat_id': chat_id, 'response': response})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # The chat keeps its markers; the caller gets links it can fetch
+    text, files = file_store.resolve_markers(response, chat_id)
+    return {
+        'chat_id': chat_id,
+        'response': text,
+        'files': files,
+        'stop_reason': budget.stop_reason,
+        'budget': budget.summary(),
+    }
@@ -0,0 +1,95 @@
+"""
+Cold-start benchmark: time until `import app` returns (all tools registered).
+
+Each run is a fresh interpreter with its own temporary DATA_DIR. Compares:
+
+  eager       LAZY_TOOLS=0 — every built-in tool module is imported at startup
+  lazy-cold   manifest not cached yet — tool.py files are parsed with ast
+  lazy-warm   manifest cached in DATA_DIR/cache/tool_manifest.json
+
+and prints the slowest imports of the last run of each mode (python -X importtime):
+
+    cd backend
+    python scripts/bench_startup.py --runs 3 --top 10
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SNIPPET = (
+    "import time; t = time.perf_counter(); import app; "
+    "from mcp.registry import registry; "
+    "print(f'{time.perf_counter() - t:.4f} {len(registry.list_tools())}')"
+)
+
+
+def run_once(data_dir, lazy):
+    env = dict(os.environ, DATA_DIR=data_dir, LAZY_TOOLS='1' if lazy else '0', PYTHONDONTWRITEBYTECODE='')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SNIPPET],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    seconds, tools = proc.stdout.strip().splitlines()[-1].split()
+    return float(seconds), int(tools), _parse_importtime(proc.stderr)
+
+
+def _parse_importtime(stderr):
+    """[(cumulative_us, module)] for modules imported by app.py (python -X importtime format)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # Nesting is shown by indentation (2 spaces per level): keep the imports made
+        # directly by app.py and its siblings, deeper ones are already in their cumulative time
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth != 1:
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)
+
+
+def bench(mode, runs):
+    times, tools, profile = [], 0, []
+    for _ in range(runs):
+        data_dir = tempfile.mkdtemp(prefix='guenther-bench-')
+        try:
+            if mode == 'lazy-warm':
+                run_once(data_dir, lazy=True)  # populate the manifest
+            seconds, tools, profile = run_once(data_dir, lazy=mode != 'eager')
+            times.append(seconds)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return times, tools, profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='eager,lazy-cold,lazy-warm')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list per mode')
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'tools':>5} {'median':>8} {'min':>8} {'max':>8}")
+    profiles = {}
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        times, tools, profile = bench(mode, args.runs)
+        profiles[mode] = profile
+        print(f"{mode:<10} {tools:>5} {statistics.median(times):>7.3f}s {min(times):>7.3f}s {max(times):>7.3f}s")
+
+    for mode, profile in profiles.items():
+        print(f"\n{mode}: langsamste Imports (kumulativ)")
+        for cumulative_us, name in profile[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+WebSocket load test: concurrent Socket.IO sessions and message throughput per server mode.
+
+Starts a fake OpenAI-compatible LLM (fixed latency, no tokens spent), then for
+each mode launches `server.py` with its own temporary DATA_DIR, connects
+--clients Socket.IO sessions in parallel and lets each send --messages chat
+messages (waiting for agent_end before the next one). Prints one result row
+per mode, e.g. to compare the Werkzeug dev server with gevent:
+
+    cd backend
+    python scripts/loadtest_ws.py --modes threading,gevent --clients 100 --messages 3
+
+Requires the client extras: pip install "python-socketio[client]" websocket-client
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import socketio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_fake_llm(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                'choices': [{'message': {'role': 'assistant', 'content': '[]'}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 1, 'total_tokens': 11},
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    server = ThreadingHTTPServer(('127.0.0.1', _free_port()), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def start_server(mode, llm_url, workers):
+    data_dir = tempfile.mkdtemp(prefix=f'guenther-load-{mode}-')
+    with open(os.path.join(data_dir, 'settings.json'), 'w') as f:
+        json.dump({
+            'openrouter_api_key': 'loadtest',
+            'providers': {'openrouter': {'api_key': 'loadtest', 'base_url': llm_url, 'enabled': True}},
+            'jobs': {'max_workers': workers, 'max_queue': 10000},
+        }, f)
+    port = _free_port()
+    env = {**os.environ, 'ASYNC_MODE': mode, 'PORT': str(port), 'HOST': '127.0.0.1', 'DATA_DIR': data_dir}
+    proc = subprocess.Popen(
+        [sys.executable, 'server.py'], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{url}/api/jobs', timeout=1).ok:
+                return proc, url, data_dir
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError(f'server ({mode}) did not start')
+
+
+def run_client(url, messages, result):
+    sio = socketio.Client(reconnection=False)
+    done = threading.Event()
+    state = {'chat_id': None}
+
+    @sio.on('chat_created')
+    def on_created(data):
+        state['chat_id'] = data['chat_id']
+
+    @sio.on('agent_end')
+    def on_end(data):
+        done.set()
+
+    try:
+        t0 = time.perf_counter()
+        sio.connect(url, transports=['websocket'], wait_timeout=30)
+        result['connect'].append(time.perf_counter() - t0)
+        for i in range(messages):
+            done.clear()
+            t0 = time.perf_counter()
+            sio.emit('send_message', {'chat_id': state['chat_id'], 'content': f'Nachricht {i}'})
+            if not done.wait(120):
+                result['errors'] += 1
+                break
+            result['latency'].append(time.perf_counter() - t0)
+    except Exception:
+        result['errors'] += 1
+    finally:
+        result['sessions'] += 1 if sio.connected else 0
+        sio.disconnect()
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_mode(mode, args, llm_url):
+    proc, url, data_dir = start_server(mode, llm_url, args.workers)
+    result = {'connect': [], 'latency': [], 'errors': 0, 'sessions': 0}
+    try:
+        threads = [
+            threading.Thread(target=run_client, args=(url, args.messages, result))
+            for _ in range(args.clients)
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        'mode': mode,
+        'sessions': result['sessions'],
+        'messages': len(result['latency']),
+        'errors': result['errors'],
+        'msg_per_s': len(result['latency']) / elapsed if elapsed else 0,
+        'connect_p95': _pct(result['connect'], 0.95),
+        'latency_p50': statistics.median(result['latency']) if result['latency'] else 0,
+        'latency_p95': _pct(result['latency'], 0.95),
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=3, help='messages per client')
+    parser.add_argument('--workers', type=int, default=50, help='jobs.max_workers on the server')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='seconds per fake LLM call')
+    args = parser.parse_args()
+
+    llm, llm_url = start_fake_llm(args.llm_latency)
+    print(f"{args.clients} Clients x {args.messages} Nachrichten, LLM-Latenz {args.llm_latency}s, "
+          f"max_workers={args.workers}")
+    print(f"{'mode':<10} {'sessions':>8} {'msgs':>6} {'err':>4} {'msg/s':>7} "
+          f"{'conn p95':>9} {'lat p50':>8} {'lat p95':>8} {'total':>7}")
+    try:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            r = run_mode(mode, args, llm_url)
+            print(f"{r['mode']:<10} {r['sessions']:>8} {r['messages']:>6} {r['errors']:>4} "
+                  f"{r['msg_per_s']:>7.2f} {r['connect_p95']:>8.2f}s {r['latency_p50']:>7.2f}s "
+                  f"{r['latency_p95']:>7.2f}s {r['elapsed']:>6.1f}s")
+    finally:
+        llm.shutdown()
+
+
+if __name__ == '__main__':
+    main()
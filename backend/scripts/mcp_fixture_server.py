@@ -0,0 +1,307 @@
+"""
+Minimal MCP server for testing the external-server clients (no dependencies).
+
+Tools:
+  echo(text)                  returns the text
+  slow(seconds, steps=3)      sleeps, sending notifications/progress per step
+  crash()                     exits the process (stdio) — for supervisor tests
+  flaky(text)                 like echo, but over HTTP the SSE stream breaks off right
+                              after its first (priming) event; the client has to resume
+                              it via GET + Last-Event-ID
+
+Requests are handled concurrently (one thread per request), so responses can
+arrive out of order — exactly what a multiplexing client has to cope with.
+
+    python scripts/mcp_fixture_server.py              # stdio transport
+    python scripts/mcp_fixture_server.py --http 8765  # streamable HTTP on /mcp
+
+HTTP mode implements the streamable HTTP transport: initialize hands out an
+Mcp-Session-Id, tools/call answers with an SSE stream (progress + result, every
+event has an id and is kept for replay), everything else with plain JSON, and
+DELETE ends the session (later requests with that id get 404).
+
+As an external server in settings.json:
+    {"id": "fixture", "name": "Fixture", "transport": "stdio",
+     "command": "python", "args": ["scripts/mcp_fixture_server.py"]}
+    {"id": "fixture-http", "name": "Fixture HTTP", "transport": "http",
+     "url": "http://127.0.0.1:8765/mcp"}
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOOLS = [
+    {
+        "name": "echo",
+        "description": "Gibt den Text zurück.",
+        "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    },
+    {
+        "name": "slow",
+        "description": "Wartet 'seconds' Sekunden und meldet Fortschritt.",
+        "inputSchema": {"type": "object", "properties": {
+            "seconds": {"type": "number"}, "steps": {"type": "integer"},
+        }, "required": ["seconds"]},
+    },
+    {
+        "name": "crash",
+        "description": "Beendet den Serverprozess.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "flaky",
+        "description": "Gibt den Text zurück, unterbricht dabei den SSE-Stream (nur HTTP).",
+        "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    },
+]
+
+
+def call_tool(name, args, progress):
+    if name in ("echo", "flaky"):
+        if name == "flaky":
+            progress(1, 2, "vor dem Abbruch")
+            time.sleep(0.2)
+        return {"content": [{"type": "text", "text": str(args.get("text", ""))}]}
+    if name == "slow":
+        seconds = float(args.get("seconds", 1))
+        steps = max(1, int(args.get("steps", 3)))
+        for i in range(1, steps + 1):
+            time.sleep(seconds / steps)
+            progress(i, steps, f"Schritt {i}")
+        return {"content": [{"type": "text", "text": f"fertig nach {seconds}s (pid {os.getpid()})"}]}
+    if name == "crash":
+        os._exit(3)
+    raise ValueError(f"Unknown tool: {name}")
+
+
+def handle(msg, send):
+    """Process one JSON-RPC message; send(dict) writes a message back to the client."""
+    method, msg_id = msg.get("method"), msg.get("id")
+    if msg_id is None:
+        return  # notification (initialized, cancelled)
+    params = msg.get("params") or {}
+    try:
+        if method == "initialize":
+            result = {
+                "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "guenther-fixture", "version": "1.0.0"},
+            }
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": TOOLS}
+        elif method == "tools/call":
+            token = (params.get("_meta") or {}).get("progressToken")
+
+            def progress(done, total, message):
+                if token is not None:
+                    send({"jsonrpc": "2.0", "method": "notifications/progress", "params": {
+                        "progressToken": token, "progress": done, "total": total, "message": message,
+                    }})
+            result = call_tool(params.get("name"), params.get("arguments") or {}, progress)
+        else:
+            send({"jsonrpc": "2.0", "id": msg_id, "error": {"code": -32601, "message": f"Unknown method {method}"}})
+            return
+        send({"jsonrpc": "2.0", "id": msg_id, "result": result})
+    except Exception as e:
+        send({"jsonrpc": "2.0", "id": msg_id, "error": {"code": -32000, "message": str(e)}})
+
+
+def serve_stdio():
+    lock = threading.Lock()
+
+    def send(obj):
+        with lock:
+            sys.stdout.write(json.dumps(obj) + "\n")
+            sys.stdout.flush()
+
+    print("fixture server ready (stdio)", file=sys.stderr, flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        msg = json.loads(line)
+        threading.Thread(target=handle, args=(msg, send), daemon=True).start()
+
+
+class _Stream:
+    """Events of one SSE response, kept for replay after a broken connection."""
+
+    def __init__(self, stream_id):
+        self.id = stream_id
+        self.events = []      # (event id, json text)
+        self.done = False
+        self.cond = threading.Condition()
+
+    def send(self, obj):
+        with self.cond:
+            self.events.append((f"{self.id}-{len(self.events) + 1}", json.dumps(obj)))
+            if "id" in obj and "method" not in obj:
+                self.done = True  # the response ends the stream
+            self.cond.notify_all()
+
+
+class _HttpState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.streams = {}     # stream id -> _Stream
+        self.stream_ids = itertools.count(1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive; SSE bodies are sent chunked
+    state = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status, obj=None, headers=None):
+        body = json.dumps(obj).encode() if obj is not None else b""
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if obj is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _session_ok(self):
+        session = self.headers.get("Mcp-Session-Id")
+        if not session:
+            self._json(400, {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Mcp-Session-Id fehlt"}})
+            return False
+        with self.state.lock:
+            known = session in self.state.sessions
+        if not known:
+            self._json(404, {"jsonrpc": "2.0", "error": {"code": -32001, "message": "Session unbekannt"}})
+            return False
+        return True
+
+    def _chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_events(self, stream, start, prime=False, drop_after=None):
+        """Write stream events from index start until the response was sent."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        i = start
+        if prime:
+            # Empty event with an id first, so the client can resume even if the
+            # connection breaks before the first real message
+            self._chunk(f"id: {stream.id}-0\ndata:\n\n")
+            sent += 1
+        if drop_after is not None and sent >= drop_after:
+            self.close_connection = True
+            return
+        while True:
+            with stream.cond:
+                while i >= len(stream.events) and not stream.done:
+                    stream.cond.wait()
+                pending = stream.events[i:]
+                done = stream.done
+            for event_id, data in pending:
+                self._chunk(f"id: {event_id}\nevent: message\ndata: {data}\n\n")
+                i += 1
+                sent += 1
+                if drop_after is not None and sent >= drop_after:
+                    self.close_connection = True
+                    return  # no terminating chunk: the client sees a broken stream
+            if done and i >= len(stream.events):
+                break
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            msg = json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError:
+            self._json(400, {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}})
+            return
+        if not isinstance(msg, dict):
+            self._json(400, {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid request"}})
+            return
+
+        if msg.get("method") == "initialize":
+            session = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.sessions.add(session)
+            replies = []
+            handle(msg, replies.append)
+            self._json(200, replies[0], headers={"Mcp-Session-Id": session})
+            return
+        if not self._session_ok():
+            return
+        if "id" not in msg or "method" not in msg:
+            handle(msg, lambda obj: None)   # notification or response to a server request
+            self._json(202)
+            return
+        if msg["method"] != "tools/call":
+            replies = []
+            handle(msg, replies.append)
+            self._json(200, replies[0])
+            return
+
+        stream = _Stream(f"s{next(self.state.stream_ids)}")
+        with self.state.lock:
+            self.state.streams[stream.id] = stream
+        threading.Thread(target=handle, args=(msg, stream.send), daemon=True).start()
+        flaky = (msg.get("params") or {}).get("name") == "flaky"
+        self._stream_events(stream, 0, prime=True, drop_after=1 if flaky else None)
+
+    def do_GET(self):
+        if "text/event-stream" not in self.headers.get("Accept", ""):
+            self._json(405, {"error": "Accept: text/event-stream erforderlich"})
+            return
+        if not self._session_ok():
+            return
+        last = self.headers.get("Last-Event-ID", "")
+        stream_id, _, seq = last.rpartition("-")
+        with self.state.lock:
+            stream = self.state.streams.get(stream_id)
+        if stream is None or not seq.isdigit():
+            # No standalone server->client stream in this fixture
+            self._json(405, {"error": "Kein Stream zum Fortsetzen"})
+            return
+        self._stream_events(stream, int(seq))
+
+    def do_DELETE(self):
+        session = self.headers.get("Mcp-Session-Id")
+        with self.state.lock:
+            known = session in self.state.sessions
+            self.state.sessions.discard(session)
+        self._json(204 if known else 404)
+
+
+def serve_http(port, host="127.0.0.1"):
+    handler = type("Handler", (_Handler,), {"state": _HttpState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"fixture server ready (http://{host}:{server.server_port}/mcp)", file=sys.stderr, flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--http", type=int, metavar="PORT", help="streamable HTTP instead of stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    cli = parser.parse_args()
+    if cli.http is not None:
+        serve_http(cli.http, cli.host)
+    else:
+        serve_stdio()
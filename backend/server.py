@@ -0,0 +1,45 @@
+"""
+Production entry point.
+
+    python server.py                         (threading, the default)
+    ASYNC_MODE=gevent python server.py       (opt-in, see below)
+
+threading: one OS thread per request / job worker, as with `python app.py`.
+Anything blocking — an LLM request, a sqlite query, a CPU-bound tool — only
+stalls its own thread.
+
+gevent: the standard library is monkey-patched *before* the app is imported, so
+pure-Python socket / pipe I/O (LLM requests, MCP subprocess pipes, time.sleep)
+yields to other greenlets and many idle sessions are cheap. It does NOT make C
+extensions cooperative: sqlite3, psycopg2 (postgresql tool, no psycogreen) and
+CPU-bound in-process tools (create_chart, slidegen, ...) block the whole process
+— every session, the log flusher and the Telegram poller — while they run. Only
+worth it for many concurrent, mostly waiting sessions with sandboxed heavy tools
+("execution": "process"). WebSockets are served by gevent's WSGI server
+(simple-websocket, no extra package needed).
+
+`python app.py` keeps running the Werkzeug development server (threading mode).
+HOST / PORT environment variables override 0.0.0.0:5000.
+"""
+import os
+
+os.environ.setdefault('ASYNC_MODE', 'threading')
+ASYNC_MODE = os.environ['ASYNC_MODE'].strip().lower()
+
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE != 'threading':
+    raise SystemExit(f"Unbekannter ASYNC_MODE '{ASYNC_MODE}' (threading | gevent)")
+
+from app import app, socketio  # noqa: E402  (must come after monkey-patching)
+
+
+if __name__ == '__main__':
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', '5000'))
+    print(f"Guenther server: async_mode={socketio.async_mode} on {host}:{port}")
+    if ASYNC_MODE == 'threading':
+        socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=True)
+    else:
+        socketio.run(app, host=host, port=port, log_output=False)
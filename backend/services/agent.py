@@ -1,10 +1,16 @@
+import contextvars
 import json
 import re
 import base64
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from services.openrouter import call_openrouter, SYSTEM_PROMPT
 from services.tool_context import set_emit_log, set_current_chat_id
 from mcp.registry import registry
+from services import tool_cache, file_store, metrics, tracing
+from services.budget import RunBudget, STOP_COMPLETED, STOP_CANCELLED, STOP_ERROR
 from config import get_tool_settings
 
 TOOL_ROUTER_PROMPT = """Du bist ein Tool-Router. Deine Aufgabe ist es, aus einer Liste verfuegbarer Tools diejenigen auszuwaehlen, die fuer die Benutzeranfrage relevant sind.
@@ -20,6 +26,41 @@ def _ts():
     return datetime.now().strftime("%H:%M:%S")
 
 
+# Recursively strip JSON Schema keywords rejected by OpenAI-compatible APIs.
+# 'additionalProperties' is stripped entirely: boolean false triggers strict-mode
+# validation in gpt-4o which requires all properties to be in 'required' — unsafe
+# for schemas with optional fields. 'default' is not part of the supported subset.
+_UNSUPPORTED_SCHEMA_KEYS = {
+    '$schema', 'format', 'propertyNames', '$defs', '$ref', '$id',
+    'minLength', 'maxLength', 'minimum', 'maximum', 'exclusiveMinimum',
+    'exclusiveMaximum', 'multipleOf', 'pattern', 'minItems', 'maxItems',
+    'uniqueItems', 'minProperties', 'maxProperties',
+    'additionalProperties', 'default',
+}
+
+
+def _sanitize_schema(obj):
+    if isinstance(obj, dict):
+        result = {k: _sanitize_schema(v) for k, v in obj.items() if k not in _UNSUPPORTED_SCHEMA_KEYS}
+        # OpenAI requires 'items' on every array schema
+        if result.get('type') == 'array' and 'items' not in result:
+            result['items'] = {'type': 'object'}
+        return result
+    if isinstance(obj, list):
+        return [_sanitize_schema(i) for i in obj]
+    return obj
+
+
+def _sanitized_openai_tools(snapshot):
+    """OpenAI tool definitions of a registry snapshot (cached per version — do not mutate)."""
+    tools = snapshot.get_openai_tools()
+    for t in tools:
+        params = t.get('function', {}).get('parameters')
+        if params:
+            t['function']['parameters'] = _sanitize_schema(params)
+    return tools
+
+
 def _select_tools(all_tools, chat_messages, api_key, model, emit_log, base_url=None, timeout=120, provider_id=''):
     """
     Pre-filter: Ask LLM which tools are relevant for this request.
@@ -62,6 +103,7 @@ def _select_tools(all_tools, chat_messages, api_key, model, emit_log, base_url=N
         "user_query": last_user_msg
     }})
 
+    started = time.perf_counter()
     try:
         response = call_openrouter(router_messages, None, api_key, model, temperature=0.1, base_url=base_url, timeout=timeout, provider_id=provider_id)
         content = response.get("choices", [{}])[0].get("message", {}).get("content", "[]")
@@ -88,20 +130,65 @@ def _select_tools(all_tools, chat_messages, api_key, model, emit_log, base_url=N
 
         # If router selected nothing but we have tools, fall back to all
         if not selected and all_tools:
+            metrics.ROUTER_DURATION.observe(time.perf_counter() - started, 'fallback')
             emit_log({"type": "text", "message": f"[{_ts()}] Keine Tools ausgewaehlt, verwende alle."})
             return all_tools
 
+        metrics.ROUTER_DURATION.observe(time.perf_counter() - started, 'selected')
         return selected
 
     except Exception as e:
+        metrics.ROUTER_DURATION.observe(time.perf_counter() - started, 'error')
         emit_log({"type": "text", "message": f"[{_ts()}] Tool-Router Fehler: {str(e)} - verwende alle Tools"})
         return all_tools
 
 
+# Result keys that carry media payloads (raw bytes or legacy base64) per media kind
+_MEDIA_KEYS = {
+    'image': ('image_bytes', 'image_base64', 'mime_type'),
+    'audio': ('audio_bytes', 'audio_base64', 'mime_type'),
+    'pptx': ('pptx_bytes', 'pptx_base64'),
+}
+
+
+def _stash_media(result, kind, chat_id, stored=None):
+    """
+    Move a media payload out of the tool result into the chat's file store.
+    Tools return raw bytes (<kind>_bytes) or legacy base64 (<kind>_base64, e.g.
+    external MCP servers) — the latter is decoded exactly once here.
+    Returns (marker, size_in_bytes); the marker references the stored file, so the
+    final response never carries the payload itself.
+    Without a chat (e.g. autoprompt without history) the legacy inline marker is used.
+    stored: list that collects the names of files newly written for this turn.
+    """
+    data = result.get(f'{kind}_bytes')
+    if data is None:
+        data = base64.b64decode(result.get(f'{kind}_base64', ''))
+
+    if kind == 'pptx':
+        filename = result.get('filename', 'presentation.pptx')
+        if chat_id:
+            if stored is not None and file_store.get_file_path(chat_id, filename) is None:
+                stored.append(filename)  # an existing file of the same name belongs to an earlier turn
+            file_store.save_file(chat_id, filename, data)
+            return f"[STORED_FILE]({filename})", len(data)
+        return f"[PPTX_DOWNLOAD]({filename}::{base64.b64encode(data).decode()})", len(data)
+
+    mime = result.get('mime_type') or ('image/png' if kind == 'image' else 'audio/mpeg')
+    if chat_id:
+        filename = file_store.store_media(chat_id, data, mime, prefix=kind)
+        if stored is not None:
+            stored.append(filename)
+        tag = 'STORED_IMAGE' if kind == 'image' else 'STORED_AUDIO'
+        return f"[{tag}]({filename})", len(data)
+    alt = 'Generiertes Bild' if kind == 'image' else 'audio'
+    return f"![{alt}](data:{mime};base64,{base64.b64encode(data).decode()})", len(data)
+
+
 def _pick_provider_and_model_for_tools(selected_tools, settings):
     """
     Check if all selected tools agree on a provider+model override.
-    Returns (provider_cfg, model).
+    Returns (provider_id, provider_cfg, model).
     If tools disagree or have no override, falls back to the default provider+model.
     """
     default_provider_id = settings.get('default_provider', 'openrouter')
@@ -123,22 +210,200 @@ def _pick_provider_and_model_for_tools(selected_tools, settings):
             if m:
                 models.add(m)
 
-    override_provider_cfg = None
+    provider_id, provider_cfg = default_provider_id, default_provider_cfg
     if len(provider_ids) == 1:
         pid = provider_ids.pop()
-        override_provider_cfg = providers.get(pid, default_provider_cfg)
+        if pid in providers:
+            provider_id, provider_cfg = pid, providers[pid]
 
     override_model = models.pop() if len(models) == 1 else default_model
-    return override_provider_cfg or default_provider_cfg, override_model
+    return provider_id, provider_cfg, override_model
 
 
-def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provider_id=None, agent_model=None, chat_id=None, stop_event=None, no_tools=False):
+def _tool_override(tools, settings, model, api_key, base_url):
+    """
+    Tool-level provider/model override for the given tool subset.
+    Returns (model, api_key, base_url, provider_id, provider_cfg) or None if nothing changes.
+    """
+    effective_provider_id, effective_provider_cfg, effective_model = _pick_provider_and_model_for_tools(tools, settings)
+    tool_has_provider_override = any(
+        (get_tool_settings(t.get('function', {}).get('name', '')).get('provider') or '').strip()
+        for t in tools
+    )
+    if tool_has_provider_override and (effective_model != model or effective_provider_cfg.get('base_url', base_url) != base_url):
+        return (
+            effective_model,
+            effective_provider_cfg.get('api_key', '') or api_key,
+            effective_provider_cfg.get('base_url', base_url),
+            effective_provider_id,
+            effective_provider_cfg,
+        )
+    return None
+
+
+def _tool_names(tools):
+    return [t.get("function", {}).get("name", "") for t in tools]
+
+
+# ── Speculative tool routing ──
+# Last router selection per chat (follow-up turns usually need the same tools)
+_ROUTER_MEMORY_SIZE = 256
+_router_memory = OrderedDict()
+_router_memory_lock = threading.Lock()
+
+_WORD_RE = re.compile(r'[a-zäöüß0-9]{4,}')
+
+
+def _speculative_settings(settings):
+    cfg = settings.get('speculative_routing') or {}
+    return {
+        'enabled': bool(cfg.get('enabled', False)),
+        'max_tools': int(cfg.get('max_tools', 6)),
+    }
+
+
+def _remember_selection(chat_id, selected, all_tools):
+    if not chat_id or len(selected) == len(all_tools):
+        return  # router fallback (all tools) carries no information
+    with _router_memory_lock:
+        _router_memory[chat_id] = set(_tool_names(selected))
+        _router_memory.move_to_end(chat_id)
+        while len(_router_memory) > _ROUTER_MEMORY_SIZE:
+            _router_memory.popitem(last=False)
+
+
+def _stems(text):
+    return {w[:5] for w in _WORD_RE.findall((text or '').lower())}
+
+
+def _tool_stems(snapshot):
+    """Word stems of each tool's name + description (router index, cached per registry version)."""
+    return {
+        t['function']['name']: _stems(t['function']['name'].replace("_", " ") + " " + t['function'].get('description', ''))
+        for t in snapshot.derived('openai_tools', _sanitized_openai_tools)
+    }
+
+
+def _guess_tools(all_tools, chat_messages, chat_id, settings, tool_stems):
+    """
+    Cheap guess of the router's choice: the chat's previous selection plus the
+    tools whose name/description share the most word stems with the last user message.
+    """
+    last_user_msg = next(
+        (m.get("content") for m in reversed(chat_messages) if m.get("role") == "user"), ""
+    )
+    if isinstance(last_user_msg, list):
+        last_user_msg = " ".join(p.get("text", "") for p in last_user_msg if p.get("type") == "text")
+    query = _stems(last_user_msg)
+
+    scored = []
+    for t in all_tools:
+        func = t.get("function", {})
+        score = len(query & tool_stems.get(func.get("name", ""), set()))
+        if score:
+            scored.append((score, func.get("name", "")))
+    scored.sort(key=lambda x: -x[0])
+    names = {name for _, name in scored[:_speculative_settings(settings)['max_tools']]}
+
+    with _router_memory_lock:
+        names |= _router_memory.get(chat_id, set())
+    return [t for t in all_tools if t.get("function", {}).get("name") in names]
+
+
+class _Speculation:
+    """Main completion started with a guessed tool subset, running in parallel to the router."""
+
+    def __init__(self, tools, target, messages, temperature, timeout, chat_id, budget):
+        self.tools = tools
+        # Same target resolution as the real call: (model, api_key, base_url, provider_id, provider_cfg)
+        self.model, api_key, self.base_url, self.provider_id, provider_cfg = target
+        provider_name = provider_cfg.get('name') or self.provider_id
+        self.budget = budget
+        self.response = None
+        self.error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._discarded = False
+        # copy_context: the completion shows up as a span of the running turn
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run, messages, api_key, temperature, timeout, provider_name, chat_id),
+            daemon=True,
+        ).start()
+
+    def _run(self, messages, api_key, temperature, timeout, provider_name, chat_id):
+        set_current_chat_id(chat_id)  # usage_log attribution
+        try:
+            with tracing.span('agent.speculation', tools=len(self.tools)):
+                self.response = call_openrouter(
+                    messages, self.tools or None, api_key, self.model, temperature,
+                    base_url=self.base_url, timeout=timeout, provider_name=provider_name,
+                    provider_id=self.provider_id,
+                )
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._lock:
+                self._done.set()
+                charge = self._discarded
+            if charge:
+                self._charge()
+
+    def _charge(self):
+        # Discarded or not, the tokens are spent — an accepted response is charged by the agent loop
+        if self.response is not None:
+            self.budget.record_usage(self.provider_id, self.model, self.response.get('usage', {}))
+
+    def _discard(self):
+        """Charge the completion now if it's finished, else when it finishes."""
+        with self._lock:
+            self._discarded = True
+            done = self._done.is_set()
+        if done:
+            self._charge()
+
+    def resolve(self, router_tools, provider_id, model, base_url, emit_log):
+        """
+        Return the speculative response if the router agrees, else None.
+        Agreement: the router's tools are a subset of the guessed ones, the same
+        provider/model is targeted, and the response only calls router-approved tools.
+        """
+        router_names = set(_tool_names(router_tools))
+        spec_names = set(_tool_names(self.tools))
+        same_target = (provider_id, model, base_url) == (self.provider_id, self.model, self.base_url)
+        if not router_names <= spec_names or not same_target:
+            missing = sorted(router_names - spec_names)
+            emit_log({"type": "text", "message": f"[{_ts()}] Spekulation verworfen (Router wählte zusätzlich: {', '.join(missing) or 'anderes Modell'})"})
+            self._discard()
+            return None
+
+        self._done.wait()
+        if self.error is not None:
+            emit_log({"type": "text", "message": f"[{_ts()}] Spekulative Anfrage fehlgeschlagen ({self.error}) — normale Anfrage"})
+            return None
+
+        message = self.response.get('choices', [{}])[0].get('message', {})
+        called = {tc.get('function', {}).get('name', '') for tc in message.get('tool_calls') or []}
+        if not called <= router_names:
+            self._discard()
+            emit_log({"type": "text", "message": f"[{_ts()}] Spekulation verworfen (ruft nicht ausgewählte Tools: {', '.join(sorted(called - router_names))})"})
+            return None
+        return self.response
+
+
+@tracing.traced('agent.run')
+def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provider_id=None, agent_model=None, chat_id=None, stop_event=None, no_tools=False, budget=None):
     """
     Run the agent loop: send messages to LLM, handle tool calls, iterate.
     Logs ALL communication to Guenther terminal.
     Returns the final assistant response.
+
+    budget: optional RunBudget (wall time, tokens, cost, tool calls) — checked
+    between iterations; budget.stop_reason tells the caller why the run ended.
     """
     set_current_chat_id(chat_id)
+    if budget is None:
+        budget = RunBudget.from_settings(settings)
     # Resolve provider
     provider_id = settings.get('default_provider', 'openrouter')
     providers = settings.get('providers', {})
@@ -162,53 +427,37 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
     if agent_model:
         model = agent_model
 
+    tracing.annotate(provider=provider_id, model=model, no_tools=no_tools)
+
     if not api_key and provider_id == 'openrouter':
+        budget.stop_reason = STOP_ERROR
         return "Fehler: Kein OpenRouter API-Key konfiguriert. Bitte in den Einstellungen hinterlegen."
 
     # Build messages — strip embedded base64 media from history (spart Tokens, war nie nützlich fürs LLM)
     active_prompt = system_prompt if system_prompt else SYSTEM_PROMPT
+    # System context from the history (e.g. the rolling chat summary) is merged into the one system prompt
+    history_context = [m["content"] for m in chat_messages if m.get("role") == "system" and m.get("content")]
+    if history_context:
+        active_prompt = "\n\n".join([active_prompt] + history_context)
     messages = [{"role": "system", "content": active_prompt}]
     for msg in chat_messages:
+        if msg.get("role") == "system":
+            continue
         if msg.get("role") == "assistant" and isinstance(msg.get("content"), str):
             cleaned = re.sub(r'!\[[^\]]*\]\(data:[^)]{20,}\)', '', msg["content"]).strip()
             messages.append({**msg, "content": cleaned})
         else:
             messages.append(msg)
 
+    # One registry snapshot for the whole run: tool list and lookups stay consistent
+    # even if tools are reloaded meanwhile; sanitized schemas are built once per version
+    tool_snapshot = registry.snapshot()
     all_tools = [
-        t for t in registry.get_openai_tools()
-        if (registry.get_tool(t['function']['name']).always_enabled
+        t for t in tool_snapshot.derived('openai_tools', _sanitized_openai_tools)
+        if (tool_snapshot.get_tool(t['function']['name']).always_enabled
             or get_tool_settings(t['function']['name']).get('enabled', True))
     ]
 
-    # Recursively strip JSON Schema keywords rejected by OpenAI-compatible APIs.
-    # 'additionalProperties' is stripped entirely: boolean false triggers strict-mode
-    # validation in gpt-4o which requires all properties to be in 'required' — unsafe
-    # for schemas with optional fields. 'default' is not part of the supported subset.
-    _UNSUPPORTED_SCHEMA_KEYS = {
-        '$schema', 'format', 'propertyNames', '$defs', '$ref', '$id',
-        'minLength', 'maxLength', 'minimum', 'maximum', 'exclusiveMinimum',
-        'exclusiveMaximum', 'multipleOf', 'pattern', 'minItems', 'maxItems',
-        'uniqueItems', 'minProperties', 'maxProperties',
-        'additionalProperties', 'default',
-    }
-
-    def _sanitize_schema(obj):
-        if isinstance(obj, dict):
-            result = {k: _sanitize_schema(v) for k, v in obj.items() if k not in _UNSUPPORTED_SCHEMA_KEYS}
-            # OpenAI requires 'items' on every array schema
-            if result.get('type') == 'array' and 'items' not in result:
-                result['items'] = {'type': 'object'}
-            return result
-        if isinstance(obj, list):
-            return [_sanitize_schema(i) for i in obj]
-        return obj
-
-    for _t in all_tools:
-        params = _t.get('function', {}).get('parameters')
-        if params:
-            _t['function']['parameters'] = _sanitize_schema(params)
-
     # ── Log: Start ──
     emit_log({"type": "header", "message": "GUENTHER AGENT GESTARTET"})
     emit_log({"type": "text", "message": f"[{_ts()}] Modell: {model} | Temperatur: {temperature}"})
@@ -218,7 +467,9 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
     emit_log({"type": "text", "message": active_prompt})
 
     emit_log({"type": "text", "message": f"[{_ts()}] LLM Timeout: {llm_timeout}s"})
+    emit_log({"type": "json", "label": "budget", "data": budget.limits})
 
+    speculative_response = None
     if no_tools:
         # Agent-Start: keine Tools, kein Tool-Router — nur System-Prompt + Nachricht
         emit_log({"type": "text", "message": f"[{_ts()}] Kein Tool-Routing (Agent-Start)"})
@@ -228,21 +479,35 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
         emit_log({"type": "header", "message": f"ALLE TOOLS ({len(all_tools)})"})
         emit_log({"type": "json", "label": "all_tools", "data": all_tools})
 
+        # ── Speculative mode: start the main completion with a guessed tool subset
+        # while the router runs; the result is only used if the router agrees ──
+        speculation = None
+        if _speculative_settings(settings)['enabled'] and len(all_tools) > 3:
+            spec_tools = _guess_tools(all_tools, chat_messages, chat_id, settings,
+                                      tool_snapshot.derived('tool_stems', _tool_stems))
+            spec_target = (_tool_override(spec_tools, settings, model, api_key, base_url)
+                           or (model, api_key, base_url, provider_id, provider_cfg))
+            speculation = _Speculation(
+                spec_tools, spec_target, list(messages), temperature, llm_timeout, chat_id, budget,
+            )
+            emit_log({"type": "text", "message": f"[{_ts()}] Spekulativer Start mit {len(spec_tools)} Tool(s): {', '.join(_tool_names(spec_tools)) or '-'}"})
+
         # ── Tool Router: Pre-filter ──
-        tools = _select_tools(all_tools, chat_messages, api_key, model, emit_log, base_url=base_url, timeout=llm_timeout, provider_id=provider_id)
+        with tracing.span('agent.select_tools', available=len(all_tools)) as router_span:
+            tools = _select_tools(all_tools, chat_messages, api_key, model, emit_log, base_url=base_url, timeout=llm_timeout, provider_id=provider_id)
+            router_span.set(selected=len(tools))
+        _remember_selection(chat_id, tools, all_tools)
 
         # ── Provider+Model override: use tool-specific overrides if all tools agree ──
         # Only override if there's an actual tool-level setting (not a default fallback that conflicts with agent settings)
-        effective_provider_cfg, effective_model = _pick_provider_and_model_for_tools(tools, settings)
-        tool_has_provider_override = any(
-            (get_tool_settings(t.get('function', {}).get('name', '')).get('provider') or '').strip()
-            for t in tools
-        )
-        if tool_has_provider_override and (effective_model != model or effective_provider_cfg.get('base_url', base_url) != base_url):
-            emit_log({"type": "text", "message": f"[{_ts()}] Tool-Override aktiv: Provider={effective_provider_cfg.get('name', provider_id)} Modell={effective_model}"})
-            model = effective_model
-            api_key = effective_provider_cfg.get('api_key', '') or api_key
-            base_url = effective_provider_cfg.get('base_url', base_url)
+        override = _tool_override(tools, settings, model, api_key, base_url)
+        if override:
+            model, api_key, base_url, provider_id, provider_cfg = override
+            tracing.annotate(provider=provider_id, model=model)
+            emit_log({"type": "text", "message": f"[{_ts()}] Tool-Override aktiv: Provider={provider_cfg.get('name') or provider_id} Modell={model}"})
+
+        if speculation:
+            speculative_response = speculation.resolve(tools, provider_id, model, base_url, emit_log)
 
     # ── Log: Gefilterte Tools ──
     emit_log({"type": "header", "message": f"AKTIVE TOOLS FUER DIESEN REQUEST ({len(tools)})"})
@@ -270,14 +535,26 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
     collected_audio = []
     collected_html = []
     collected_pptx = []
-    max_iterations = 10
-    iteration = 0
+    stored_media = []  # files written to the chat store during this turn
+
+    def with_media(text):
+        # Runs ending without a final answer still reference the media they already produced
+        return "\n\n".join([text] + collected_pptx + collected_images + collected_audio)
 
-    while iteration < max_iterations:
-        iteration += 1
+    while True:
         if stop_event and stop_event.is_set():
-            emit_log({"type": "text", "message": f"[{_ts()}] Abgebrochen nach Iteration {iteration - 1}."})
-            break
+            emit_log({"type": "text", "message": f"[{_ts()}] Abgebrochen nach Iteration {budget.iterations}."})
+            budget.stop_reason = STOP_CANCELLED
+            # Nothing is saved for a cancelled turn — don't leave its files behind
+            if chat_id and stored_media:
+                file_store.delete_files(chat_id, stored_media)
+            return ""
+        if budget.check():
+            emit_log({"type": "text", "message": f"[{_ts()}] WARNUNG: {budget.stop_message()}!"})
+            emit_log({"type": "json", "label": "budget", "data": budget.summary()})
+            return with_media(f"{budget.stop_message()}. Bitte versuche es erneut.")
+        budget.iterations += 1
+        iteration = budget.iterations
         emit_log({"type": "header", "message": f"ITERATION {iteration}"})
         provider_display = provider_cfg.get('name') or provider_id
         emit_log({"type": "text", "message": f"[{_ts()}] Sende Anfrage an {provider_display}..."})
@@ -288,8 +565,12 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
             "model": model,
             "messages": _sanitize_messages(messages),
         }
-        if tools:
-            request_payload["tools"] = tools
+        # Tool budget used up: one more request without tools for the final answer
+        iteration_tools = tools if tools and not budget.tools_exhausted() else None
+        if tools and iteration_tools is None:
+            emit_log({"type": "text", "message": f"[{_ts()}] Tool-Budget erschöpft, Anfrage ohne Tools fuer die finale Antwort"})
+        if iteration_tools:
+            request_payload["tools"] = iteration_tools
             request_payload["tool_choice"] = "auto"
 
         emit_log({"type": "header", "message": "API REQUEST"})
@@ -297,7 +578,11 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
         emit_log({"type": "json", "label": "payload", "data": request_payload})
 
         try:
-            response = call_openrouter(messages, tools if tools else None, api_key, model, temperature, base_url=base_url, timeout=llm_timeout, provider_name=provider_display, provider_id=provider_id)
+            if speculative_response is not None:
+                response, speculative_response = speculative_response, None
+                emit_log({"type": "text", "message": f"[{_ts()}] Verwende spekulative Antwort (Router stimmt zu)"})
+            else:
+                response = call_openrouter(messages, iteration_tools, api_key, model, temperature, base_url=base_url, timeout=llm_timeout, provider_name=provider_display, provider_id=provider_id)
         except Exception as e:
             # Try to extract a human-readable upstream error message
             import requests as _requests
@@ -319,7 +604,8 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
             if upstream:
                 error_msg += f"\n\n**Details:** {upstream}"
             emit_log({"type": "text", "message": f"[{_ts()}] FEHLER: {error_msg}"})
-            return error_msg
+            budget.stop_reason = STOP_ERROR
+            return with_media(error_msg)
 
         # ── Log: Full API Response ──
         emit_log({"type": "header", "message": "API RESPONSE"})
@@ -328,6 +614,7 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
         choice = response.get('choices', [{}])[0]
         message = choice.get('message', {})
         usage = response.get('usage', {})
+        budget.record_usage(provider_id, model, usage)
 
         if usage:
             emit_log({"type": "text", "message": f"[{_ts()}] Tokens: prompt={usage.get('prompt_tokens', '?')} completion={usage.get('completion_tokens', '?')} total={usage.get('total_tokens', '?')}"})
@@ -353,12 +640,34 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
 
                 emit_log({"type": "header", "message": f"TOOL CALL: {tool_name}"})
                 emit_log({"type": "json", "label": "arguments", "data": tool_args})
+                budget.record_tool_call()
+                max_tool_calls = budget.limits.get('max_tool_calls')
 
-                tool = registry.get_tool(tool_name)
-                if tool and tool.handler:
+                tool = tool_snapshot.get_tool(tool_name)
+                if max_tool_calls and budget.tool_calls > max_tool_calls:
+                    result_str = json.dumps(
+                        {"error": f"Tool-Budget erschöpft ({max_tool_calls} Aufrufe) — bitte mit den vorhandenen Ergebnissen antworten"},
+                        ensure_ascii=False
+                    )
+                    emit_log({"type": "text", "message": f"[{_ts()}] Tool-Budget erschöpft, {tool_name} wird nicht ausgefuehrt"})
+                elif tool and tool.handler:
                     try:
-                        emit_log({"type": "text", "message": f"[{_ts()}] Fuehre aus..."})
-                        result = tool.handler(**tool_args)
+                        with tracing.span('tool.call', tool=tool_name, iteration=iteration) as tool_span:
+                            cache_hit, result = tool_cache.lookup(tool, tool_args)
+                            tool_span.set(cache_hit=cache_hit)
+                            if cache_hit:
+                                emit_log({"type": "text", "message": f"[{_ts()}] Cache-Treffer (TTL {tool.cache_ttl}s), kein erneuter Aufruf"})
+                            else:
+                                emit_log({"type": "text", "message": f"[{_ts()}] Fuehre aus..."})
+                                started = time.perf_counter()
+                                try:
+                                    result = tool.handler(**tool_args)
+                                finally:
+                                    metrics.TOOL_DURATION.observe(time.perf_counter() - started, tool_name)
+                                if isinstance(result, dict) and result.get('error'):
+                                    metrics.TOOL_ERRORS.inc(tool_name)
+                                    tool_span.set(error=str(result['error'])[:200])
+                                tool_cache.store(tool, tool_args, result)
 
                         # Check for HTML report
                         if isinstance(result, dict) and 'html_content' in result:
@@ -374,13 +683,14 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
                             emit_log({"type": "json", "label": "result", "data": simplified})
 
                         # Check for image data
-                        elif isinstance(result, dict) and 'image_base64' in result:
-                            collected_images.append(result)
-                            # Alle Felder außer image_base64/mime_type an LLM schicken,
+                        elif isinstance(result, dict) and ('image_bytes' in result or 'image_base64' in result):
+                            marker, size = _stash_media(result, 'image', chat_id, stored_media)
+                            collected_images.append(marker)
+                            # Alle Felder außer Bilddaten/mime_type an LLM schicken,
                             # damit es die Daten (z.B. Flugzeug-Liste) noch sieht.
                             # Bei reinen Bild-Tools (kein anderer Inhalt) bleibt nur die Erfolgsmeldung.
                             data_fields = {k: v for k, v in result.items()
-                                           if k not in ('image_base64', 'mime_type')}
+                                           if k not in _MEDIA_KEYS['image']}
                             if data_fields:
                                 data_fields['bild'] = "Karte wurde erstellt und wird im Chat angezeigt."
                                 result_str = json.dumps(data_fields, ensure_ascii=False)
@@ -396,9 +706,10 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
                                 result_str = json.dumps(simplified, ensure_ascii=False)
                                 emit_log({"type": "header", "message": f"TOOL RESULT: {tool_name}"})
                                 emit_log({"type": "json", "label": "result", "data": simplified})
-                            emit_log({"type": "text", "message": f"[{_ts()}] (Bild-Daten: {len(result['image_base64'])} Bytes Base64)"})
-                        elif isinstance(result, dict) and 'pptx_base64' in result:
-                            collected_pptx.append(result)
+                            emit_log({"type": "text", "message": f"[{_ts()}] (Bild-Daten: {size // 1024} KB → {marker[:80]})"})
+                        elif isinstance(result, dict) and ('pptx_bytes' in result or 'pptx_base64' in result):
+                            marker, size = _stash_media(result, 'pptx', chat_id, stored_media)
+                            collected_pptx.append(marker)
                             simplified = {
                                 "success": True,
                                 "title": result.get("title", ""),
@@ -409,10 +720,11 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
                             result_str = json.dumps(simplified, ensure_ascii=False)
                             emit_log({"type": "header", "message": f"TOOL RESULT: {tool_name}"})
                             emit_log({"type": "json", "label": "result", "data": simplified})
-                            emit_log({"type": "text", "message": f"[{_ts()}] (PPTX: {len(result['pptx_base64'])} Bytes Base64)"})
+                            emit_log({"type": "text", "message": f"[{_ts()}] (PPTX: {size // 1024} KB → {marker[:80]})"})
 
-                        elif isinstance(result, dict) and 'audio_base64' in result:
-                            collected_audio.append(result)
+                        elif isinstance(result, dict) and ('audio_bytes' in result or 'audio_base64' in result):
+                            marker, size = _stash_media(result, 'audio', chat_id, stored_media)
+                            collected_audio.append(marker)
                             simplified = {
                                 "success": True,
                                 "message": "Audio wurde erfolgreich erstellt",
@@ -421,15 +733,17 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
 
                             emit_log({"type": "header", "message": f"TOOL RESULT: {tool_name}"})
                             emit_log({"type": "json", "label": "result", "data": simplified})
-                            emit_log({"type": "text", "message": f"[{_ts()}] (Audio-Daten: {len(result['audio_base64'])} Bytes Base64)"})
+                            emit_log({"type": "text", "message": f"[{_ts()}] (Audio-Daten: {size // 1024} KB → {marker[:80]})"})
                         else:
                             result_str = json.dumps(result, ensure_ascii=False)
                             emit_log({"type": "header", "message": f"TOOL RESULT: {tool_name}"})
                             emit_log({"type": "json", "label": "result", "data": result})
 
                     except Exception as e:
+                        metrics.TOOL_ERRORS.inc(tool_name)
                         result_str = json.dumps({"error": str(e)}, ensure_ascii=False)
                         emit_log({"type": "text", "message": f"[{_ts()}] FEHLER: {str(e)}"})
+                    metrics.TOOL_RESULT_BYTES.observe(len(result_str.encode('utf-8')), tool_name)
                 else:
                     result_str = json.dumps(
                         {"error": f"Tool '{tool_name}' nicht gefunden"},
@@ -463,30 +777,15 @@ def run_agent(chat_messages, settings, emit_log, system_prompt=None, agent_provi
                     pdf_b64 = base64.b64encode(report['pdf_html'].encode('utf-8')).decode()
                     content += f"\n\n[PDF_REPORT](data:text/html;base64,{pdf_b64})"
 
-            # Append collected PPTX downloads
-            for pptx in collected_pptx:
-                filename = pptx.get('filename', 'presentation.pptx')
-                b64 = pptx.get('pptx_base64', '')
-                content += f"\n\n[PPTX_DOWNLOAD]({filename}::{b64})"
-
-            # Append collected images
-            for img in collected_images:
-                mime = img.get('mime_type', 'image/png')
-                b64 = img.get('image_base64', '')
-                content += f"\n\n![Generiertes Bild](data:{mime};base64,{b64})"
-
-            # Append collected audio
-            for audio in collected_audio:
-                mime = audio.get('mime_type', 'audio/mpeg')
-                b64 = audio.get('audio_base64', '')
-                content += f"\n\n![audio](data:{mime};base64,{b64})"
+            # Append collected media references (files already stored per chat)
+            for marker in collected_pptx + collected_images + collected_audio:
+                content += f"\n\n{marker}"
 
+            budget.stop_reason = STOP_COMPLETED
+            emit_log({"type": "json", "label": "budget", "data": budget.summary()})
             emit_log({"type": "header", "message": "GUENTHER AGENT BEENDET"})
             return content
 
-    emit_log({"type": "text", "message": f"[{_ts()}] WARNUNG: Maximale Iterationen erreicht!"})
-    return "Maximale Iterationen erreicht. Bitte versuche es erneut."
-
 
 def _sanitize_messages(messages):
     """Create a safe copy of messages for logging (truncate long content)."""
@@ -0,0 +1,200 @@
+"""
+Large text attachments: stored once, retrieved per question.
+
+Text files sent with a chat message used to be pasted into the user message in
+full — stored in SQLite, reloaded every turn and sent to the LLM every iteration.
+Files above settings['attachments']['inline_max_chars'] are now written to the
+chat's file store once; the message only keeps a small [ATTACHMENT](name) marker.
+
+When the context for a turn is built (services/summary.build_chat_context), each
+marker is expanded to a view of the file: the file is split into line-aligned
+chunks, the chunks are ranked against the current user question with BM25, and
+the best ones (plus the first chunk, which usually holds headers / column names)
+are sent in file order until 'max_context_chars' is used up. Prompts stay
+bounded no matter how large the file is; a different question selects different
+chunks.
+
+Small files keep the old behaviour (inline code block).
+"""
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter, OrderedDict
+
+from services import file_store
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_RE = re.compile(r'\[ATTACHMENT\]\(([^)]+)\)')
+_TOKEN_RE = re.compile(r'\w{2,}', re.UNICODE)
+
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+_INDEX_CACHE_SIZE = 16
+
+_cache_lock = threading.Lock()
+_index_cache = OrderedDict()  # (path, mtime) -> _ChunkIndex
+
+
+def _settings(settings):
+    cfg = settings.get('attachments') or {}
+    return {
+        'inline_max_chars': int(cfg.get('inline_max_chars', 20000)),
+        'chunk_chars': max(200, int(cfg.get('chunk_chars', 1500))),
+        'max_context_chars': max(1000, int(cfg.get('max_context_chars', 12000))),
+    }
+
+
+def _tokenize(text):
+    return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+
+class _ChunkIndex:
+    """Line-aligned chunks of one file with BM25 term statistics."""
+
+    def __init__(self, text, chunk_chars):
+        self.chunks = []  # (first_line, last_line, text)
+        start, buf, size = 1, [], 0
+        for lineno, line in enumerate(text.splitlines(), start=1):
+            # Very long single lines (minified JSON, ...) are split hard
+            while len(line) > chunk_chars:
+                if buf:
+                    self.chunks.append((start, lineno - 1, '\n'.join(buf)))
+                    buf, size = [], 0
+                self.chunks.append((lineno, lineno, line[:chunk_chars]))
+                line = line[chunk_chars:]
+                start = lineno
+            if size + len(line) > chunk_chars and buf:
+                self.chunks.append((start, lineno - 1, '\n'.join(buf)))
+                start, buf, size = lineno, [], 0
+            buf.append(line)
+            size += len(line) + 1
+        if buf:
+            self.chunks.append((start, start + len(buf) - 1, '\n'.join(buf)))
+
+        self.line_count = text.count('\n') + 1
+        self.term_freqs = [Counter(_tokenize(c[2])) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def score(self, query_terms):
+        scores = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            s = 0.0
+            norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * length / (self.avg_len or 1))
+            for term in query_terms:
+                f = tf.get(term)
+                if f:
+                    s += self.idf[term] * f * (_BM25_K1 + 1) / (f + norm)
+            scores.append(s)
+        return scores
+
+    def select(self, query, max_chars):
+        """Indices of the chunks to show for a query, in file order."""
+        terms = set(_tokenize(query))
+        scores = self.score(terms) if terms else [0.0] * len(self.chunks)
+        ranked = sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i))
+        chosen, used = [], 0
+        # First chunk always: headers, CSV column names, file preamble
+        for i in [0] + [i for i in ranked if i != 0 and (scores[i] > 0 or not terms)]:
+            size = len(self.chunks[i][2])
+            if chosen and used + size > max_chars:
+                continue
+            chosen.append(i)
+            used += size
+        return sorted(chosen)
+
+
+def _load_index(path, chunk_chars):
+    key = (path, os.path.getmtime(path), chunk_chars)
+    with _cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    with open(path, encoding='utf-8', errors='replace') as f:
+        index = _ChunkIndex(f.read(), chunk_chars)
+    with _cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def _human_size(n):
+    return f"{n / (1024 * 1024):.1f} MB" if n >= 1024 * 1024 else f"{max(1, n // 1024)} KB"
+
+
+def attach_text(chat_id, file_name, text, settings):
+    """
+    Message block for a text file sent with a chat message: the inline code block
+    for small files, otherwise the file is stored as a chat artifact and only a
+    marker is returned.
+    """
+    cfg = _settings(settings)
+    if len(text) <= cfg['inline_max_chars']:
+        return f"[Datei: {file_name}]\n```\n{text}\n```"
+
+    safe = re.sub(r'[^\w.\-]', '_', os.path.basename(file_name)) or 'datei.txt'
+    stored_name = f"attachment_{uuid.uuid4().hex[:8]}_{safe}"
+    data = text.encode('utf-8')
+    file_store.save_file(chat_id, stored_name, data)
+    lines = text.count('\n') + 1
+    return f"[Datei: {file_name} — {_human_size(len(data))}, {lines} Zeilen]\n[ATTACHMENT]({stored_name})"
+
+
+def has_attachments(messages):
+    return any(ATTACHMENT_RE.search(m.get('content') or '') for m in messages)
+
+
+def expand_attachments(messages, chat_id, settings, emit_log=None):
+    """
+    Replace [ATTACHMENT](name) markers with the chunks most relevant to the latest
+    user message. Returns a new message list; messages without markers are untouched.
+    """
+    if not chat_id or not has_attachments(messages):
+        return messages
+
+    cfg = _settings(settings)
+    question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+    question = ATTACHMENT_RE.sub('', question)
+    names = [n for m in messages for n in ATTACHMENT_RE.findall(m.get('content') or '')]
+    per_file = max(1000, cfg['max_context_chars'] // len(names))
+
+    def render(match):
+        name = match.group(1)
+        path = file_store.get_file_path(chat_id, name)
+        if not path:
+            return f"[Anhang {name} nicht mehr vorhanden]"
+        try:
+            index = _load_index(path, cfg['chunk_chars'])
+        except OSError as e:
+            logger.warning(f"Attachment {name} of chat {chat_id} unreadable: {e}")
+            return f"[Anhang {name} nicht lesbar]"
+        chosen = index.select(question, per_file)
+        if emit_log:
+            emit_log({"type": "text", "message": (
+                f"Anhang {name}: {len(chosen)} von {len(index.chunks)} Abschnitten "
+                f"für die Frage ausgewählt"
+            )})
+        parts = [
+            f"Auszug ({len(chosen)} von {len(index.chunks)} Abschnitten, passend zur aktuellen Frage; "
+            f"die Datei hat {index.line_count} Zeilen):"
+        ]
+        for i in chosen:
+            first, last, text = index.chunks[i]
+            parts.append(f"--- Zeilen {first}-{last} ---\n```\n{text}\n```")
+        return '\n'.join(parts)
+
+    return [
+        {**m, 'content': ATTACHMENT_RE.sub(render, m['content'])} if ATTACHMENT_RE.search(m.get('content') or '') else m
+        for m in messages
+    ]
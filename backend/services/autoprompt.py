@@ -7,6 +7,10 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 from config import AUTOPROMPTS_FILE, get_settings, get_agent, DATA_DIR
 from models import create_chat, add_message, get_chat, update_chat_title
+from services.budget import RunBudget
+from services.summary import build_chat_context
+from services import jobs
+from services.jobs import job_manager
 
 log = logging.getLogger(__name__)
 
@@ -54,35 +58,61 @@ class AutopromptService:
     def __init__(self, socketio):
         self.socketio = socketio
         self.scheduler = BackgroundScheduler(timezone='UTC')
-        self.scheduler.start()
+        self._schedule_keys = {}  # job_id -> schedule fields it was planned with
+
+    def start(self):
+        """Run the scheduler on this node (the cluster leader)."""
+        if not self.scheduler.running:
+            self.scheduler.start()
+        else:
+            self.scheduler.resume()
         self._load_all()
+        # Autoprompts may be edited on any node — pick up schedule changes from the file
+        self.scheduler.add_job(self._load_all, 'interval', seconds=60, id='autoprompt_resync', replace_existing=True)
+
+    def stop(self):
+        """Leadership lost: keep the scheduler object, but run nothing."""
+        if self.scheduler.running:
+            self.scheduler.pause()
 
     def _load_all(self):
-        for ap in _load_file():
+        aps = _load_file()
+        for ap in aps:
             if ap.get('enabled'):
                 try:
                     self._schedule(ap)
                 except Exception as e:
                     log.warning(f"Autoprompt '{ap.get('name')}' konnte nicht geplant werden: {e}")
+            else:
+                self._unschedule(ap['id'])
+        known = {f"ap_{ap['id']}" for ap in aps}
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith('ap_') and job.id not in known:
+                self._unschedule(job.id[3:])
 
     def _schedule(self, ap):
         job_id = f"ap_{ap['id']}"
         st = ap.get('schedule_type', 'daily')
 
+        # Unchanged schedule: keep the job (re-adding would reset interval timers)
+        key = (st, ap.get('interval_minutes'), ap.get('daily_time'), ap.get('weekly_day'))
         if self.scheduler.get_job(job_id):
+            if self._schedule_keys.get(job_id) == key:
+                return
             self.scheduler.remove_job(job_id)
+        self._schedule_keys[job_id] = key
 
         if st == 'interval':
             minutes = int(ap.get('interval_minutes', 60))
             self.scheduler.add_job(
-                self._run, 'interval', minutes=minutes,
+                self._on_schedule, 'interval', minutes=minutes,
                 id=job_id, args=[ap['id']], replace_existing=True
             )
         elif st == 'daily':
             t = ap.get('daily_time', '08:00')
             h, m = (int(x) for x in t.split(':'))
             self.scheduler.add_job(
-                self._run, 'cron', hour=h, minute=m,
+                self._on_schedule, 'cron', hour=h, minute=m,
                 id=job_id, args=[ap['id']], replace_existing=True
             )
         elif st == 'weekly':
@@ -90,16 +120,38 @@ class AutopromptService:
             h, m = (int(x) for x in t.split(':'))
             wd = int(ap.get('weekly_day', 0))
             self.scheduler.add_job(
-                self._run, 'cron', day_of_week=wd, hour=h, minute=m,
+                self._on_schedule, 'cron', day_of_week=wd, hour=h, minute=m,
                 id=job_id, args=[ap['id']], replace_existing=True
             )
 
     def _unschedule(self, ap_id):
         job_id = f"ap_{ap_id}"
+        self._schedule_keys.pop(job_id, None)
         if self.scheduler.get_job(job_id):
             self.scheduler.remove_job(job_id)
 
-    def _run(self, ap_id):
+    def submit(self, ap_id):
+        """Queue a run on the central job manager (scheduler and 'run now'). Returns the Job."""
+        ap = get_autoprompt(ap_id)
+        if not ap:
+            return None
+        chat_id = ap.get('chat_id') if ap.get('save_to_chat') else None
+        try:
+            return job_manager.submit(
+                lambda job: self._run(ap_id, job),
+                source=jobs.SOURCE_AUTOPROMPT, chat_id=chat_id, label=f"Autoprompt: {ap['name']}",
+            )
+        except jobs.JobQueueFull as e:
+            log.warning(f"Autoprompt '{ap['name']}' übersprungen: {e}")
+            raise
+
+    def _on_schedule(self, ap_id):
+        try:
+            self.submit(ap_id)
+        except jobs.JobQueueFull:
+            pass  # already logged; the next scheduled run tries again
+
+    def _run(self, ap_id, job=None):
         from services.agent import run_agent
 
         ap = get_autoprompt(ap_id)
@@ -112,6 +164,15 @@ class AutopromptService:
         settings = get_settings()
         save_to_chat = ap.get('save_to_chat', False)
 
+        agent_system_prompt = None
+        agent_budget = None
+        if ap.get('agent_id'):
+            agent_cfg = get_agent(ap['agent_id'])
+            if agent_cfg:
+                agent_system_prompt = agent_cfg.get('system_prompt') or None
+                agent_budget = agent_cfg.get('budget')
+        budget = RunBudget.from_settings(settings, agent_budget, ap.get('budget'))
+
         # Build message history for agent
         if save_to_chat:
             chat_id = ap.get('chat_id')
@@ -119,24 +180,13 @@ class AutopromptService:
                 chat_id = create_chat(f"Autoprompt: {ap['name']}")
                 update_chat_title(chat_id, f"Autoprompt: {ap['name']}")
                 ap['chat_id'] = chat_id
-            chat = get_chat(chat_id)
-            messages = [
-                {'role': m['role'], 'content': m['content']}
-                for m in chat.get('messages', [])
-                if m['role'] in ('user', 'assistant')
-            ]
+            messages = build_chat_context(get_chat(chat_id), settings, budget=budget)
         else:
             chat_id = None
             messages = []
 
         messages.append({'role': 'user', 'content': ap['prompt']})
 
-        agent_system_prompt = None
-        if ap.get('agent_id'):
-            agent_cfg = get_agent(ap['agent_id'])
-            if agent_cfg:
-                agent_system_prompt = agent_cfg.get('system_prompt') or None
-
         # Collect run log for display in the UI
         run_log_lines = []
 
@@ -151,13 +201,16 @@ class AutopromptService:
                 run_log_lines.append(str(entry))
 
         try:
-            response = run_agent(messages, settings, emit_log=collect_log, system_prompt=agent_system_prompt, chat_id=chat_id)
+            response = run_agent(messages, settings, emit_log=job.track(collect_log) if job else collect_log,
+                                 system_prompt=agent_system_prompt, chat_id=chat_id,
+                                 stop_event=job.stop_event if job else None, budget=budget)
             if save_to_chat and chat_id:
                 add_message(chat_id, 'user', ap['prompt'])
                 add_message(chat_id, 'assistant', response)
             ap['last_run'] = now_iso
             ap['last_error'] = None
             ap['last_status'] = 'success'
+            ap['last_stop_reason'] = budget.stop_reason
             ap['last_log'] = '\n'.join(run_log_lines)[-8000:]
             log.info(f"Autoprompt '{ap['name']}' abgeschlossen.")
             self.socketio.emit('autoprompt_done', {
@@ -165,11 +218,13 @@ class AutopromptService:
                 'name': ap['name'],
                 'chat_id': chat_id,
                 'last_run': now_iso,
+                'stop_reason': budget.stop_reason,
             })
         except Exception as e:
             ap['last_error'] = str(e)
             ap['last_run'] = now_iso
             ap['last_status'] = 'error'
+            ap['last_stop_reason'] = budget.stop_reason or 'error'
             ap['last_log'] = '\n'.join(run_log_lines)[-8000:]
             log.error(f"Autoprompt '{ap['name']}' Fehler: {e}")
 
@@ -0,0 +1,143 @@
+"""
+Per-run budgets for run_agent: wall time, tokens, cost and tool calls.
+
+A RunBudget is built from the global defaults (settings['budget']) plus optional
+overrides from the agent, webhook or autoprompt config (each may carry a
+'budget' dict with the same keys). run_agent checks it between iterations and
+records why the run stopped in budget.stop_reason. Running out of tool calls
+doesn't stop the run: the next request is sent without tools instead.
+
+Cost is taken from the provider's usage.cost field if present (OpenRouter),
+otherwise computed from settings['price_table']:
+    {provider_id: {model: {"prompt": usd_per_1m_tokens, "completion": usd_per_1m_tokens}}}
+A model key of '*' acts as fallback for all models of that provider.
+"""
+import threading
+import time
+
+BUDGET_KEYS = (
+    'max_iterations', 'max_wall_seconds', 'max_prompt_tokens',
+    'max_completion_tokens', 'max_cost', 'max_tool_calls',
+)
+# Fractional limits; all others are counts
+_FLOAT_KEYS = ('max_wall_seconds', 'max_cost')
+
+# Stop reasons (stored e.g. as autoprompt last_stop_reason)
+STOP_COMPLETED = 'completed'
+STOP_CANCELLED = 'cancelled'
+STOP_ERROR = 'error'
+
+_STOP_MESSAGES = {
+    'max_iterations': 'Maximale Iterationen erreicht',
+    'max_wall_seconds': 'Zeitbudget erschöpft',
+    'max_prompt_tokens': 'Prompt-Token-Budget erschöpft',
+    'max_completion_tokens': 'Completion-Token-Budget erschöpft',
+    'max_cost': 'Kostenbudget erschöpft',
+    'max_tool_calls': 'Maximale Anzahl Tool-Aufrufe erreicht',
+}
+
+
+def clean_budget(data):
+    """Keep only known budget keys with positive numeric values (for agent/webhook/autoprompt configs)."""
+    result = {}
+    for key in BUDGET_KEYS:
+        value = (data or {}).get(key)
+        if value in (None, ''):
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            result[key] = value if key in _FLOAT_KEYS else int(value)
+    return result
+
+
+class RunBudget:
+    def __init__(self, limits=None, price_table=None):
+        self.limits = limits or {}
+        self.price_table = price_table or {}
+        self.started_at = time.monotonic()
+        self.iterations = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.tool_calls = 0
+        self.stop_reason = None
+        self._lock = threading.Lock()  # speculative completions are charged from their own thread
+
+    @classmethod
+    def from_settings(cls, settings, *overrides):
+        """Global defaults from settings['budget'], later overrides win."""
+        limits = {'max_iterations': 10}
+        limits.update(clean_budget(settings.get('budget')))
+        for override in overrides:
+            limits.update(clean_budget(override))
+        return cls(limits, settings.get('price_table') or {})
+
+    @property
+    def max_iterations(self):
+        return int(self.limits.get('max_iterations', 10))
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def record_usage(self, provider_id, model, usage):
+        if not usage:
+            return
+        prompt = usage.get('prompt_tokens') or 0
+        completion = usage.get('completion_tokens') or 0
+        if usage.get('cost') is not None:
+            cost = float(usage['cost'])
+        else:
+            prices = self.price_table.get(provider_id, {})
+            price = prices.get(model) or prices.get('*')
+            cost = (prompt * float(price.get('prompt', 0))
+                    + completion * float(price.get('completion', 0))) / 1_000_000 if price else 0.0
+        with self._lock:
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.cost += cost
+
+    def record_tool_call(self):
+        self.tool_calls += 1
+
+    def tools_exhausted(self):
+        """True once max_tool_calls is used up: the next request goes out without tools."""
+        limit = self.limits.get('max_tool_calls')
+        return bool(limit) and self.tool_calls >= limit
+
+    def check(self):
+        """
+        Return the name of the first exhausted limit (and remember it), or None.
+        max_tool_calls doesn't end the run here: run_agent then asks once more
+        without tools so the model can answer with what it has.
+        """
+        usage = {
+            'max_iterations': self.iterations,
+            'max_wall_seconds': self.elapsed(),
+            'max_prompt_tokens': self.prompt_tokens,
+            'max_completion_tokens': self.completion_tokens,
+            'max_cost': self.cost,
+        }
+        for key, used in usage.items():
+            limit = self.limits.get(key)
+            if limit and used >= limit:
+                self.stop_reason = key
+                return key
+        return None
+
+    def stop_message(self):
+        return _STOP_MESSAGES.get(self.stop_reason, self.stop_reason or '')
+
+    def summary(self):
+        return {
+            'stop_reason': self.stop_reason,
+            'iterations': self.iterations,
+            'elapsed_seconds': round(self.elapsed(), 2),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost': round(self.cost, 6),
+            'tool_calls': self.tool_calls,
+            'limits': self.limits,
+        }
@@ -0,0 +1,265 @@
+"""
+Scale-out support: shared state and leader election for multiple Guenther processes.
+
+Selected with the CLUSTER_BACKEND environment variable (see config.py):
+
+  ''       single process (default) — in-memory state, this process is always leader
+  'file'   several processes on one host sharing DATA_DIR — flock-based leader
+           election, state as files under DATA_DIR/cluster
+  'redis'  several hosts — leader key with TTL, state and cancel pub/sub in Redis
+           (REDIS_URL; requires the 'redis' package)
+
+Cross-process Socket.IO emits are configured separately via MESSAGE_QUEUE
+(passed to SocketIO(message_queue=...), e.g. the same redis:// URL).
+
+The leader runs the process-wide singletons: Telegram long polling and the
+autoprompt scheduler. Every other node serves HTTP / WebSocket traffic and runs
+its own job workers. Job cancellation is broadcast, so a cancel request can be
+handled by any node; the node running the job stops it.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from config import CLUSTER_BACKEND, REDIS_URL, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+NODE_ID = f"{socket.gethostname()}-{os.getpid()}"
+LEADER_TTL = 15  # seconds; the leader renews every TTL/3
+
+_KEY_PREFIX = 'guenther:'
+
+
+class _MemoryBackend:
+    """Single process: plain dicts, always leader, nothing to broadcast."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kv = {}  # key -> (expires_at, value)
+
+    def acquire_leadership(self, node_id, ttl):
+        return True
+
+    def current_leader(self):
+        return NODE_ID
+
+    def kv_set(self, key, value, ttl):
+        with self._lock:
+            self._kv[key] = (time.time() + ttl, value)
+
+    def kv_get(self, key):
+        with self._lock:
+            entry = self._kv.get(key)
+            if entry and entry[0] > time.time():
+                return entry[1]
+            self._kv.pop(key, None)
+            return None
+
+    def kv_delete(self, key):
+        with self._lock:
+            self._kv.pop(key, None)
+
+    def publish_cancel(self, job_id):
+        pass
+
+    def listen_cancels(self, callback):
+        pass
+
+
+class _FileBackend:
+    """Processes on one host sharing DATA_DIR: flock leader lock, state as JSON files."""
+
+    def __init__(self):
+        self._dir = os.path.join(DATA_DIR, 'cluster')
+        for sub in ('kv', 'cancel'):
+            os.makedirs(os.path.join(self._dir, sub), exist_ok=True)
+        self._lock_fd = None
+
+    def acquire_leadership(self, node_id, ttl):
+        import fcntl
+        if self._lock_fd is not None:
+            return True  # lock is held for the lifetime of the process
+        fd = os.open(os.path.join(self._dir, 'leader.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, node_id.encode())
+        self._lock_fd = fd
+        return True
+
+    def current_leader(self):
+        try:
+            with open(os.path.join(self._dir, 'leader.lock')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _kv_path(self, key):
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in key)
+        return os.path.join(self._dir, 'kv', safe + '.json')
+
+    def kv_set(self, key, value, ttl):
+        path = self._kv_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'expires_at': time.time() + ttl, 'value': value}, f)
+        os.replace(tmp, path)
+
+    def kv_get(self, key):
+        try:
+            with open(self._kv_path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) < time.time():
+            self.kv_delete(key)
+            return None
+        return entry.get('value')
+
+    def kv_delete(self, key):
+        try:
+            os.remove(self._kv_path(key))
+        except OSError:
+            pass
+
+    def publish_cancel(self, job_id):
+        open(os.path.join(self._dir, 'cancel', job_id), 'w').close()
+
+    def listen_cancels(self, callback):
+        cancel_dir = os.path.join(self._dir, 'cancel')
+
+        def poll():
+            seen = set()
+            while True:
+                time.sleep(1)
+                now = time.time()
+                for name in os.listdir(cancel_dir):
+                    path = os.path.join(cancel_dir, name)
+                    try:
+                        if now - os.path.getmtime(path) > 60:
+                            os.remove(path)  # every node had time to see it
+                            seen.discard(name)
+                            continue
+                    except OSError:
+                        continue
+                    if name not in seen:
+                        seen.add(name)
+                        callback(name)
+
+        threading.Thread(target=poll, daemon=True, name='cluster-cancel-poll').start()
+
+
+class _RedisBackend:
+    """Multiple hosts: leader key with TTL, state and cancel broadcast via Redis."""
+
+    _RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) and 1 or 0
+    """
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CLUSTER_BACKEND=redis benötigt das Paket 'redis' (pip install redis)")
+        self._redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self._renew = self._redis.register_script(self._RENEW_SCRIPT)
+
+    def acquire_leadership(self, node_id, ttl):
+        return bool(self._renew(keys=[_KEY_PREFIX + 'leader'], args=[node_id, int(ttl * 1000)]))
+
+    def current_leader(self):
+        return self._redis.get(_KEY_PREFIX + 'leader')
+
+    def kv_set(self, key, value, ttl):
+        self._redis.set(_KEY_PREFIX + key, json.dumps(value), ex=int(ttl))
+
+    def kv_get(self, key):
+        raw = self._redis.get(_KEY_PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def kv_delete(self, key):
+        self._redis.delete(_KEY_PREFIX + key)
+
+    def publish_cancel(self, job_id):
+        self._redis.publish(_KEY_PREFIX + 'cancel', job_id)
+
+    def listen_cancels(self, callback):
+        def listen():
+            while True:
+                try:
+                    pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(_KEY_PREFIX + 'cancel')
+                    for message in pubsub.listen():
+                        callback(message['data'])
+                except Exception as e:
+                    logger.warning(f"Cluster cancel listener: {e} — reconnecting")
+                    time.sleep(2)
+
+        threading.Thread(target=listen, daemon=True, name='cluster-cancel-sub').start()
+
+
+_BACKENDS = {'': _MemoryBackend, 'memory': _MemoryBackend, 'file': _FileBackend, 'redis': _RedisBackend}
+
+if CLUSTER_BACKEND not in _BACKENDS:
+    raise RuntimeError(f"Unbekanntes CLUSTER_BACKEND '{CLUSTER_BACKEND}' (file | redis)")
+backend = _BACKENDS[CLUSTER_BACKEND]()
+
+_is_leader = False
+
+
+def is_leader():
+    return _is_leader
+
+
+def status():
+    return {
+        'backend': CLUSTER_BACKEND or 'memory',
+        'node_id': NODE_ID,
+        'leader': _is_leader,
+        'current_leader': backend.current_leader(),
+    }
+
+
+def start(on_elected, on_demoted, on_cancel):
+    """
+    Begin leader election and listen for broadcast cancels.
+    on_elected / on_demoted start and stop the singletons on this node;
+    on_cancel(job_id) is called for cancel requests from any node.
+    """
+    global _is_leader
+    backend.listen_cancels(on_cancel)
+
+    if isinstance(backend, _MemoryBackend):
+        _is_leader = True
+        on_elected()
+        return
+
+    def loop():
+        global _is_leader
+        while True:
+            try:
+                leader = backend.acquire_leadership(NODE_ID, LEADER_TTL)
+            except Exception as e:
+                logger.warning(f"Leader election failed: {e}")
+                leader = False
+            if leader and not _is_leader:
+                _is_leader = True
+                logger.info(f"Node {NODE_ID} is now leader")
+                on_elected()
+            elif not leader and _is_leader:
+                _is_leader = False
+                logger.warning(f"Node {NODE_ID} lost leadership")
+                on_demoted()
+            time.sleep(LEADER_TTL / 3)
+
+    threading.Thread(target=loop, daemon=True, name='cluster-leader').start()
@@ -1,9 +1,15 @@
 import os
 import re
+import uuid
 import base64
 import shutil
+import mimetypes
+from urllib.parse import quote
 
-from config import FILES_DIR
+from flask import Response, send_file
+
+from config import DATA_DIR, FILES_DIR, X_ACCEL_REDIRECT
+from services import tracing
 
 
 def _chat_dir(chat_id):
@@ -18,6 +24,7 @@ def save_file(chat_id, filename, data: bytes):
 
 
 def get_file(chat_id, filename) -> bytes | None:
+    """Whole file in memory — for small files only; use get_file_path + send_stored for downloads."""
     path = os.path.join(_chat_dir(chat_id), filename)
     try:
         with open(path, 'rb') as f:
@@ -26,6 +33,54 @@ def get_file(chat_id, filename) -> bytes | None:
         return None
 
 
+# mimetypes has no extension for some common audio types
+_EXTRA_EXT = {'audio/wav': '.wav', 'audio/ogg': '.ogg', 'audio/opus': '.opus', 'audio/flac': '.flac'}
+
+
+def store_media(chat_id, data: bytes, mime_type, prefix='media') -> str:
+    """Write tool-generated media (image, audio, ...) for a chat; returns the stored filename."""
+    ext = _EXTRA_EXT.get(mime_type) or mimetypes.guess_extension(mime_type or '') or '.bin'
+    filename = f"{prefix}_{uuid.uuid4().hex[:12]}{ext}"
+    save_file(chat_id, filename, data)
+    return filename
+
+
+def get_file_path(chat_id, filename) -> str | None:
+    """Absolute path of a stored chat file, or None if missing / not a plain filename."""
+    if not filename or os.path.basename(filename) != filename:
+        return None
+    path = os.path.join(_chat_dir(chat_id), filename)
+    return path if os.path.isfile(path) else None
+
+
+def send_stored(path, download_name, as_attachment=True, mimetype=None):
+    """
+    Download response for a file under DATA_DIR without reading it into memory.
+    Streams in chunks with ETag / Last-Modified and HTTP Range (206) support, or —
+    with X_ACCEL_REDIRECT set — hands the transfer to nginx (sendfile).
+    """
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    if X_ACCEL_REDIRECT:
+        rel = os.path.relpath(os.path.realpath(path), os.path.realpath(DATA_DIR)).replace(os.sep, '/')
+        ascii_name = download_name.encode('ascii', 'ignore').decode().replace('"', '') or 'download'
+        disposition = 'attachment' if as_attachment else 'inline'
+        return Response(mimetype=mimetype, headers={
+            'Content-Disposition': f'{disposition}; filename="{ascii_name}"; '
+                                   f"filename*=UTF-8''{quote(download_name)}",
+            'X-Accel-Redirect': X_ACCEL_REDIRECT.rstrip('/') + '/' + quote(rel),
+        })
+    return send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                     download_name=download_name, conditional=True, max_age=0)
+
+
+def delete_files(chat_id, filenames):
+    """Remove single files of a chat (missing ones are ignored)."""
+    for filename in filenames:
+        path = get_file_path(chat_id, filename)
+        if path:
+            os.remove(path)
+
+
 def delete_chat_files(chat_id):
     d = _chat_dir(chat_id)
     if os.path.exists(d):
@@ -39,6 +94,7 @@ def list_chat_files(chat_id):
     return sorted(os.listdir(d))
 
 
+@tracing.traced('file_store.extract_and_store')
 def extract_and_store(response: str, chat_id: int) -> str:
     """
     Processes special file markers in the LLM response and stores files on disk.
@@ -47,6 +103,9 @@ def extract_and_store(response: str, chat_id: int) -> str:
       [PPTX_DOWNLOAD](filename::base64)  — base64-encoded file (legacy)
       [LOCAL_FILE](/abs/path/to/file)    — file already on disk (e.g. from a tool)
     Both are replaced with [STORED_FILE](filename) for the frontend.
+
+    Media returned by tools is written by the agent loop via store_media() and
+    arrives here already as [STORED_IMAGE](filename) / [STORED_AUDIO](filename).
     """
     # ── [PPTX_DOWNLOAD](filename::base64) ──────────────────────────────────────
     def replace_pptx(m):
@@ -69,8 +128,9 @@ def extract_and_store(response: str, chat_id: int) -> str:
         src_path = m.group(1)
         filename = os.path.basename(src_path)
         try:
-            with open(src_path, 'rb') as f:
-                save_file(chat_id, filename, f.read())
+            d = _chat_dir(chat_id)
+            os.makedirs(d, exist_ok=True)
+            shutil.copyfile(src_path, os.path.join(d, filename))
             return f'[STORED_FILE]({filename})'
         except Exception:
             return m.group(0)
@@ -82,3 +142,27 @@ def extract_and_store(response: str, chat_id: int) -> str:
     )
 
     return response
+
+
+_STORED_MARKER = re.compile(r'\[STORED_(IMAGE|AUDIO|FILE)\]\(([^)]+)\)')
+
+
+def file_url(chat_id, filename):
+    return f"/api/chats/{chat_id}/files/{quote(filename)}"
+
+
+def resolve_markers(text: str, chat_id) -> tuple[str, list]:
+    """
+    Replace chat-relative [STORED_IMAGE|AUDIO|FILE](filename) markers with
+    Markdown links to GET /api/chats/<id>/files/<name> — for consumers outside
+    the chat UI (webhooks). Returns (text, [{'type', 'filename', 'url'}]).
+    """
+    files = []
+
+    def replace(m):
+        kind, filename = m.group(1).lower(), m.group(2)
+        url = file_url(chat_id, filename)
+        files.append({'type': kind, 'filename': filename, 'url': url})
+        return f'![{filename}]({url})' if kind == 'image' else f'[{filename}]({url})'
+
+    return _STORED_MARKER.sub(replace, text or ''), files
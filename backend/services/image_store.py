@@ -1,23 +1,21 @@
 """
-Temporary in-memory storage for images shared between gateway and tools.
+Temporary storage for images shared between gateway and tools.
 Images are stored by session key (e.g. "tg_username") and cleaned up after use.
+Backed by the cluster state backend, so a tool running on another node can
+read an image received by the Telegram leader (in memory for a single process).
 """
-import threading
+from services.cluster import backend
 
-_lock = threading.Lock()
-_images = {}  # key -> {"b64": str, "mime": str}
+_TTL = 3600  # safety net if remove() is never called
 
 
 def store(key, b64, mime):
-    with _lock:
-        _images[key] = {"b64": b64, "mime": mime}
+    backend.kv_set(f"image:{key}", {"b64": b64, "mime": mime}, _TTL)
 
 
 def get(key):
-    with _lock:
-        return _images.get(key)
+    return backend.kv_get(f"image:{key}")
 
 
 def remove(key):
-    with _lock:
-        _images.pop(key, None)
+    backend.kv_delete(f"image:{key}")
@@ -0,0 +1,352 @@
+"""
+Central job manager for agent runs.
+
+All entry points (web chat, Telegram, webhooks, autoprompts) submit their
+agent runs here instead of running them inline or in an unbounded thread:
+
+  - bounded worker pool (settings['jobs']['max_workers'])
+  - bounded queue (settings['jobs']['max_queue']) — submit raises JobQueueFull
+  - priorities per source (lower runs first), FIFO within the same priority
+  - per-chat serialization: two jobs for the same chat never run concurrently
+  - admission control per source: 'max_running' caps concurrent runs and
+    'max_queued' caps waiting jobs of one source, so a webhook burst can neither
+    occupy every worker nor fill the queue for interactive users. Rejections
+    raise JobQueueFull with a retry_after estimate (HTTP 429 + Retry-After,
+    Telegram "busy" reply)
+  - status/progress queries and cancellation via Job handles (/api/jobs),
+    utilization per source via stats()
+
+A job function receives its Job as the only argument; it should pass
+job.stop_event to run_agent and may wrap its emit_log with job.track() so
+the last log header shows up as progress.
+
+Every job runs as the root span of a trace ('<source>.turn', services/tracing.py)
+with its time in the queue as a 'job.queue' child span; job.trace_id links the
+job to the waterfall.
+"""
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import get_settings
+from services import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+SOURCE_WEB = 'web'
+SOURCE_TELEGRAM = 'telegram'
+SOURCE_WEBHOOK = 'webhook'
+SOURCE_AUTOPROMPT = 'autoprompt'
+
+# Lower value = higher priority; interactive sources first
+DEFAULT_PRIORITIES = {
+    SOURCE_WEB: 0,
+    SOURCE_TELEGRAM: 1,
+    SOURCE_WEBHOOK: 2,
+    SOURCE_AUTOPROMPT: 3,
+}
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+_HISTORY_SIZE = 200
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() / admit() when the global or per-source queue limit is reached."""
+
+    def __init__(self, message, source=None, retry_after=30):
+        super().__init__(message)
+        self.source = source
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, fn, source, chat_id, priority, label, owner):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.source = source
+        self.chat_id = chat_id
+        self.priority = priority
+        self.label = label
+        self.owner = owner  # e.g. Socket.IO sid of the submitting client
+        self.status = STATUS_QUEUED
+        self.progress = ''
+        self.log_entries = 0
+        self.error = None
+        self.result = None
+        self.trace_id = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stop_event = threading.Event()
+        self._done = threading.Event()
+
+    def track(self, emit_log):
+        """Wrap an emit_log callable so the job records its progress."""
+        def tracked(entry):
+            self.log_entries += 1
+            if isinstance(entry, dict) and entry.get('type') == 'header':
+                self.progress = entry.get('message', '')
+            emit_log(entry)
+        return tracked
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            'id': self.id,
+            'source': self.source,
+            'chat_id': self.chat_id,
+            'priority': self.priority,
+            'label': self.label,
+            'status': self.status,
+            'progress': self.progress,
+            'log_entries': self.log_entries,
+            'error': self.error,
+            'trace_id': self.trace_id,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_seconds': round((self.started_at or now) - self.created_at, 3),
+            'run_seconds': round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobManager:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []          # queued jobs, scanned in (priority, seq) order
+        self._seq = itertools.count()
+        self._running = {}        # job_id -> Job
+        self._running_chats = set()
+        self._jobs = OrderedDict()  # job_id -> Job (queued, running and recent history)
+        self._workers = []
+        self._max_workers = 0
+        self._max_queue = 0
+        self._max_running = {}
+        self._max_queued = {}
+        self._running_by_source = {}   # source -> running count
+        self._queued_by_source = {}    # source -> queued count
+        self._rejected_by_source = {}  # source -> rejections since start
+        self._run_seconds = {}         # source -> recent run durations (for Retry-After)
+
+    def _load_settings(self):
+        cfg = get_settings().get('jobs') or {}
+        self._max_workers = max(1, int(cfg.get('max_workers', 4)))
+        self._max_queue = max(1, int(cfg.get('max_queue', 50)))
+        self._priorities = {**DEFAULT_PRIORITIES, **(cfg.get('priorities') or {})}
+        self._max_running = {k: max(1, int(v)) for k, v in (cfg.get('max_running') or {}).items() if v}
+        self._max_queued = {k: max(1, int(v)) for k, v in (cfg.get('max_queued') or {}).items() if v}
+
+    def _ensure_workers(self):
+        if not self._max_workers:
+            self._load_settings()
+        while len(self._workers) < self._max_workers:
+            t = threading.Thread(
+                target=self._worker, daemon=True, name=f"job-worker-{len(self._workers)}"
+            )
+            self._workers.append(t)
+            t.start()
+
+    def _retry_after(self, source):
+        """Rough seconds until a slot frees up: queued work of the source / its run slots."""
+        durations = self._run_seconds.get(source) or [30.0]
+        avg = sum(durations) / len(durations)
+        slots = min(self._max_workers, self._max_running.get(source, self._max_workers))
+        waiting = self._queued_by_source.get(source, 0) + 1
+        return int(min(300, max(1, avg * waiting / slots)))
+
+    def _check_admission(self, source):
+        if len(self._queue) >= self._max_queue:
+            reason = f"Warteschlange voll ({self._max_queue} Aufträge)"
+        elif self._queued_by_source.get(source, 0) >= self._max_queued.get(source, self._max_queue):
+            reason = f"Warteschlange für '{source}' voll ({self._max_queued[source]} Aufträge)"
+        else:
+            return
+        self._rejected_by_source[source] = self._rejected_by_source.get(source, 0) + 1
+        raise JobQueueFull(reason, source=source, retry_after=self._retry_after(source))
+
+    def admit(self, source):
+        """Cheap pre-check before doing any work for a request (e.g. creating a chat). Raises JobQueueFull."""
+        with self._cond:
+            if not self._max_workers:
+                self._load_settings()
+            self._check_admission(source)
+
+    def submit(self, fn, source, chat_id=None, priority=None, label='', owner=None):
+        """Queue fn(job) and return the Job handle. Raises JobQueueFull."""
+        with self._cond:
+            self._ensure_workers()
+            self._check_admission(source)
+            if priority is None:
+                priority = int(self._priorities.get(source, 5))
+            job = Job(fn, source, chat_id, priority, label, owner)
+            self._queue.append((priority, next(self._seq), job))
+            self._queue.sort(key=lambda item: item[:2])
+            self._queued_by_source[source] = self._queued_by_source.get(source, 0) + 1
+            self._jobs[job.id] = job
+            self._trim_history()
+            self._cond.notify_all()
+        return job
+
+    def _dequeue(self, index):
+        job = self._queue.pop(index)[2]
+        self._queued_by_source[job.source] -= 1
+        return job
+
+    def _next_runnable(self):
+        """First queued job (by priority) whose chat isn't busy and whose source has a free slot."""
+        for i, (_, _, job) in enumerate(self._queue):
+            if job.chat_id is not None and job.chat_id in self._running_chats:
+                continue
+            limit = self._max_running.get(job.source)
+            if limit and self._running_by_source.get(job.source, 0) >= limit:
+                continue
+            return self._dequeue(i)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_runnable()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_runnable()
+                job.status = STATUS_RUNNING
+                job.started_at = time.time()
+                metrics.JOB_QUEUE_WAIT.observe(job.started_at - job.created_at, job.source)
+                self._running[job.id] = job
+                self._running_by_source[job.source] = self._running_by_source.get(job.source, 0) + 1
+                if job.chat_id is not None:
+                    self._running_chats.add(job.chat_id)
+            try:
+                with tracing.span(f'{job.source}.turn', root=True, chat_id=job.chat_id,
+                                  job_id=job.id, label=job.label) as turn:
+                    job.trace_id = turn.trace_id
+                    tracing.record('job.queue', job.created_at, job.started_at, source=job.source)
+                    job.result = job.fn(job)
+                job.status = STATUS_CANCELLED if job.stop_event.is_set() else STATUS_DONE
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.source}) failed: {e}", exc_info=True)
+                job.error = str(e)
+                job.status = STATUS_FAILED
+            finally:
+                job.finished_at = time.time()
+                metrics.JOB_RUN.observe(job.finished_at - job.started_at, job.source)
+                with self._cond:
+                    self._running.pop(job.id, None)
+                    self._running_by_source[job.source] -= 1
+                    self._running_chats.discard(job.chat_id)
+                    recent = self._run_seconds.setdefault(job.source, [])
+                    recent.append(job.finished_at - job.started_at)
+                    del recent[:-20]
+                    self._cond.notify_all()
+                job.fn = None  # drop closure references
+                job._done.set()
+
+    def _trim_history(self):
+        if len(self._jobs) <= _HISTORY_SIZE:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= _HISTORY_SIZE:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, chat_id=None, source=None, status=None):
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return [
+            j for j in reversed(jobs)
+            if (chat_id is None or j.chat_id == chat_id)
+            and (source is None or j.source == source)
+            and (status is None or j.status == status)
+        ]
+
+    def queue_position(self, job):
+        with self._cond:
+            for pos, (_, _, queued) in enumerate(self._queue):
+                if queued is job:
+                    return pos + 1
+        return 0
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately or signal a running one. Returns the Job or None."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.finished:
+                return job
+            for i, (_, _, queued) in enumerate(self._queue):
+                if queued is job:
+                    self._dequeue(i)
+                    job.status = STATUS_CANCELLED
+                    job.finished_at = time.time()
+                    job.fn = None
+                    job._done.set()
+                    return job
+        job.stop_event.set()
+        return job
+
+    def cancel_owner(self, owner):
+        """Cancel all unfinished jobs submitted by one client."""
+        cancelled = []
+        for job in self.list_jobs():
+            if job.owner == owner and not job.finished:
+                self.cancel(job.id)
+                cancelled.append(job)
+        return cancelled
+
+    def stats(self):
+        with self._cond:
+            if not self._max_workers:
+                self._load_settings()
+            sources = {}
+            for source in {*DEFAULT_PRIORITIES, *self._running_by_source, *self._queued_by_source}:
+                running = self._running_by_source.get(source, 0)
+                limit = self._max_running.get(source, self._max_workers)
+                durations = self._run_seconds.get(source) or []
+                sources[source] = {
+                    'running': running,
+                    'queued': self._queued_by_source.get(source, 0),
+                    'max_running': limit,
+                    'max_queued': self._max_queued.get(source, self._max_queue),
+                    'rejected': self._rejected_by_source.get(source, 0),
+                    'utilization': round(running / limit, 3),
+                    'avg_run_seconds': round(sum(durations) / len(durations), 3) if durations else None,
+                }
+            return {
+                'max_workers': self._max_workers,
+                'max_queue': self._max_queue,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'busy_chats': len(self._running_chats),
+                'utilization': round(len(self._running) / self._max_workers, 3),
+                'sources': sources,
+            }
+
+
+job_manager = JobManager()
+
+
+def _source_counts(field):
+    return lambda: {(source,): s[field] for source, s in job_manager.stats()['sources'].items()}
+
+
+metrics.Gauge('guenther_jobs_running', 'Agent runs currently running.', ('source',), _source_counts('running'))
+metrics.Gauge('guenther_jobs_queued', 'Agent runs waiting in the job queue.', ('source',), _source_counts('queued'))
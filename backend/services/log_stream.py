@@ -0,0 +1,244 @@
+"""
+Routing and batching of guenther_log terminal entries.
+
+Rooms — log entries used to be broadcast to every connected browser. Now they go to:
+  - chat:<id>       clients viewing that chat (subscribe_logs / unsubscribe_logs),
+                    the sender of a message is joined automatically
+  - <sid>           a single client (e.g. the one that triggered an MCP reload)
+  - logs:firehose   opt-in admin room that receives every entry
+
+Batching — emit_log only appends to an in-memory buffer per room set and never
+touches the socket, so the agent thread is never blocked by slow clients. A
+background task sends the buffered entries as one guenther_log_batch frame
+every settings['log_stream']['batch_interval_ms'] or as soon as 'batch_size'
+entries are pending.
+
+Backpressure per client — batches go to each connected member of the rooms
+separately, with a Socket.IO ack; the frontend acknowledges every batch. A client
+with 'max_unacked' batches still unacknowledged (slow connection, busy tab) is
+behind: further batches for it are skipped and counted until it catches up, then
+it gets one notice with the number of skipped entries. Acks lost for longer than
+'ack_timeout' seconds no longer count. Clients on other nodes (MESSAGE_QUEUE) get
+the batch through the room emit, without ack tracking.
+
+Burst limit — independent of clients: if a room's buffer collects more than half
+of 'max_pending' entries between two flushes (a tool logging large results in a
+loop), large JSON entries are replaced by a one-line summary; beyond
+'max_pending' everything except headers is dropped. The next batch reports what
+was skipped.
+"""
+import json
+import logging
+import threading
+import time
+
+from config import get_settings, MESSAGE_QUEUE
+
+logger = logging.getLogger(__name__)
+
+FIREHOSE_ROOM = 'logs:firehose'
+
+_DEFAULTS = {
+    'batch_interval_ms': 50,
+    'batch_size': 50,
+    'max_pending': 1000,
+    'max_json_bytes': 20000,
+    'max_unacked': 20,
+    'ack_timeout': 30,
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # keeps batches in order when flush() is also called directly
+_buffers = {}  # tuple(rooms) -> _LogBuffer
+_clients = {}  # sid -> _Client (ack tracking)
+_wakeup = threading.Event()
+_flusher_started = False
+_cfg = dict(_DEFAULTS)
+
+
+class _LogBuffer:
+    __slots__ = ('entries', 'dropped', 'summarized')
+
+    def __init__(self):
+        self.entries = []
+        self.dropped = 0
+        self.summarized = 0
+
+    def add(self, entry):
+        pending = len(self.entries)
+        if pending >= _cfg['max_pending'] and entry.get('type') != 'header':
+            self.dropped += 1
+            return
+        if pending >= _cfg['max_pending'] // 2 and entry.get('type') == 'json':
+            entry = self._summarize(entry)
+        self.entries.append(entry)
+
+    def _summarize(self, entry):
+        try:
+            size = len(json.dumps(entry.get('data'), ensure_ascii=False, default=str))
+        except (TypeError, ValueError):
+            size = 0
+        if size <= _cfg['max_json_bytes']:
+            return entry
+        self.summarized += 1
+        return {'type': 'text', 'message': f"[{entry.get('label') or 'json'}: {size // 1024} KB ausgelassen]"}
+
+    def drain(self):
+        entries = self.entries
+        if self.dropped or self.summarized:
+            entries.append({'type': 'text', 'message': (
+                f"[log] Zu viele Log-Einträge zwischen zwei Sendungen: {self.dropped} verworfen, "
+                f"{self.summarized} gekürzt"
+            )})
+        return entries
+
+
+class _Client:
+    __slots__ = ('unacked', 'skipped')
+
+    def __init__(self):
+        self.unacked = {}  # batch number -> send time
+        self.skipped = 0
+
+
+_batch_ids = iter(range(1, 1 << 62))
+
+
+def chat_room(chat_id):
+    return f'chat:{chat_id}'
+
+
+def normalize(entry):
+    """Accepts structured log entries (dict) or plain strings."""
+    return entry if isinstance(entry, dict) else {'type': 'text', 'message': str(entry)}
+
+
+def _load_settings():
+    cfg = dict(_DEFAULTS)
+    for key, value in (get_settings().get('log_stream') or {}).items():
+        if key in cfg:
+            try:
+                cfg[key] = max(1, int(value))
+            except (TypeError, ValueError):
+                pass
+    _cfg.update(cfg)
+
+
+def _ensure_flusher(socketio):
+    global _flusher_started
+    with _lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    socketio.start_background_task(_flush_loop, socketio)
+
+
+def _flush_loop(socketio):
+    while True:
+        _wakeup.wait(_cfg['batch_interval_ms'] / 1000)
+        _wakeup.clear()
+        flush(socketio)
+
+
+def flush(socketio):
+    """Send all pending entries now (also called before agent_response to keep ordering)."""
+    with _flush_lock:
+        with _lock:
+            pending = list(_buffers.items())
+            _buffers.clear()
+        for rooms, buf in pending:
+            entries = buf.drain()
+            if entries:
+                _deliver(socketio, rooms, entries)
+        _send_skip_notices(socketio)
+
+
+def _local_members(socketio, rooms):
+    """sids of this node's clients in any of the rooms (None if the manager can't tell)."""
+    try:
+        return {sid for sid, _ in socketio.server.manager.get_participants('/', list(rooms))}
+    except Exception:
+        return None
+
+
+def _deliver(socketio, rooms, entries):
+    members = _local_members(socketio, rooms)
+    if members is None:
+        socketio.emit('guenther_log_batch', {'entries': entries}, to=list(rooms))
+        return
+    for sid in members:
+        _send(socketio, sid, entries)
+    if MESSAGE_QUEUE:
+        # Clients connected to other nodes
+        socketio.emit('guenther_log_batch', {'entries': entries}, to=list(rooms), skip_sid=list(members) or None)
+
+
+def _send(socketio, sid, entries):
+    now = time.monotonic()
+    with _lock:
+        client = _clients.get(sid)
+        if client is None:
+            client = _clients[sid] = _Client()
+        for batch, sent in list(client.unacked.items()):
+            if now - sent > _cfg['ack_timeout']:
+                del client.unacked[batch]
+        if len(client.unacked) >= _cfg['max_unacked']:
+            client.skipped += len(entries)  # client is behind: don't queue more in its transport
+            return
+        skipped, client.skipped = client.skipped, 0
+        batch = next(_batch_ids)
+        client.unacked[batch] = now
+    if skipped:
+        entries = entries + [_skip_notice(skipped)]
+    socketio.emit('guenther_log_batch', {'entries': entries}, to=sid,
+                  callback=lambda *_, sid=sid, batch=batch: _acked(sid, batch))
+
+
+def _acked(sid, batch):
+    with _lock:
+        client = _clients.get(sid)
+        if client is not None:
+            client.unacked.pop(batch, None)
+
+
+def _skip_notice(skipped):
+    return {'type': 'text', 'message': f"[log] Verbindung zu langsam: {skipped} Einträge übersprungen"}
+
+
+def _send_skip_notices(socketio):
+    """Clients that caught up but got no new batch since skipping still learn what they missed."""
+    with _lock:
+        due = [sid for sid, c in _clients.items() if c.skipped and len(c.unacked) < _cfg['max_unacked']]
+    for sid in due:
+        _send(socketio, sid, [])
+
+
+def forget_client(sid):
+    """Drop the ack state of a disconnected client."""
+    with _lock:
+        _clients.pop(sid, None)
+
+
+def make_emit_log(socketio, chat_id=None, sid=None):
+    """Return an emit_log callable that buffers for the chat room / client plus the firehose room."""
+    rooms = [FIREHOSE_ROOM]
+    if chat_id:
+        rooms.append(chat_room(chat_id))
+    if sid:
+        rooms.append(sid)
+    key = tuple(rooms)
+    _load_settings()
+    _ensure_flusher(socketio)
+
+    def emit_log(entry):
+        entry = normalize(entry)
+        with _lock:
+            buf = _buffers.get(key)
+            if buf is None:
+                buf = _buffers[key] = _LogBuffer()
+            buf.add(entry)
+            full = len(buf.entries) >= _cfg['batch_size']
+        if full:
+            _wakeup.set()
+
+    return emit_log
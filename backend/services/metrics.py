@@ -0,0 +1,174 @@
+"""
+In-process metrics (histograms, counters, gauges) exposed as Prometheus text on
+/api/metrics.
+
+No client library: the hot path is one dict lookup, one bisect and a few integer
+increments under a per-metric lock. Label sets are bounded per metric
+(_MAX_SERIES); further values are folded into '_other', so tool or model names
+chosen by an LLM can't grow memory without limit.
+
+Instrumented:
+  - tool calls in run_agent: latency, errors, size of the result sent to the LLM
+  - call_openrouter: latency, errors and payload sizes per provider / model
+  - the tool router: latency per outcome
+  - the job manager: queue wait and run time per source, running / queued jobs
+
+Every process keeps its own values (several nodes: scrape each one).
+"""
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_MAX_SERIES = 500
+_OTHER = '_other'
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, values):
+        # caller holds _lock
+        if values in self._series or len(self._series) < _MAX_SERIES:
+            return values
+        return (_OTHER,) * len(self.label_names)
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            key = self._key(label_values)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._header() + [f'{self.name}{_labels(self.label_names, k)} {_number(v)}' for k, v in series]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(label_values)
+            s = self._series.get(key)
+            if s is None:
+                # per-bucket counts (+Inf last), sum
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *label_values)
+
+    def render(self):
+        with self._lock:
+            series = sorted((k, (list(counts), total)) for k, (counts, total) in self._series.items())
+        lines = self._header()
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read at scrape time: collect() returns {label value tuple: number}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def render(self):
+        try:
+            values = self.collect() if self.collect else {}
+        except Exception:
+            values = {}
+        return self._header() + [f'{self.name}{_labels(self.label_names, k)} {_number(v)}'
+                                 for k, v in sorted(values.items())]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+
+TOOL_DURATION = Histogram(
+    'guenther_tool_duration_seconds', 'Runtime of tool handlers (cache hits excluded).', ('tool',))
+TOOL_ERRORS = Counter(
+    'guenther_tool_errors_total', 'Tool calls that raised or returned an error.', ('tool',))
+TOOL_RESULT_BYTES = Histogram(
+    'guenther_tool_result_bytes', 'Size of the tool result sent back to the LLM.', ('tool',), SIZE_BUCKETS)
+
+LLM_DURATION = Histogram(
+    'guenther_llm_request_duration_seconds', 'Chat completion latency per provider and model.', ('provider', 'model'))
+LLM_ERRORS = Counter(
+    'guenther_llm_request_errors_total', 'Failed chat completion requests.', ('provider', 'model'))
+LLM_PAYLOAD_BYTES = Histogram(
+    'guenther_llm_payload_bytes', 'Chat completion request / response body size.', ('provider', 'direction'), SIZE_BUCKETS)
+
+ROUTER_DURATION = Histogram(
+    'guenther_router_duration_seconds', 'Tool router latency (outcome: selected, fallback, error).', ('outcome',))
+
+JOB_QUEUE_WAIT = Histogram(
+    'guenther_job_queue_wait_seconds', 'Time agent runs waited in the job queue.', ('source',))
+JOB_RUN = Histogram(
+    'guenther_job_run_seconds', 'Runtime of agent runs in the job manager.', ('source',))
@@ -1,8 +1,11 @@
 import base64
 import json
 import logging
+import time
 import requests
 
+from services import metrics, tracing
+
 logger = logging.getLogger(__name__)
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
@@ -21,6 +24,7 @@ Antworte auf Deutsch, es sei denn, der Benutzer schreibt in einer anderen Sprach
 Sei praezise und hilfreich."""
 
 
+@tracing.traced('llm.chat_completion')
 def call_openrouter(messages, tools=None, api_key='', model='openai/gpt-4o-mini', temperature=0.5, base_url=None, timeout=120, provider_name='OpenRouter', provider_id=''):
     if base_url is None:
         url = OPENROUTER_API_URL
@@ -47,15 +51,27 @@ def call_openrouter(messages, tools=None, api_key='', model='openai/gpt-4o-mini'
         payload["tool_choice"] = "auto"
 
     bytes_sent = len(json.dumps(payload).encode('utf-8'))
+    provider_label = provider_id or 'unknown'
+    metrics.LLM_PAYLOAD_BYTES.observe(bytes_sent, provider_label, 'sent')
+    tracing.annotate(provider=provider_label, model=model, tools=len(tools or []), bytes_sent=bytes_sent)
 
-    response = requests.post(
-        url,
-        headers=headers,
-        json=payload,
-        timeout=timeout
-    )
+    started = time.perf_counter()
+    try:
+        response = requests.post(
+            url,
+            headers=headers,
+            json=payload,
+            timeout=timeout
+        )
+    except requests.RequestException:
+        metrics.LLM_ERRORS.inc(provider_label, model)
+        raise
+    finally:
+        metrics.LLM_DURATION.observe(time.perf_counter() - started, provider_label, model)
 
+    tracing.annotate(http_status=response.status_code)
     if not response.ok:
+        metrics.LLM_ERRORS.inc(provider_label, model)
         try:
             error_body = response.json()
             error_detail = error_body.get('error', {})
@@ -78,8 +94,11 @@ def call_openrouter(messages, tools=None, api_key='', model='openai/gpt-4o-mini'
         raise requests.HTTPError(full_msg, response=response)
 
     bytes_received = len(response.content)
+    metrics.LLM_PAYLOAD_BYTES.observe(bytes_received, provider_label, 'received')
     data = response.json()
     usage = data.get('usage', {})
+    tracing.annotate(bytes_received=bytes_received, prompt_tokens=usage.get('prompt_tokens'),
+                     completion_tokens=usage.get('completion_tokens'))
     try:
         from models import log_usage
         from services.tool_context import get_current_chat_id
@@ -0,0 +1,386 @@
+"""
+Process sandbox for CPU-heavy tool handlers.
+
+Tools whose TOOL_DEFINITION declares "execution": "process" do not run in the web
+process. The loader registers a SandboxHandler instead of the tool function; a
+call is sent to a pool of warm worker processes and the calling agent thread only
+waits on a pipe, so the GIL stays free for every other conversation:
+
+  - workers are fresh interpreters (python -m services.sandbox — no Flask app, no
+    MCP clients), started at startup; each imports the sandboxed tool modules once
+    (matplotlib, python-pptx, ...) and then serves calls over a socketpair
+  - limits per call: wall time (the worker is killed and replaced), CPU seconds
+    (RLIMIT_CPU) and address space (RLIMIT_AS) — a runaway tool takes down its
+    worker, not the server
+  - emit_log entries of the tool are forwarded to the caller's terminal log
+  - bytes values above 256 KB in the result (e.g. a generated .pptx) are passed
+    through a temp file (/dev/shm if available) instead of being pickled through
+    the pipe
+
+Defaults: settings['sandbox']; per tool: TOOL_DEFINITION['limits'] with 'timeout',
+'cpu_seconds', 'memory_mb'. With sandbox.enabled = false the tools run in-process
+as before. The limits need the Unix 'resource' module; elsewhere only the wall
+time limit applies.
+"""
+import itertools
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from config import get_settings
+from services.tool_context import get_emit_log, get_current_chat_id, set_emit_log, set_current_chat_id
+
+logger = logging.getLogger(__name__)
+
+_FILE_THRESHOLD = 256 * 1024
+_FILE_KEY = '__sandbox_file__'
+_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+_POLL_SECONDS = 0.5
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _settings():
+    cfg = get_settings().get('sandbox') or {}
+    return {
+        'enabled': bool(cfg.get('enabled', True)),
+        'workers': max(1, int(cfg.get('workers', 2))),
+        'timeout': float(cfg.get('timeout', 120)),
+        'cpu_seconds': int(cfg.get('cpu_seconds', 120)),
+        'memory_mb': int(cfg.get('memory_mb', 2048)),
+    }
+
+
+def _limits(tool_limits):
+    cfg = _settings()
+    limits = {k: cfg[k] for k in ('timeout', 'cpu_seconds', 'memory_mb')}
+    limits.update({k: v for k, v in (tool_limits or {}).items() if k in limits and v})
+    return limits
+
+
+# ── Result transfer ───────────────────────────────────────────────────────────
+
+def _pack(obj):
+    """Replace large bytes values with temp file references (worker side)."""
+    if isinstance(obj, (bytes, bytearray)) and len(obj) > _FILE_THRESHOLD:
+        fd, path = tempfile.mkstemp(prefix='sandbox_', dir=_TMP_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(obj)
+        return {_FILE_KEY: path}
+    if isinstance(obj, dict):
+        return {k: _pack(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_pack(v) for v in obj]
+    return obj
+
+
+def _unpack(obj):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and _FILE_KEY in obj:
+            path = obj[_FILE_KEY]
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            finally:
+                os.remove(path)
+        return {k: _unpack(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v) for v in obj]
+    return obj
+
+
+# ── Worker process ────────────────────────────────────────────────────────────
+
+def _apply_limits(limits):
+    if resource is None:
+        return
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_used = int(used.ru_utime + used.ru_stime)
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = cpu_used + int(limits['cpu_seconds'])
+    if cpu_hard != resource.RLIM_INFINITY:
+        soft = min(soft, cpu_hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))
+    _, as_hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = int(limits['memory_mb']) * 1024 * 1024
+    if as_hard != resource.RLIM_INFINITY:
+        soft = min(soft, as_hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, as_hard))
+
+
+def _reset_memory_limit():
+    if resource is not None:
+        _, as_hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (as_hard, as_hard))
+
+
+def limited_command(cmd, cpu_seconds, memory_mb):
+    """
+    cmd wrapped in util-linux prlimit: CPU and memory limits for an external
+    program (e.g. ImageMagick). Unlike a preexec_fn this is safe in the threaded
+    web process. Without prlimit cmd is returned unchanged (timeout only).
+    """
+    prlimit = shutil.which('prlimit')
+    if not prlimit:
+        return list(cmd)
+    memory = int(memory_mb) * 1024 * 1024
+    return [prlimit, f'--cpu={int(cpu_seconds)}', f'--as={memory}', '--'] + list(cmd)
+
+
+def _load(modules, path, module_name):
+    # Re-import when the file changed (custom tools are hot-reloaded in the web process)
+    mtime = os.stat(path).st_mtime_ns
+    cached = modules.get(path)
+    if cached is None or cached[0] != mtime:
+        from mcp.loader import _load_module
+        modules[path] = (mtime, _load_module(path, module_name))
+    return modules[path][1]
+
+
+def _worker_main(conn, preload):
+    modules = {}
+    for path, module_name in preload:
+        try:
+            _load(modules, path, module_name)
+        except Exception as e:
+            logger.warning(f"[sandbox] preload of {module_name} failed: {e}")
+
+    while True:
+        try:
+            call_id, path, module_name, handler_name, kwargs, chat_id, limits = conn.recv()
+        except (EOFError, OSError):
+            return
+        set_emit_log(lambda entry, cid=call_id: conn.send(('log', cid, entry)))
+        set_current_chat_id(chat_id)
+        try:
+            handler = getattr(_load(modules, path, module_name), handler_name)
+            _apply_limits(limits)
+            try:
+                result = handler(**kwargs)
+            finally:
+                _reset_memory_limit()
+            conn.send(('result', call_id, _pack(result)))
+        except MemoryError:
+            _reset_memory_limit()
+            # 'fatal': heap state unknown — the pool must not hand this worker out again
+            conn.send(('fatal', call_id, f"Speicherlimit ({limits['memory_mb']} MB) überschritten"))
+            return
+        except Exception as e:
+            conn.send(('error', call_id, f"{type(e).__name__}: {e}"))
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+
+class _Worker:
+    # A plain subprocess rather than multiprocessing: spawn/forkserver children
+    # would re-import the web app's __main__ (app.py) in every worker.
+    def __init__(self, preload):
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, '-m', 'services.sandbox', str(child_sock.fileno()), json.dumps(preload)],
+                cwd=_BACKEND_DIR, pass_fds=(child_sock.fileno(),), stdin=subprocess.DEVNULL,
+            )
+        except Exception:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    @property
+    def exitcode(self):
+        return self.proc.poll()
+
+    def kill(self):
+        try:
+            self.proc.terminate()
+            try:
+                self.proc.wait(2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait(2)
+        finally:
+            self.conn.close()
+
+
+class SandboxPool:
+    def __init__(self):
+        self._preload = []          # (tool.py path, module name) imported by every worker
+        self._idle = []
+        self._size = 0              # idle + busy + starting workers
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+
+    def add_tool(self, path, module_name):
+        if (path, module_name) not in self._preload:
+            self._preload.append((path, module_name))
+
+    def _new_worker(self):
+        return _Worker(list(self._preload))
+
+    def start(self):
+        """Start the warm workers in the background (no-op without sandboxed tools)."""
+        if not self._preload or not _settings()['enabled']:
+            return
+
+        def warm():
+            while True:
+                with self._cond:
+                    if self._size >= _settings()['workers']:
+                        return
+                    self._size += 1
+                try:
+                    worker = self._new_worker()
+                except Exception as e:
+                    logger.warning(f"[sandbox] worker start failed: {e}")
+                    with self._cond:
+                        self._size -= 1
+                    return
+                with self._cond:
+                    self._idle.append(worker)
+                    self._cond.notify()
+        threading.Thread(target=warm, daemon=True, name='sandbox-warm').start()
+
+    def _acquire(self, deadline):
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive:
+                        return worker
+                    self._size -= 1
+                    worker.kill()
+                if self._size < _settings()['workers']:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        try:
+            return self._new_worker()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker, reusable):
+        if reusable and worker.alive:
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+            return
+        worker.kill()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self.start()  # keep the pool warm
+
+    def call(self, path, module_name, handler_name, kwargs, tool_limits=None, tool_name=''):
+        limits = _limits(tool_limits)
+        emit_log = get_emit_log()
+        deadline = time.monotonic() + limits['timeout']
+        worker = self._acquire(deadline)
+        if worker is None:
+            return {"error": f"Sandbox ausgelastet: kein freier Worker für {tool_name} innerhalb von {limits['timeout']:.0f}s"}
+
+        call_id = next(self._ids)
+        reusable = False
+        try:
+            worker.conn.send((call_id, path, module_name, handler_name, kwargs, get_current_chat_id(), limits))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {"error": f"{tool_name}: Zeitlimit ({limits['timeout']:.0f}s) überschritten, abgebrochen"}
+                if not worker.conn.poll(min(remaining, _POLL_SECONDS)):
+                    if not worker.alive:
+                        return {"error": self._crash_message(worker, tool_name, limits)}
+                    continue
+                try:
+                    kind, cid, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    try:
+                        worker.proc.wait(1)
+                    except subprocess.TimeoutExpired:
+                        pass
+                    return {"error": self._crash_message(worker, tool_name, limits)}
+                if cid != call_id:
+                    continue
+                if kind == 'log':
+                    if emit_log:
+                        emit_log(payload)
+                    continue
+                if kind == 'fatal':
+                    return {"error": f"{tool_name}: {payload}"}  # worker exits, _release replaces it
+                reusable = True
+                if kind == 'error':
+                    return {"error": f"{tool_name}: {payload}"}
+                return _unpack(payload)
+        finally:
+            self._release(worker, reusable)
+
+    @staticmethod
+    def _crash_message(worker, tool_name, limits):
+        code = worker.exitcode
+        if code == -getattr(signal, 'SIGXCPU', 24):
+            return f"{tool_name}: CPU-Limit ({limits['cpu_seconds']}s) überschritten, abgebrochen"
+        if code in (-signal.SIGKILL, -signal.SIGSEGV):
+            return f"{tool_name}: Worker-Prozess abgestürzt (Signal {-code}, evtl. Speicherlimit {limits['memory_mb']} MB)"
+        return f"{tool_name}: Worker-Prozess unerwartet beendet (Exit-Code {code})"
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for worker in idle:
+            worker.kill()
+
+
+pool = SandboxPool()
+
+
+class SandboxHandler:
+    """Registered as MCPTool.handler for tools with "execution": "process"."""
+
+    def __init__(self, tool_py_path, module_name, handler_name, tool_name, limits=None):
+        self.tool_py_path = tool_py_path
+        self.module_name = module_name
+        self.handler_name = handler_name
+        self.tool_name = tool_name
+        self.limits = limits
+        self._module = None   # in-process fallback (sandbox disabled)
+        pool.add_tool(tool_py_path, module_name)
+
+    def __call__(self, **kwargs):
+        if not _settings()['enabled']:
+            if self._module is None:
+                from mcp.loader import _load_module
+                self._module = sys.modules.get(self.module_name) or _load_module(self.tool_py_path, self.module_name)
+            return getattr(self._module, self.handler_name)(**kwargs)
+        return pool.call(self.tool_py_path, self.module_name, self.handler_name, kwargs,
+                         tool_limits=self.limits, tool_name=self.tool_name)
+
+
+if __name__ == '__main__':
+    # Worker entry point: python -m services.sandbox <socket fd> <preload json>
+    logging.basicConfig(level=logging.WARNING)
+    _worker_main(Connection(int(sys.argv[1])), [tuple(p) for p in json.loads(sys.argv[2])])
@@ -0,0 +1,167 @@
+"""
+Static serving of the built frontend (frontend/dist).
+
+The dist directory is indexed once at startup instead of hitting the filesystem
+per request:
+
+  - every file gets an ETag (content hash) and a MIME type up front
+  - text assets (js, css, html, svg, json, ...) are compressed once — gzip always,
+    brotli if the optional 'brotli' package is installed; prebuilt .gz / .br files
+    next to an asset (e.g. from a build plugin) are used as-is
+  - small files and their compressed variants are kept in memory; large files are
+    streamed from disk with send_file
+  - Vite's fingerprinted bundles (assets/name-<hash>.js) are cached as immutable
+    for a year; everything else (index.html, favicon, ...) is revalidated via ETag
+  - unknown paths fall back to the in-memory index.html (SPA routing) without any
+    filesystem lookup; missing files under assets/ are a real 404 so a stale
+    bundle reference never receives HTML
+
+Rebuilding the frontend requires a backend restart to pick up the new files.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_COMPRESSIBLE_EXT = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.txt', '.map', '.xml', '.webmanifest', '.ico'}
+_HASHED_RE = re.compile(r'^assets/.+[-.][A-Za-z0-9_-]{8,}\.\w+$')
+_MIN_COMPRESS_BYTES = 512
+_MAX_MEMORY_BYTES = 2 * 1024 * 1024
+
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+
+class _Asset:
+    __slots__ = ('path', 'mimetype', 'etag', 'cache_control', 'body', 'variants')
+
+    def __init__(self, path, mimetype, etag, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+        self.body = None      # identity bytes if kept in memory
+        self.variants = {}    # 'br' / 'gzip' -> bytes
+
+
+def _accepted_encodings():
+    header = request.headers.get('Accept-Encoding', '')
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class StaticIndex:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}   # url path relative to root -> _Asset
+        self.index = None
+
+    def build(self):
+        self.assets.clear()
+        self.index = None
+        if not os.path.isdir(self.root):
+            logger.warning(f"Frontend build not found at {self.root} — static serving disabled")
+            return self
+
+        total_raw = total_stored = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            names = set(filenames)
+            for name in filenames:
+                if name.endswith(('.gz', '.br')) and name[:-3] in names:
+                    continue  # precompressed sibling, picked up with its original
+                full = os.path.join(dirpath, name)
+                rel = os.path.relpath(full, self.root).replace(os.sep, '/')
+                asset = self._load(full, rel)
+                self.assets[rel] = asset
+                total_raw += os.path.getsize(full)
+                total_stored += sum(len(v) for v in asset.variants.values())
+
+        self.index = self.assets.get('index.html')
+        logger.info(
+            f"Static index: {len(self.assets)} files from {self.root} "
+            f"({total_raw // 1024} KB, compressed variants {total_stored // 1024} KB, "
+            f"brotli {'on' if brotli else 'off'})"
+        )
+        return self
+
+    def _load(self, full, rel):
+        with open(full, 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(rel)[1].lower()
+        mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+        cache_control = CACHE_IMMUTABLE if _HASHED_RE.match(rel) else CACHE_REVALIDATE
+        asset = _Asset(full, mimetype, hashlib.sha1(data).hexdigest()[:20], cache_control)
+
+        if len(data) <= _MAX_MEMORY_BYTES:
+            asset.body = data
+        if ext in _COMPRESSIBLE_EXT and len(data) >= _MIN_COMPRESS_BYTES:
+            asset.variants = self._compress(full, data)
+        return asset
+
+    @staticmethod
+    def _compress(full, data):
+        variants = {}
+        for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+            if os.path.exists(full + suffix):
+                with open(full + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+        if 'br' not in variants and brotli is not None:
+            variants['br'] = brotli.compress(data, quality=11)
+        if 'gzip' not in variants:
+            variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+        # Keep only variants that actually save bytes
+        return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+    def lookup(self, path):
+        """Asset for a URL path, the SPA index for unknown routes, or None for a real 404."""
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset
+        if path.startswith('assets/'):
+            return None
+        return self.index
+
+    def respond(self, path):
+        asset = self.lookup(path)
+        if asset is None:
+            return Response('Not Found', status=404, mimetype='text/plain')
+
+        accepted = _accepted_encodings()
+        encoding = next((enc for enc in ('br', 'gzip') if enc in asset.variants and enc in accepted), None)
+        # Each representation needs its own strong ETag
+        etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': asset.cache_control,
+        }
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+            return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        if asset.body is not None:
+            return Response(asset.body, mimetype=asset.mimetype, headers=headers)
+
+        resp = send_file(asset.path, mimetype=asset.mimetype, etag=False, conditional=True)
+        resp.headers.update(headers)
+        return resp
@@ -0,0 +1,143 @@
+"""
+Rolling conversation summary for long chats.
+
+Each turn used to send the complete chat history to the LLM. Now the context is
+summary + every message newer than it (chats.summary / chats.summary_upto). Once
+that context grows beyond settings['chat_summary']['threshold_tokens'] (rough
+estimate: 4 chars per token), the unsummarized messages except the last
+'keep_recent' are folded into the summary — incrementally, only they are fed to
+the LLM together with the previous summary — so prompt size stays bounded for
+chats of any length.
+
+Hysteresis: the threshold is measured on the context actually sent, not on the
+whole history, and at least 'min_batch' messages must be pending. After a
+summarization the context drops to summary + recent window and has to grow back
+over the threshold before the next (blocking) summarization call, instead of
+one call per turn for the messages that just left the window.
+The summary arrives as a leading system message that run_agent merges into its
+system prompt; the summarization call is charged to the turn's RunBudget.
+"""
+import re
+import logging
+from datetime import datetime
+
+from services.openrouter import call_openrouter
+from models import update_chat_summary
+from services.attachments import expand_attachments
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Du fasst Gespräche zwischen einem Nutzer und dem Assistenten Guenther zusammen.
+Du bekommst die bisherige Zusammenfassung (falls vorhanden) und neue Nachrichten.
+Erstelle eine aktualisierte, kompakte Zusammenfassung: wichtige Fakten, Entscheidungen,
+offene Aufgaben, Namen, Zahlen und Ergebnisse von Tools. Keine Einleitung, nur die Zusammenfassung.
+Antworte in der Sprache des Gesprächs."""
+
+_DATA_URI_RE = re.compile(r'!\[[^\]]*\]\(data:[^)]{20,}\)')
+_MAX_CHARS_PER_MESSAGE = 4000
+
+
+def _ts():
+    return datetime.now().strftime("%H:%M:%S")
+
+
+def _summary_settings(settings):
+    cfg = settings.get('chat_summary') or {}
+    return {
+        'enabled': cfg.get('enabled', True),
+        'threshold_tokens': int(cfg.get('threshold_tokens', 12000)),
+        'keep_recent': max(2, int(cfg.get('keep_recent', 10))),
+        'min_batch': max(1, int(cfg.get('min_batch', 6))),
+        'model': cfg.get('model') or '',
+    }
+
+
+def estimate_tokens(messages):
+    return sum(len(m.get('content') or '') for m in messages) // 4
+
+
+def _resolve_llm(settings, model_override):
+    provider_id = settings.get('default_provider', 'openrouter')
+    provider_cfg = settings.get('providers', {}).get(provider_id, {})
+    api_key = provider_cfg.get('api_key', '') or settings.get('openrouter_api_key', '')
+    base_url = provider_cfg.get('base_url', 'https://openrouter.ai/api/v1')
+    model = model_override or settings.get('model', 'openai/gpt-4o-mini')
+    return provider_id, api_key, base_url, model
+
+
+def _summarize(previous_summary, new_messages, settings, model_override, budget=None):
+    provider_id, api_key, base_url, model = _resolve_llm(settings, model_override)
+    lines = []
+    for m in new_messages:
+        content = _DATA_URI_RE.sub('[Medien]', m['content'] or '')
+        if len(content) > _MAX_CHARS_PER_MESSAGE:
+            content = content[:_MAX_CHARS_PER_MESSAGE] + ' [...]'
+        lines.append(f"[{m['role']}] {content}")
+    user_content = (
+        f"Bisherige Zusammenfassung:\n{previous_summary or '(keine)'}\n\n"
+        f"Neue Nachrichten:\n" + "\n\n".join(lines)
+    )
+    response = call_openrouter(
+        [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": user_content}],
+        None, api_key, model, temperature=0.2, base_url=base_url,
+        timeout=int(settings.get('llm_timeout', 120)), provider_id=provider_id,
+    )
+    if budget is not None:
+        budget.record_usage(provider_id, model, response.get('usage', {}))
+    return (response.get('choices', [{}])[0].get('message', {}).get('content') or '').strip()
+
+
+def build_chat_context(chat, settings, emit_log=None, budget=None):
+    """
+    Turn a chat (as returned by models.get_chat) into the message list for run_agent.
+    Short chats are passed through unchanged; long chats become summary + recent window.
+    Stored text attachments are expanded to the chunks relevant to the latest question.
+    budget: the turn's RunBudget, charged with the summarization call.
+    """
+    messages = _build_history(chat, settings, emit_log, budget)
+    return expand_attachments(messages, chat.get('id'), settings, emit_log)
+
+
+def _with_summary(summary, messages):
+    context = [{'role': m['role'], 'content': m['content']} for m in messages]
+    if not summary:
+        return context
+    return [{
+        'role': 'system',
+        'content': f"Zusammenfassung des bisherigen Gesprächs (ältere Nachrichten):\n{summary}",
+    }] + context
+
+
+def _build_history(chat, settings, emit_log, budget):
+    history = [m for m in chat.get('messages', []) if m['role'] in ('user', 'assistant')]
+
+    cfg = _summary_settings(settings)
+    if not cfg['enabled'] or len(history) <= cfg['keep_recent']:
+        return _with_summary('', history)
+
+    summary = chat.get('summary') or ''
+    summary_upto = chat.get('summary_upto') or 0
+    unsummarized = [m for m in history if m['id'] > summary_upto]
+    context = _with_summary(summary, unsummarized)
+    pending = unsummarized[:-cfg['keep_recent']]
+
+    if estimate_tokens(context) <= cfg['threshold_tokens'] or len(pending) < cfg['min_batch']:
+        if summary and emit_log:
+            emit_log({"type": "text", "message": f"[{_ts()}] Kontext: Zusammenfassung + {len(unsummarized)} neuere Nachrichten (statt {len(history)})"})
+        return context
+
+    if emit_log:
+        emit_log({"type": "text", "message": f"[{_ts()}] Chat-Zusammenfassung: {len(pending)} neue Nachricht(en) werden verdichtet..."})
+    try:
+        summary = _summarize(summary, pending, settings, cfg['model'], budget)
+        update_chat_summary(chat['id'], summary, pending[-1]['id'])
+    except Exception as e:
+        logger.warning(f"Chat summary failed for chat {chat.get('id')}: {e}")
+        if emit_log:
+            emit_log({"type": "text", "message": f"[{_ts()}] Zusammenfassung fehlgeschlagen ({e}) — sende bisherigen Kontext"})
+        return context
+
+    recent = unsummarized[-cfg['keep_recent']:]
+    if emit_log:
+        emit_log({"type": "text", "message": f"[{_ts()}] Kontext: Zusammenfassung + {len(recent)} letzte Nachrichten (statt {len(history)})"})
+    return _with_summary(summary, recent)
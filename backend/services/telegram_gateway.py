@@ -1,5 +1,6 @@
 import base64
 import io
+import mimetypes
 import threading
 import time
 import re
@@ -10,7 +11,10 @@ import requests as http_requests
 
 from models import create_chat, add_message, get_chat, update_chat_title
 from services.agent import run_agent
-from services import image_store, file_store
+from services.budget import RunBudget, STOP_CANCELLED
+from services.summary import build_chat_context
+from services import image_store, file_store, log_stream, jobs, tracing
+from services.jobs import job_manager
 from services.openrouter import transcribe_audio
 from services.whisper import transcribe_with_whisper
 from config import get_settings, DATA_DIR, TELEGRAM_USERS_FILE
@@ -89,38 +93,46 @@ class TelegramGateway:
             text = text[:4090] + "\n[...]"
         self._api_post(token, "sendMessage", chat_id=chat_id, text=text)
 
-    def _send_audio(self, token, chat_id, audio_bytes, mime_type="audio/mpeg", filename="audio.mp3", caption=None):
+    @staticmethod
+    def _open_media(media):
+        """Accept raw bytes or the path of a stored chat file (streamed from disk)."""
+        return open(media, "rb") if isinstance(media, str) else io.BytesIO(media)
+
+    def _send_audio(self, token, chat_id, audio, mime_type="audio/mpeg", filename="audio.mp3", caption=None):
         url = TELEGRAM_API.format(token=token, method="sendAudio")
         try:
-            files = {"audio": (filename, io.BytesIO(audio_bytes), mime_type)}
-            data = {"chat_id": chat_id}
-            if caption:
-                data["caption"] = caption[:1024]
-            r = http_requests.post(url, files=files, data=data, timeout=30)
+            with self._open_media(audio) as fh:
+                files = {"audio": (filename, fh, mime_type)}
+                data = {"chat_id": chat_id}
+                if caption:
+                    data["caption"] = caption[:1024]
+                r = http_requests.post(url, files=files, data=data, timeout=30)
             return r.json()
         except Exception as e:
             logger.error(f"Telegram sendAudio error: {e}")
             return None
 
-    def _send_photo(self, token, chat_id, image_bytes, caption=None):
+    def _send_photo(self, token, chat_id, image, caption=None):
         url = TELEGRAM_API.format(token=token, method="sendPhoto")
         try:
-            files = {"photo": ("image.png", io.BytesIO(image_bytes), "image/png")}
-            data = {"chat_id": chat_id}
-            if caption:
-                data["caption"] = caption[:1024]
-            r = http_requests.post(url, files=files, data=data, timeout=30)
+            with self._open_media(image) as fh:
+                files = {"photo": ("image.png", fh, "image/png")}
+                data = {"chat_id": chat_id}
+                if caption:
+                    data["caption"] = caption[:1024]
+                r = http_requests.post(url, files=files, data=data, timeout=30)
             return r.json()
         except Exception as e:
             logger.error(f"Telegram sendPhoto error: {e}")
             return None
 
-    def _send_document(self, token, chat_id, file_bytes, filename, mime_type='application/pdf'):
+    def _send_document(self, token, chat_id, document, filename, mime_type='application/pdf'):
         url = TELEGRAM_API.format(token=token, method="sendDocument")
         try:
-            files = {"document": (filename, io.BytesIO(file_bytes), mime_type)}
-            data = {"chat_id": chat_id}
-            r = http_requests.post(url, files=files, data=data, timeout=30)
+            with self._open_media(document) as fh:
+                files = {"document": (filename, fh, mime_type)}
+                data = {"chat_id": chat_id}
+                r = http_requests.post(url, files=files, data=data, timeout=30)
             return r.json()
         except Exception as e:
             logger.error(f"Telegram sendDocument error: {e}")
@@ -248,12 +260,10 @@ class TelegramGateway:
         if not agent:
             self._send_message(token, telegram_chat_id, f'Agent "{arg}" nicht gefunden. /agents für die Liste.')
             return
-        t = threading.Thread(
-            target=self._start_agent_session,
-            args=(token, telegram_chat_id, username, agent["id"], None),
-            daemon=True
+        self._submit_job(
+            token, telegram_chat_id, None, f"Agent-Start @{username}",
+            self._start_agent_session, token, telegram_chat_id, username, agent["id"], None,
         )
-        t.start()
 
     def _handle_callback_query(self, token, query):
         query_id = query["id"]
@@ -274,14 +284,12 @@ class TelegramGateway:
                 self._user_agents[username] = None
                 self._send_message(token, telegram_chat_id, "✅ Kein Agent aktiv. Neue Nachrichten ohne Agent.")
             else:
-                t = threading.Thread(
-                    target=self._start_agent_session,
-                    args=(token, telegram_chat_id, username, agent_id, None),
-                    daemon=True
+                self._submit_job(
+                    token, telegram_chat_id, None, f"Agent-Start @{username}",
+                    self._start_agent_session, token, telegram_chat_id, username, agent_id, None,
                 )
-                t.start()
 
-    def _start_agent_session(self, token, telegram_chat_id, username, agent_id, custom_title):
+    def _start_agent_session(self, token, telegram_chat_id, username, agent_id, custom_title, job=None):
         from config import get_agent
         agent_cfg = get_agent(agent_id)
         if not agent_cfg:
@@ -290,6 +298,7 @@ class TelegramGateway:
         self._user_agents[username] = agent_id
         title = custom_title or f"Telegram: @{username} ({agent_cfg['name']})"
         chat_id = create_chat(title)
+        tracing.annotate(chat_id=chat_id)  # the job was submitted before the chat existed
         self._user_sessions[username] = chat_id
         self.socketio.emit("chat_created", {"chat_id": chat_id, "title": title, "agent_id": agent_id})
         # Get agent greeting
@@ -299,9 +308,9 @@ class TelegramGateway:
             messages = [{"role": "user", "content": "Hallo"}]
             settings = get_settings()
 
-            def emit_log(entry):
-                e = entry if isinstance(entry, dict) else {"type": "text", "message": str(entry)}
-                self.socketio.emit("guenther_log", e)
+            emit_log = log_stream.make_emit_log(self.socketio, chat_id=chat_id)
+            if job:
+                emit_log = job.track(emit_log)
 
             response = run_agent(
                 messages, settings, emit_log,
@@ -309,7 +318,9 @@ class TelegramGateway:
                 agent_provider_id=agent_cfg.get("provider_id") or None,
                 agent_model=agent_cfg.get("model") or None,
                 chat_id=chat_id,
-                no_tools=True
+                stop_event=job.stop_event if job else None,
+                no_tools=True,
+                budget=RunBudget.from_settings(settings, agent_cfg.get("budget")),
             )
             response = file_store.extract_and_store(response, chat_id)
             add_message(chat_id, "assistant", response)
@@ -403,12 +414,10 @@ class TelegramGateway:
 
             chat_id = self._user_sessions[username]
 
-            t = threading.Thread(
-                target=self._process_voice,
-                args=(token, telegram_chat_id, username, chat_id, file_id, audio_format),
-                daemon=True
+            self._submit_job(
+                token, telegram_chat_id, chat_id, f"Sprachnachricht @{username}",
+                self._process_voice, token, telegram_chat_id, username, chat_id, file_id, audio_format,
             )
-            t.start()
             return
 
         # ── Photo message ──
@@ -437,13 +446,11 @@ class TelegramGateway:
 
             img_b64 = base64.b64encode(img_bytes).decode()
 
-            t = threading.Thread(
-                target=self._process_message,
-                args=(token, telegram_chat_id, username, chat_id, caption),
-                kwargs={"image_b64": img_b64, "image_mime": mime},
-                daemon=True
+            self._submit_job(
+                token, telegram_chat_id, chat_id, caption[:50],
+                self._process_message, token, telegram_chat_id, username, chat_id, caption,
+                image_b64=img_b64, image_mime=mime,
             )
-            t.start()
             return
 
         # ── Text message ──
@@ -466,12 +473,11 @@ class TelegramGateway:
             parts = text.split(None, 1)
             agent_id = self._user_agents.get(username)
             if agent_id:
-                t = threading.Thread(
-                    target=self._start_agent_session,
-                    args=(token, telegram_chat_id, username, agent_id, parts[1].strip() if len(parts) > 1 else None),
-                    daemon=True
+                self._submit_job(
+                    token, telegram_chat_id, None, f"Agent-Start @{username}",
+                    self._start_agent_session, token, telegram_chat_id, username, agent_id,
+                    parts[1].strip() if len(parts) > 1 else None,
                 )
-                t.start()
             else:
                 title = parts[1].strip() if len(parts) > 1 and parts[1].strip() else f"Telegram: @{username}"
                 chat_id = create_chat(title)
@@ -500,14 +506,25 @@ class TelegramGateway:
 
         chat_id = self._user_sessions[username]
 
-        t = threading.Thread(
-            target=self._process_message,
-            args=(token, telegram_chat_id, username, chat_id, text),
-            daemon=True
+        self._submit_job(
+            token, telegram_chat_id, chat_id, text[:50],
+            self._process_message, token, telegram_chat_id, username, chat_id, text,
         )
-        t.start()
 
-    def _process_voice(self, token, telegram_chat_id, username, chat_id, file_id, audio_format):
+    def _submit_job(self, token, telegram_chat_id, chat_id, label, fn, *args, **kwargs):
+        """Run fn(*args, job=job, **kwargs) on the central job manager; reply 'busy' if the queue is full."""
+        try:
+            job_manager.submit(
+                lambda job: fn(*args, job=job, **kwargs),
+                source=jobs.SOURCE_TELEGRAM, chat_id=chat_id, label=label,
+            )
+        except jobs.JobQueueFull as e:
+            self._send_message(
+                token, telegram_chat_id,
+                f"⏳ Guenther ist gerade ausgelastet. Bitte versuche es in etwa {e.retry_after} Sekunden noch einmal."
+            )
+
+    def _process_voice(self, token, telegram_chat_id, username, chat_id, file_id, audio_format, job=None):
         """Download a voice/audio message, transcribe it via STT, then process as text."""
         typing_stop = self._start_typing_loop(token, telegram_chat_id)
         try:
@@ -564,15 +581,14 @@ class TelegramGateway:
             typing_stop.set()
 
         # Process the transcript exactly like a regular text message
-        self._process_message(token, telegram_chat_id, username, chat_id, transcript)
+        self._process_message(token, telegram_chat_id, username, chat_id, transcript, job=job)
 
     def _process_message(self, token, telegram_chat_id, username, chat_id, text,
-                         image_b64=None, image_mime=None):
+                         image_b64=None, image_mime=None, job=None):
         typing_stop = self._start_typing_loop(token, telegram_chat_id)
         session_key = f"tg_{username}"
         try:
             add_message(chat_id, "user", text)
-            self.socketio.emit("chat_updated", {"chat_id": chat_id, "title": None})
 
             chat_data = get_chat(chat_id)
             if not chat_data:
@@ -589,7 +605,24 @@ class TelegramGateway:
             if len(messages) == 1:
                 title = text[:50] + ("..." if len(text) > 50 else "")
                 update_chat_title(chat_id, title)
-                self.socketio.emit("chat_updated", {"chat_id": chat_id, "title": title})
+
+            settings = get_settings()
+
+            emit_log = log_stream.make_emit_log(self.socketio, chat_id=chat_id)
+            if job:
+                emit_log = job.track(emit_log)
+
+            # Use selected agent if any
+            agent_cfg = None
+            agent_id = self._user_agents.get(username)
+            if agent_id:
+                from config import get_agent
+                agent_cfg = get_agent(agent_id)
+
+            budget = RunBudget.from_settings(settings, agent_cfg.get("budget") if agent_cfg else None)
+
+            # Long chats: older messages are replaced by a rolling summary
+            messages = build_chat_context(chat_data, settings, emit_log, budget=budget)
 
             # If a photo was sent, store it and inject a text hint for the LLM
             if image_b64:
@@ -605,50 +638,46 @@ class TelegramGateway:
                         messages[i]["content"] = messages[i]["content"] + hint
                         break
 
-            settings = get_settings()
-
-            def emit_log(entry):
-                if isinstance(entry, dict):
-                    self.socketio.emit("guenther_log", entry)
-                else:
-                    self.socketio.emit("guenther_log", {"type": "text", "message": str(entry)})
-
-            # Use selected agent if any
-            agent_cfg = None
-            agent_id = self._user_agents.get(username)
-            if agent_id:
-                from config import get_agent
-                agent_cfg = get_agent(agent_id)
-
             self.socketio.emit("agent_start", {"chat_id": chat_id})
             response = run_agent(
                 messages, settings, emit_log,
                 system_prompt=agent_cfg.get("system_prompt") or None if agent_cfg else None,
                 agent_provider_id=agent_cfg.get("provider_id") or None if agent_cfg else None,
                 agent_model=agent_cfg.get("model") or None if agent_cfg else None,
-                chat_id=chat_id
+                chat_id=chat_id,
+                stop_event=job.stop_event if job else None,
+                budget=budget,
             )
+            tracing.annotate(stop_reason=budget.stop_reason, iterations=budget.iterations)
+            cancelled = (job and job.stop_event.is_set()) or budget.stop_reason == STOP_CANCELLED
+            if cancelled or not response:
+                # Cancelled (e.g. via /api/jobs) or nothing to say: don't store an empty message
+                self.socketio.emit("agent_end", {"chat_id": chat_id, "cancelled": bool(cancelled),
+                                                 "stop_reason": STOP_CANCELLED if cancelled else budget.stop_reason})
+                self._send_message(token, telegram_chat_id,
+                                   "⏹ Generierung abgebrochen." if cancelled else "Keine Antwort erhalten.")
+                return
             response = file_store.extract_and_store(response, chat_id)
             add_message(chat_id, "assistant", response)
             self.socketio.emit("agent_response", {"chat_id": chat_id, "content": response})
-            self.socketio.emit("agent_end", {"chat_id": chat_id})
+            self.socketio.emit("agent_end", {"chat_id": chat_id, "stop_reason": budget.stop_reason})
 
-            text_part, images = self._extract_images(response)
-            text_part, audio_clips = self._extract_audio(text_part)
+            text_part, images = self._extract_images(response, chat_id)
+            text_part, audio_clips = self._extract_audio(text_part, chat_id)
             text_part, pdf_docs = self._extract_pdf_reports(text_part)
             text_part, pptx_files = self._extract_stored_files(text_part, chat_id)
             clean = self._clean_text_for_telegram(text_part)
             if clean:
                 self._send_message(token, telegram_chat_id, clean)
-            for img_bytes in images:
-                self._send_photo(token, telegram_chat_id, img_bytes)
-            for audio_bytes, mime_type, filename in audio_clips:
-                self._send_audio(token, telegram_chat_id, audio_bytes, mime_type=mime_type, filename=filename)
+            for image in images:
+                self._send_photo(token, telegram_chat_id, image)
+            for audio, mime_type, filename in audio_clips:
+                self._send_audio(token, telegram_chat_id, audio, mime_type=mime_type, filename=filename)
             for pdf_bytes in pdf_docs:
                 self._send_document(token, telegram_chat_id, pdf_bytes, 'seo-report.pdf')
-            for filename, pptx_bytes in pptx_files:
+            for filename, document in pptx_files:
                 self._send_document(
-                    token, telegram_chat_id, pptx_bytes, filename,
+                    token, telegram_chat_id, document, filename,
                     mime_type='application/vnd.openxmlformats-officedocument.presentationml.presentation'
                 )
 
@@ -663,10 +692,19 @@ class TelegramGateway:
             if image_b64:
                 image_store.remove(session_key)
 
-    def _extract_images(self, text):
-        """Extract base64 image embeds from markdown, return (clean_text, [image_bytes])."""
+    def _extract_images(self, text, chat_id=None):
+        """
+        Extract images from the response, return (clean_text, [image]).
+        [STORED_IMAGE](name) markers yield the file path, legacy base64 embeds yield bytes.
+        """
         images = []
 
+        def replace_stored(m):
+            path = file_store.get_file_path(chat_id, m.group(1)) if chat_id else None
+            if path:
+                images.append(path)
+            return ""
+
         def replace_image(m):
             data_uri = m.group(1)
             try:
@@ -676,12 +714,16 @@ class TelegramGateway:
                 logger.warning(f"Could not decode base64 image: {e}")
             return ""
 
-        clean = re.sub(r'!\[.*?\]\((data:image/[^)]+)\)', replace_image, text)
+        clean = re.sub(r'\[STORED_IMAGE\]\(([^)]+)\)', replace_stored, text)
+        clean = re.sub(r'!\[.*?\]\((data:image/[^)]+)\)', replace_image, clean)
         clean = clean.strip()
         return clean, images
 
-    def _extract_audio(self, text):
-        """Extract base64 audio embeds from markdown, return (clean_text, [(bytes, mime_type, filename)])."""
+    def _extract_audio(self, text, chat_id=None):
+        """
+        Extract audio from the response, return (clean_text, [(audio, mime_type, filename)]).
+        [STORED_AUDIO](name) markers yield the file path, legacy base64 embeds yield bytes.
+        """
         _ext_map = {
             'audio/mpeg': 'mp3', 'audio/mp3': 'mp3',
             'audio/wav': 'wav', 'audio/x-wav': 'wav',
@@ -691,6 +733,14 @@ class TelegramGateway:
         }
         clips = []
 
+        def replace_stored(m):
+            filename = m.group(1)
+            path = file_store.get_file_path(chat_id, filename) if chat_id else None
+            if path:
+                mime_type = mimetypes.guess_type(filename)[0] or 'audio/mpeg'
+                clips.append((path, mime_type, filename))
+            return ""
+
         def replace_audio(m):
             data_uri = m.group(1)
             try:
@@ -702,19 +752,23 @@ class TelegramGateway:
                 logger.warning(f"Could not decode base64 audio: {e}")
             return ""
 
-        clean = re.sub(r'!\[audio\]\((data:audio/[^)]+)\)', replace_audio, text)
+        clean = re.sub(r'\[STORED_AUDIO\]\(([^)]+)\)', replace_stored, text)
+        clean = re.sub(r'!\[audio\]\((data:audio/[^)]+)\)', replace_audio, clean)
         clean = clean.strip()
         return clean, clips
 
     def _extract_stored_files(self, text, chat_id):
-        """Extract [STORED_FILE](filename) markers, load from disk, return (clean_text, [(filename, bytes)])."""
+        """
+        Extract [STORED_FILE](filename) markers, return (clean_text, [(filename, document)]).
+        Stored files yield their path (streamed on upload), legacy PPTX markers yield bytes.
+        """
         files = []
 
         def replace(m):
             filename = m.group(1)
-            data = file_store.get_file(chat_id, filename)
-            if data:
-                files.append((filename, data))
+            path = file_store.get_file_path(chat_id, filename)
+            if path:
+                files.append((filename, path))
             return ""
 
         clean = re.sub(r'\[STORED_FILE\]\(([^)]+)\)', replace, text)
@@ -0,0 +1,160 @@
+"""
+Memoization layer for deterministic / slow-changing tool results.
+
+Tools opt in via TOOL_DEFINITION['cache_ttl'] (seconds). Results are keyed by
+(tool name, canonical JSON of the arguments) and kept in a size-bounded LRU.
+With settings['tool_cache']['persist'] the entries are also written to SQLite,
+so they survive restarts and are shared between chats and autoprompt runs;
+expired rows are pruned at startup and every _PRUNE_EVERY writes.
+
+Errors and media payloads (images, audio, reports) are never cached.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_settings
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # cache_key -> (expires_at, result_json)
+_stats = {}  # tool_name -> {"hits": int, "misses": int}
+_writes = 0  # persisted writes since the last prune
+
+# Every N persisted writes, expired rows are deleted from SQLite (the LRU evicts itself)
+_PRUNE_EVERY = 200
+
+_UNCACHEABLE_KEYS = (
+    'error', 'html_content',
+    'image_bytes', 'audio_bytes', 'pptx_bytes',
+    'image_base64', 'audio_base64', 'pptx_base64',
+)
+
+
+def _cache_settings():
+    cfg = get_settings().get('tool_cache') or {}
+    return {
+        'enabled': cfg.get('enabled', True),
+        'max_entries': int(cfg.get('max_entries', 512)),
+        'persist': bool(cfg.get('persist', False)),
+    }
+
+
+def _make_key(tool_name, args):
+    canonical = json.dumps(args or {}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return f"{tool_name}:{canonical}"
+
+
+def _count(tool_name, field):
+    s = _stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+    s[field] += 1
+
+
+def lookup(tool, args):
+    """Return (hit, result). Only consulted for tools with a cache_ttl."""
+    if not tool.cache_ttl:
+        return False, None
+    cfg = _cache_settings()
+    if not cfg['enabled']:
+        return False, None
+
+    key = _make_key(tool.name, args)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > now:
+            _entries.move_to_end(key)
+            _count(tool.name, 'hits')
+            return True, json.loads(entry[1])
+        if entry:
+            del _entries[key]
+
+    if cfg['persist']:
+        try:
+            from models import get_tool_cache_entry
+            row = get_tool_cache_entry(key)
+        except Exception:
+            row = None
+        if row and row['expires_at'] > now:
+            with _lock:
+                _entries[key] = (row['expires_at'], row['result'])
+                _evict(cfg['max_entries'])
+                _count(tool.name, 'hits')
+            return True, json.loads(row['result'])
+
+    with _lock:
+        _count(tool.name, 'misses')
+    return False, None
+
+
+def store(tool, args, result):
+    """Remember a handler result if the tool is cacheable and the result is plain data."""
+    if not tool.cache_ttl:
+        return
+    if isinstance(result, dict) and any(k in result for k in _UNCACHEABLE_KEYS):
+        return
+    cfg = _cache_settings()
+    if not cfg['enabled']:
+        return
+    try:
+        result_json = json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return
+
+    key = _make_key(tool.name, args)
+    expires_at = time.time() + float(tool.cache_ttl)
+    with _lock:
+        _entries[key] = (expires_at, result_json)
+        _entries.move_to_end(key)
+        _evict(cfg['max_entries'])
+
+    if cfg['persist']:
+        global _writes
+        with _lock:
+            _writes += 1
+            prune = _writes >= _PRUNE_EVERY
+            if prune:
+                _writes = 0
+        try:
+            from models import set_tool_cache_entry, prune_tool_cache
+            set_tool_cache_entry(key, tool.name, result_json, expires_at)
+            if prune:
+                prune_tool_cache()
+        except Exception:
+            pass  # persistence is best effort
+
+
+def _evict(max_entries):
+    while len(_entries) > max_entries:
+        _entries.popitem(last=False)
+
+
+def get_stats():
+    """Per-tool hit/miss counters and hit rate."""
+    with _lock:
+        sizes = {}
+        for key in _entries:
+            name = key.split(':', 1)[0]
+            sizes[name] = sizes.get(name, 0) + 1
+        result = []
+        for name, s in sorted(_stats.items()):
+            total = s['hits'] + s['misses']
+            result.append({
+                "tool": name,
+                "hits": s['hits'],
+                "misses": s['misses'],
+                "hit_rate": round(s['hits'] / total, 3) if total else 0.0,
+                "entries": sizes.get(name, 0),
+            })
+        return result
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _stats.clear()
+    try:
+        from models import clear_tool_cache
+        clear_tool_cache()
+    except Exception:
+        pass
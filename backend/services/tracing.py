@@ -0,0 +1,342 @@
+"""
+End-to-end tracing of agent turns (OpenTelemetry-style spans, no SDK needed).
+
+A turn is one trace: the entry point (web chat, webhook, Telegram, autoprompt)
+opens the root span, everything below becomes a child span through a
+contextvar — run_agent, the tool router, every call_openrouter, every tool
+call, file_store.extract_and_store and add_message. Messages saved during a turn
+carry its trace_id, so the waterfall of a turn can be looked up from the chat
+(GET /api/chats/<id>/traces, GET /api/traces/<trace_id>).
+
+  with tracing.span('chat.turn', root=True, chat_id=chat_id, source='web'):
+      ...
+      with tracing.span('tool.call', tool=name) as s:
+          s.set(cache_hit=True)
+
+  @tracing.traced('file_store.extract_and_store')
+  def extract_and_store(...): ...
+
+Outside a trace, span() / traced() without root=True cost one contextvar lookup
+and record nothing. Finished spans are queued and written in batches by a
+background thread; exporters (settings['tracing']['exporters']):
+
+  'db'       trace_spans table — needed for the waterfall API
+  'file'     JSON Lines in the OTLP span layout (traceId, spanId, ...), default
+             DATA_DIR/traces.jsonl — for offline analysis / import elsewhere
+  'console'  one log line per span
+
+Threads don't inherit contextvars: code that hands work to another thread
+passes contextvars.copy_context() along (see _Speculation in services/agent.py).
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from config import DATA_DIR, get_settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+_BATCH_SIZE = 500
+_FLUSH_SECONDS = 0.5
+
+_current = contextvars.ContextVar('guenther_span', default=None)
+
+
+def _settings():
+    cfg = get_settings().get('tracing') or {}
+    return {
+        'enabled': bool(cfg.get('enabled', True)),
+        'exporters': list(cfg.get('exporters') or ['db']),
+        'file': cfg.get('file') or os.path.join(DATA_DIR, 'traces.jsonl'),
+        'sample_rate': float(cfg.get('sample_rate', 1.0)),
+    }
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'end',
+                 'status', 'error', 'chat_id', 'exporters')
+
+    def __init__(self, name, trace_id, parent_id, chat_id, exporters, attributes):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+        self.status = STATUS_OK
+        self.error = None
+        self.chat_id = chat_id
+        self.exporters = exporters
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        if attributes.get('chat_id'):
+            self.chat_id = attributes['chat_id']  # e.g. chat created during the turn
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration_ms': round((self.end - self.start) * 1000, 3),
+            'status': self.status,
+            'error': self.error,
+            'chat_id': self.chat_id,
+            'attributes': self.attributes,
+        }
+
+
+class _NoSpan:
+    """Returned outside a trace (or when tracing is off): accepts and drops everything."""
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def current_span():
+    return _current.get() or _NO_SPAN
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span else None
+
+
+def annotate(**attributes):
+    """Set attributes on the innermost open span (no-op outside a trace)."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+@contextmanager
+def span(name, root=False, **attributes):
+    """
+    Child span of the current one. root=True starts a new trace (entry points);
+    without it, nothing is recorded unless a trace is already running.
+    """
+    parent = _current.get()
+    if root:
+        cfg = _settings()
+        if not cfg['enabled'] or not cfg['exporters'] or random.random() >= cfg['sample_rate']:
+            yield _NO_SPAN
+            return
+        s = Span(name, _new_id(128), None, attributes.get('chat_id'), tuple(cfg['exporters']), attributes)
+    elif parent is None:
+        yield _NO_SPAN
+        return
+    else:
+        s = Span(name, parent.trace_id, parent.span_id, parent.chat_id, parent.exporters, attributes)
+
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = STATUS_ERROR
+        s.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        _current.reset(token)
+        s.end = time.time()
+        _exporter.submit(s)
+
+
+def record(name, start, end, **attributes):
+    """Child span for something already measured (e.g. the job's time in the queue)."""
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(name, parent.trace_id, parent.span_id, parent.chat_id, parent.exporters, attributes)
+    s.start, s.end = start, end
+    _exporter.submit(s)
+
+
+def traced(name, **attributes):
+    """Decorator: run the function in a child span when a trace is active."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ── Export ────────────────────────────────────────────────────────────────────
+
+def _otlp(s):
+    """Span in the OTLP/JSON span layout."""
+    return {
+        'traceId': s.trace_id,
+        'spanId': s.span_id,
+        'parentSpanId': s.parent_id or '',
+        'name': s.name,
+        'startTimeUnixNano': int(s.start * 1e9),
+        'endTimeUnixNano': int(s.end * 1e9),
+        'status': {'code': 2 if s.status == STATUS_ERROR else 1, 'message': s.error or ''},
+        'attributes': [{'key': k, 'value': v} for k, v in s.attributes.items()],
+    }
+
+
+def _export_db(spans):
+    from models import save_trace_spans
+    save_trace_spans([s.to_dict() for s in spans])
+
+
+def _export_file(spans):
+    path = _settings()['file']
+    with open(path, 'a', encoding='utf-8') as f:
+        for s in spans:
+            f.write(json.dumps(_otlp(s), ensure_ascii=False, default=str) + '\n')
+
+
+def _export_console(spans):
+    for s in spans:
+        logger.info(f"[trace] {s.trace_id[:8]} {s.name} {(s.end - s.start) * 1000:.1f} ms "
+                    f"{s.status}{' ' + s.error if s.error else ''} {s.attributes}")
+
+
+_EXPORTERS = {'db': _export_db, 'file': _export_file, 'console': _export_console}
+
+
+class _BatchExporter:
+    """Collects finished spans and exports them from a background thread."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, s):
+        if self._thread is None:
+            self._start()
+        self._queue.put(s)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name='trace-exporter')
+                self._thread.start()
+
+    def flush(self, timeout=5):
+        """Wait until everything submitted so far is exported."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _loop(self):
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + _FLUSH_SECONDS
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break  # flush requested: export now
+                batch.append(item)
+                if len(batch) >= _BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            self._export(batch)
+            for w in waiters:
+                w.set()
+
+    @staticmethod
+    def _export(batch):
+        by_exporter = {}
+        for s in batch:
+            for name in s.exporters:
+                by_exporter.setdefault(name, []).append(s)
+        for name, spans in by_exporter.items():
+            fn = _EXPORTERS.get(name)
+            if fn is None:
+                continue
+            try:
+                fn(spans)
+            except Exception as e:
+                logger.warning(f"[trace] export '{name}' failed: {e}")
+
+
+_exporter = _BatchExporter()
+
+
+def flush(timeout=5):
+    return _exporter.flush(timeout)
+
+
+# ── Waterfall ─────────────────────────────────────────────────────────────────
+
+def waterfall(spans):
+    """
+    Spans of one trace ordered as a waterfall: parents before children, siblings
+    by start time, each with its depth and offset from the trace start.
+    """
+    if not spans:
+        return None
+    by_parent = {}
+    ids = {s['span_id'] for s in spans}
+    for s in spans:
+        parent = s['parent_id'] if s['parent_id'] in ids else None
+        by_parent.setdefault(parent, []).append(s)
+    t0 = min(s['start'] for s in spans)
+    t1 = max(s['end'] for s in spans)
+    ordered = []
+
+    def walk(parent, depth):
+        for s in sorted(by_parent.get(parent, []), key=lambda x: x['start']):
+            ordered.append({**s, 'depth': depth, 'offset_ms': round((s['start'] - t0) * 1000, 3)})
+            walk(s['span_id'], depth + 1)
+    walk(None, 0)
+    root = ordered[0]
+    return {
+        'trace_id': root['trace_id'],
+        'name': root['name'],
+        'chat_id': root['chat_id'],
+        'start': t0,
+        'duration_ms': round((t1 - t0) * 1000, 3),
+        'status': STATUS_ERROR if any(s['status'] == STATUS_ERROR for s in spans) else STATUS_OK,
+        'spans': ordered,
+    }
+
+
+def render_waterfall(trace, width=60):
+    """Plain-text waterfall (one bar per span) for terminals / curl."""
+    total = trace['duration_ms'] or 1
+    label_width = max(len('  ' * s['depth'] + s['name']) for s in trace['spans'])
+    lines = [f"trace {trace['trace_id']}  {trace['name']}  {total:.0f} ms"]
+    for s in trace['spans']:
+        begin = int(s['offset_ms'] / total * width)
+        length = max(1, int(s['duration_ms'] / total * width))
+        bar = ' ' * begin + ('!' if s['status'] == STATUS_ERROR else '█') * min(length, width - begin or 1)
+        label = ('  ' * s['depth'] + s['name']).ljust(label_width)
+        lines.append(f"{label}  {s['offset_ms']:>9.0f} {s['duration_ms']:>9.0f} ms  |{bar.ljust(width)}|")
+    return '\n'.join(lines) + '\n'
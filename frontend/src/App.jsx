@@ -5,9 +5,22 @@ import ChatWindow from './components/ChatWindow';
 import GuentherBox from './components/GuentherBox';
 import Settings from './components/Settings';
 import FirstRunOverlay from './components/FirstRunOverlay';
-import { fetchChats, fetchChat, deleteChat, renameChat, fetchAgents, fetchProviders, fetchChatInfo, fetchChatUsage, uploadBinaryFile } from './services/api';
+import { fetchChatChanges, fetchChat, deleteChat, renameChat, fetchAgents, fetchProviders, fetchChatInfo, fetchChatUsage, uploadBinaryFile, uploadTextFile } from './services/api';
 import { getSocket } from './services/socket';
 
+// Text files above this size are uploaded via REST instead of the WebSocket
+const LARGE_TEXT_UPLOAD_CHARS = 256 * 1024;
+
+const byUpdatedDesc = (a, b) => (b.updated_at || '').localeCompare(a.updated_at || '');
+
+// Merge changed chat rows and deletions into the list, newest first
+function mergeChats(prev, changed = [], deleted = []) {
+  const byId = new Map(prev.map(c => [c.id, c]));
+  changed.forEach(c => byId.set(c.id, c));
+  deleted.forEach(id => byId.delete(id));
+  return [...byId.values()].sort(byUpdatedDesc);
+}
+
 function formatBytes(n) {
   if (!n) return '0 B';
   if (n >= 1024 * 1024) return (n / (1024 * 1024)).toFixed(1) + ' MB';
@@ -156,6 +169,7 @@ function ChatInfoPopup({ onClose, activeChatId, agents }) {
 
 export default function App() {
   const [chats, setChats] = useState([]);
+  const chatCursor = useRef('');  // delta sync cursor for GET /api/chats?updated_since=
   const [activeChatId, setActiveChatId] = useState(null);
   const [messages, setMessages] = useState([]);
   const [guentherLogs, setGuentherLogs] = useState([]);
@@ -171,6 +185,7 @@ export default function App() {
   const [showUsage, setShowUsage] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [searchOpen, setSearchOpen] = useState(false);
+  const [logFirehose, setLogFirehose] = useState(() => localStorage.getItem('logFirehose') === '1');
   const searchRef = useRef(null);
   const { t, i18n } = useTranslation();
 
@@ -213,10 +228,40 @@ export default function App() {
     setAgents(data);
   }
 
+  // Terminal logs are routed per chat — subscribe to the active chat's room
+  // (and re-subscribe after a reconnect, rooms are per connection)
+  useEffect(() => {
+    if (!activeChatId) return;
+    const subscribe = () => socket.emit('subscribe_logs', { chat_id: activeChatId });
+    subscribe();
+    socket.on('connect', subscribe);
+    return () => {
+      socket.off('connect', subscribe);
+      socket.emit('unsubscribe_logs', { chat_id: activeChatId });
+    };
+  }, [socket, activeChatId]);
+
+  // Opt-in admin firehose: logs of all chats, Telegram and webhooks
+  useEffect(() => {
+    if (!logFirehose) return;
+    const subscribe = () => socket.emit('subscribe_logs', { firehose: true });
+    subscribe();
+    socket.on('connect', subscribe);
+    return () => {
+      socket.off('connect', subscribe);
+      socket.emit('unsubscribe_logs', { firehose: true });
+    };
+  }, [socket, logFirehose]);
+
+  function toggleLogFirehose() {
+    const next = !logFirehose;
+    setLogFirehose(next);
+    localStorage.setItem('logFirehose', next ? '1' : '0');
+  }
+
   // Socket event listeners
   useEffect(() => {
-    socket.on('guenther_log', (data) => {
-      setGuentherLogs(prev => [...prev, data]);
+    function trackTool(data) {
       if (data.type === 'header') {
         if (data.message?.startsWith('TOOL CALL: ')) {
           setCurrentTool(data.message.replace('TOOL CALL: ', ''));
@@ -228,20 +273,45 @@ export default function App() {
       } else if (data.type === 'text' && data.message) {
         setCurrentToolLog(data.message);
       }
+    }
+
+    socket.on('guenther_log', (data) => {
+      setGuentherLogs(prev => [...prev, data]);
+      trackTool(data);
+    });
+
+    // Agent logs arrive batched (~50 ms) — one state update per frame
+    // Ack every batch: the server stops sending to clients that fall behind
+    socket.on('guenther_log_batch', ({ entries }, ack) => {
+      if (typeof ack === 'function') ack();
+      if (!entries?.length) return;
+      setGuentherLogs(prev => prev.concat(entries));
+      entries.forEach(trackTool);
     });
 
+    // The chat list itself arrives as chat_updated / chat_deleted deltas
     socket.on('chat_created', (data) => {
       setActiveChatId(data.chat_id);
       setSelectedAgentId('');
-      loadChats();
     });
 
     socket.on('chat_updated', (data) => {
-      setChats(prev => prev.map(c =>
-        c.id === data.chat_id ? { ...c, title: data.title } : c
-      ));
+      if (data.chat) {
+        setChats(prev => mergeChats(prev, [data.chat]));
+      } else {
+        setChats(prev => prev.map(c =>
+          c.id === data.chat_id ? { ...c, title: data.title } : c
+        ));
+      }
+    });
+
+    socket.on('chat_deleted', (data) => {
+      setChats(prev => mergeChats(prev, [], [data.chat_id]));
     });
 
+    // Deltas sent while disconnected are lost — catch up via the cursor
+    socket.on('connect', syncChats);
+
     socket.on('agent_start', () => {
       setIsLoading(true);
     });
@@ -257,13 +327,15 @@ export default function App() {
       setIsLoading(false);
       setCurrentTool(null);
       setCurrentToolLog(null);
-      loadChats();
     });
 
     return () => {
       socket.off('guenther_log');
+      socket.off('guenther_log_batch');
       socket.off('chat_created');
       socket.off('chat_updated');
+      socket.off('chat_deleted');
+      socket.off('connect', syncChats);
       socket.off('agent_start');
       socket.off('agent_response');
       socket.off('agent_end');
@@ -296,8 +368,16 @@ export default function App() {
   }, []);
 
   async function loadChats() {
-    const data = await fetchChats();
-    setChats(data);
+    const data = await fetchChatChanges('');
+    chatCursor.current = data.cursor;
+    setChats(data.chats);
+  }
+
+  async function syncChats() {
+    if (!chatCursor.current) return loadChats();
+    const data = await fetchChatChanges(chatCursor.current);
+    chatCursor.current = data.cursor;
+    setChats(prev => data.full ? data.chats : mergeChats(prev, data.chats, data.deleted));
   }
 
   async function handleSelectChat(chatId) {
@@ -332,7 +412,7 @@ export default function App() {
       setActiveChatId(null);
       setMessages([]);
     }
-    loadChats();
+    setChats(prev => mergeChats(prev, [], [chatId]));
   }
 
   async function handleRenameChat(chatId, newTitle) {
@@ -386,6 +466,7 @@ export default function App() {
     let socketContent = content;
     let fileName = '';
     let fileContent = '';
+    let filePath = '';
 
     if (file && file.isBinary) {
       // Upload binary file via REST to avoid Socket.IO buffer limits
@@ -396,6 +477,15 @@ export default function App() {
       } catch (e) {
         console.error('Binary upload failed', e);
       }
+    } else if (file && file.content.length > LARGE_TEXT_UPLOAD_CHARS) {
+      // Large text files also go via REST: keeps the WebSocket free and below its buffer limit
+      fileName = file.name;
+      try {
+        ({ path: filePath } = await uploadTextFile(file.content, file.name));
+      } catch (e) {
+        console.error('Text upload failed', e);
+        fileContent = file.content;
+      }
     } else if (file) {
       fileName = file.name;
       fileContent = file.content;
@@ -407,6 +497,7 @@ export default function App() {
       agent_id: activeChatId ? '' : selectedAgentId,
       file_name: fileName,
       file_content: fileContent,
+      file_path: filePath,
       temperature,
     });
   }
@@ -495,6 +586,8 @@ export default function App() {
         width={guentherWidth}
         onResizeStart={handleResizeStart}
         onClear={handleClearLogs}
+        firehose={logFirehose}
+        onToggleFirehose={toggleLogFirehose}
       />
       {showSettings && <Settings onClose={() => setShowSettings(false)} onAgentsChange={loadAgents} />}
       {showFirstRun && <FirstRunOverlay onClose={() => setShowFirstRun(false)} />}
@@ -15,7 +15,9 @@ function parseContent(content) {
   const htmlRegex = /\[HTML_REPORT\]\((data:text\/html;base64,[^)]+)\)/g;
   const pdfRegex = /\[PDF_REPORT\]\((data:text\/html;base64,[^)]+)\)/g;
   const pptxRegex = /\[PPTX_DOWNLOAD\]\(([^:)]+)::([A-Za-z0-9+/=]+)\)/g;
-  const storedFileRegex = /\[STORED_FILE\]\(([^)]+)\)/g;
+  const storedFileRegex = /\[(?:STORED_FILE|ATTACHMENT)\]\(([^)]+)\)/g;
+  const storedImageRegex = /\[STORED_IMAGE\]\(([^)]+)\)/g;
+  const storedAudioRegex = /\[STORED_AUDIO\]\(([^)]+)\)/g;
 
   // Collect all matches with their positions
   const matches = [];
@@ -39,6 +41,12 @@ function parseContent(content) {
   while ((m = storedFileRegex.exec(content)) !== null) {
     matches.push({ index: m.index, end: m.index + m[0].length, type: 'stored_file', filename: m[1] });
   }
+  while ((m = storedImageRegex.exec(content)) !== null) {
+    matches.push({ index: m.index, end: m.index + m[0].length, type: 'stored_image', filename: m[1] });
+  }
+  while ((m = storedAudioRegex.exec(content)) !== null) {
+    matches.push({ index: m.index, end: m.index + m[0].length, type: 'stored_audio', filename: m[1] });
+  }
 
   matches.sort((a, b) => a.index - b.index);
 
@@ -60,8 +68,8 @@ function parseContent(content) {
       parts.push({ type: 'pdf', src: match.src });
     } else if (match.type === 'pptx') {
       parts.push({ type: 'pptx', filename: match.filename, b64: match.b64 });
-    } else if (match.type === 'stored_file') {
-      parts.push({ type: 'stored_file', filename: match.filename });
+    } else if (match.type === 'stored_file' || match.type === 'stored_image' || match.type === 'stored_audio') {
+      parts.push({ type: match.type, filename: match.filename });
     }
     lastIndex = match.end;
   }
@@ -193,6 +201,27 @@ function MessageContent({ content, chatId }) {
         if (part.type === 'stored_file') {
           return <StoredFileButton key={i} chatId={chatId} filename={part.filename} />;
         }
+        if (part.type === 'stored_image') {
+          return (
+            <img
+              key={i}
+              src={`/api/chats/${chatId}/files/${encodeURIComponent(part.filename)}`}
+              alt={t('chat.generatedImage')}
+              style={{ maxWidth: '100%', borderRadius: '8px', marginTop: '8px', display: 'block' }}
+            />
+          );
+        }
+        if (part.type === 'stored_audio') {
+          return (
+            <audio
+              key={i}
+              controls
+              autoPlay
+              src={`/api/chats/${chatId}/files/${encodeURIComponent(part.filename)}`}
+              style={{ maxWidth: '100%', marginTop: '8px', display: 'block' }}
+            />
+          );
+        }
         return (
           <ReactMarkdown key={i} remarkPlugins={[remarkGfm]} components={{
             img: ({ node, ...props }) => (
@@ -220,6 +249,8 @@ function getTextForCopy(content) {
   if (!content) return '';
   return content
     .replace(/!\[[^\]]*\]\(data:[^)]+\)/g, '[Bild]')
+    .replace(/\[STORED_IMAGE\]\([^)]+\)/g, '[Bild]')
+    .replace(/\[STORED_AUDIO\]\([^)]+\)/g, '[Audio]')
     .trim();
 }
 
@@ -93,7 +93,7 @@ function LogEntry({ entry }) {
   return <div className="guenther-line">{entry.message}</div>;
 }
 
-export default function GuentherBox({ logs, width, onResizeStart, onClear }) {
+export default function GuentherBox({ logs, width, onResizeStart, onClear, firehose, onToggleFirehose }) {
   const { t } = useTranslation();
   const bottomRef = useRef(null);
 
@@ -115,6 +115,11 @@ export default function GuentherBox({ logs, width, onResizeStart, onClear }) {
             onClick={() => navigator.clipboard.writeText(logsToText(logs))}
             title="In Zwischenablage kopieren"
           >⧉</button>
+          <button
+            className={`btn-guenther-clear${firehose ? ' active' : ''}`}
+            onClick={onToggleFirehose}
+            title={t('guenther.firehoseTitle')}
+          >ALL</button>
           <button className="btn-guenther-clear" onClick={onClear} title={t('guenther.clearTitle')}>CLR</button>
         </div>
       </div>
@@ -7,6 +7,20 @@ function envToText(env) {
   return Object.entries(env).map(([k, v]) => `${k}=${v}`).join('\n');
 }
 
+function headersToText(headers) {
+  if (!headers) return '';
+  return Object.entries(headers).map(([k, v]) => `${k}: ${v}`).join('\n');
+}
+
+function textToHeaders(text) {
+  const headers = {};
+  text.split('\n').forEach(line => {
+    const idx = line.indexOf(':');
+    if (idx > 0) headers[line.slice(0, idx).trim()] = line.slice(idx + 1).trim();
+  });
+  return headers;
+}
+
 function textToEnv(text) {
   const env = {};
   text.split('\n').forEach(line => {
@@ -20,6 +34,9 @@ export default function SettingsMcp() {
   const { t } = useTranslation();
   const [mcpServers, setMcpServers] = useState([]);
   const [newName, setNewName] = useState('');
+  const [newTransport, setNewTransport] = useState('stdio');
+  const [newUrl, setNewUrl] = useState('');
+  const [newHeaders, setNewHeaders] = useState('');
   const [newCommand, setNewCommand] = useState('');
   const [newArgs, setNewArgs] = useState('');
   const [newEnv, setNewEnv] = useState('');
@@ -39,14 +56,22 @@ export default function SettingsMcp() {
   }
 
   async function handleAddServer() {
-    if (!newName || !newCommand) return;
-    const args = newArgs ? newArgs.split(' ').filter(Boolean) : [];
-    const env = textToEnv(newEnv);
-    await addMcpServer({ name: newName, transport: 'stdio', command: newCommand, args, env });
+    if (!newName) return;
+    if (newTransport === 'http') {
+      if (!newUrl) return;
+      await addMcpServer({ name: newName, transport: 'http', url: newUrl, headers: textToHeaders(newHeaders) });
+    } else {
+      if (!newCommand) return;
+      const args = newArgs ? newArgs.split(' ').filter(Boolean) : [];
+      const env = textToEnv(newEnv);
+      await addMcpServer({ name: newName, transport: 'stdio', command: newCommand, args, env });
+    }
     setNewName('');
     setNewCommand('');
     setNewArgs('');
     setNewEnv('');
+    setNewUrl('');
+    setNewHeaders('');
     await loadMcpServers();
     setMessage(t('settings.mcp.added'));
     setTimeout(() => setMessage(''), 3000);
@@ -56,6 +81,9 @@ export default function SettingsMcp() {
     setEditId(s.id);
     setEditState({
       name: s.name,
+      transport: s.transport || 'stdio',
+      url: s.url || '',
+      headers: headersToText(s.headers),
       command: s.command,
       args: (s.args || []).join(' '),
       env: envToText(s.env),
@@ -70,7 +98,10 @@ export default function SettingsMcp() {
   async function handleSaveEdit(id) {
     const args = editState.args ? editState.args.split(' ').filter(Boolean) : [];
     const env = textToEnv(editState.env || '');
-    await updateMcpServer(id, { name: editState.name, command: editState.command, args, env });
+    await updateMcpServer(id, {
+      name: editState.name, command: editState.command, args, env,
+      url: editState.url, headers: textToHeaders(editState.headers || ''),
+    });
     setEditId(null);
     await loadMcpServers();
     setMessage(t('settings.mcp.saved'));
@@ -144,25 +175,45 @@ export default function SettingsMcp() {
                     onChange={e => setEditState(p => ({ ...p, name: e.target.value }))}
                     placeholder="Name"
                   />
-                  <input
-                    type="text"
-                    value={editState.command}
-                    onChange={e => setEditState(p => ({ ...p, command: e.target.value }))}
-                    placeholder="Command"
-                  />
-                  <input
-                    type="text"
-                    value={editState.args}
-                    onChange={e => setEditState(p => ({ ...p, args: e.target.value }))}
-                    placeholder="Argumente"
-                  />
-                  <textarea
-                    value={editState.env}
-                    onChange={e => setEditState(p => ({ ...p, env: e.target.value }))}
-                    placeholder={t('settings.mcp.envPlaceholder')}
-                    rows={3}
-                    style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
-                  />
+                  {editState.transport === 'http' ? (
+                    <>
+                      <input
+                        type="text"
+                        value={editState.url}
+                        onChange={e => setEditState(p => ({ ...p, url: e.target.value }))}
+                        placeholder="URL"
+                      />
+                      <textarea
+                        value={editState.headers}
+                        onChange={e => setEditState(p => ({ ...p, headers: e.target.value }))}
+                        placeholder={t('settings.mcp.headersPlaceholder')}
+                        rows={3}
+                        style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
+                      />
+                    </>
+                  ) : (
+                    <>
+                      <input
+                        type="text"
+                        value={editState.command}
+                        onChange={e => setEditState(p => ({ ...p, command: e.target.value }))}
+                        placeholder="Command"
+                      />
+                      <input
+                        type="text"
+                        value={editState.args}
+                        onChange={e => setEditState(p => ({ ...p, args: e.target.value }))}
+                        placeholder="Argumente"
+                      />
+                      <textarea
+                        value={editState.env}
+                        onChange={e => setEditState(p => ({ ...p, env: e.target.value }))}
+                        placeholder={t('settings.mcp.envPlaceholder')}
+                        rows={3}
+                        style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
+                      />
+                    </>
+                  )}
                   <div style={{ display: 'flex', gap: '8px' }}>
                     <button className="btn-save" onClick={() => handleSaveEdit(s.id)}>
                       {t('settings.mcp.save')}
@@ -176,7 +227,21 @@ export default function SettingsMcp() {
                 <div style={{ display: 'flex', alignItems: 'center', gap: '8px', width: '100%' }}>
                   <div className="mcp-server-info" style={{ flex: 1 }}>
                     <strong>{s.name}</strong>
-                    <span className="mcp-server-cmd">{s.command} {(s.args || []).join(' ')}</span>
+                    <span className="mcp-server-cmd">
+                      {s.transport === 'http' ? s.url : `${s.command} ${(s.args || []).join(' ')}`}
+                    </span>
+                    {s.status && (
+                      <span style={{
+                        fontSize: '11px', display: 'block', marginTop: '2px',
+                        color: s.status.state === 'failed' ? 'var(--danger)' : 'var(--text-secondary)',
+                      }}>
+                        {s.status.pool && s.status.pool.max > 1
+                          ? t('settings.mcp.status.connectedPool', s.status.pool)
+                          : t(`settings.mcp.status.${s.status.state}`, {
+                            error: s.status.error, seconds: s.status.retry_in,
+                          })}
+                      </span>
+                    )}
                     {s.env && Object.keys(s.env).length > 0 && (
                       <span style={{ fontSize: '11px', color: 'var(--text-secondary)', marginTop: '2px', display: 'block' }}>
                         ENV: {Object.keys(s.env).join(', ')}
@@ -208,25 +273,49 @@ export default function SettingsMcp() {
             value={newName}
             onChange={(e) => setNewName(e.target.value)}
           />
-          <input
-            type="text"
-            placeholder="Command (z.B. npx)"
-            value={newCommand}
-            onChange={(e) => setNewCommand(e.target.value)}
-          />
-          <input
-            type="text"
-            placeholder="Argumente (z.B. -y @weather/mcp)"
-            value={newArgs}
-            onChange={(e) => setNewArgs(e.target.value)}
-          />
-          <textarea
-            placeholder={t('settings.mcp.envPlaceholder')}
-            value={newEnv}
-            onChange={(e) => setNewEnv(e.target.value)}
-            rows={3}
-            style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
-          />
+          <select value={newTransport} onChange={(e) => setNewTransport(e.target.value)}>
+            <option value="stdio">{t('settings.mcp.transportStdio')}</option>
+            <option value="http">{t('settings.mcp.transportHttp')}</option>
+          </select>
+          {newTransport === 'http' ? (
+            <>
+              <input
+                type="text"
+                placeholder="URL (z.B. http://mcp-host:8000/mcp)"
+                value={newUrl}
+                onChange={(e) => setNewUrl(e.target.value)}
+              />
+              <textarea
+                placeholder={t('settings.mcp.headersPlaceholder')}
+                value={newHeaders}
+                onChange={(e) => setNewHeaders(e.target.value)}
+                rows={3}
+                style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
+              />
+            </>
+          ) : (
+            <>
+              <input
+                type="text"
+                placeholder="Command (z.B. npx)"
+                value={newCommand}
+                onChange={(e) => setNewCommand(e.target.value)}
+              />
+              <input
+                type="text"
+                placeholder="Argumente (z.B. -y @weather/mcp)"
+                value={newArgs}
+                onChange={(e) => setNewArgs(e.target.value)}
+              />
+              <textarea
+                placeholder={t('settings.mcp.envPlaceholder')}
+                value={newEnv}
+                onChange={(e) => setNewEnv(e.target.value)}
+                rows={3}
+                style={{ fontFamily: 'monospace', fontSize: '12px', resize: 'vertical' }}
+              />
+            </>
+          )}
           <button className="btn-add-server" onClick={handleAddServer}>
             {t('settings.mcp.add')}
           </button>
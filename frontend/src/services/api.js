@@ -1,3 +1,5 @@
+import { getSocket } from './socket';
+
 const BASE = '';
 
 export async function fetchChats() {
@@ -5,6 +7,12 @@ export async function fetchChats() {
   return res.json();
 }
 
+// Delta sync: {chats, deleted, cursor, full} — empty cursor = full list
+export async function fetchChatChanges(cursor = '') {
+  const res = await fetch(`${BASE}/api/chats?updated_since=${encodeURIComponent(cursor)}`);
+  return res.json();
+}
+
 export async function fetchChat(chatId) {
   const res = await fetch(`${BASE}/api/chats/${chatId}`);
   return res.json();
@@ -65,7 +73,11 @@ export async function deleteMcpServer(serverId) {
 }
 
 export async function reloadMcpTools() {
-  const res = await fetch(`${BASE}/api/mcp/reload`, { method: 'POST' });
+  // Reload log is streamed only to this browser's terminal
+  const res = await fetch(`${BASE}/api/mcp/reload`, {
+    method: 'POST',
+    headers: { 'X-Socket-Id': getSocket().id || '' },
+  });
   return res.json();
 }
 
@@ -314,6 +326,13 @@ export async function uploadBinaryFile(dataUrl, filename) {
   return uploadRes.json();
 }
 
+export async function uploadTextFile(text, filename) {
+  const form = new FormData();
+  form.append('file', new Blob([text], { type: 'text/plain;charset=utf-8' }), filename);
+  const uploadRes = await fetch(`${BASE}/api/upload`, { method: 'POST', body: form });
+  return uploadRes.json();
+}
+
 export async function uploadCustomTool(file) {
   const form = new FormData();
   form.append('file', file);